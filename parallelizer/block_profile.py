@@ -0,0 +1,186 @@
+"""
+                    profile file format (text, one record per line, '#' comments)
+
+hxdp-profile 1                      magic and version of the format
+program <name>                      program the counts were captured on
+instructions <n>                    # of instructions (lddw counts 2)
+checksum <crc32>                    crc32 of the program instructions (hex), profiles of other programs are rejected
+packets <n>                         # of packets replayed
+action <action> <packets>           packets per returned XDP action
+block <pos> <count>                 executions of the instructions from pos up to the next block record
+branch <pos> <taken> <not taken>    outcomes of the conditional jump at pos
+"""
+import struct
+import zlib
+from bisect import bisect_right, insort
+
+from ebpf_interpreter import EBPFInterpreter, InterpreterError
+from ebpf_parser import unpack_instruction, is_jump, is_branch, is_if_branch, XDPAction
+
+PROFILE_MAGIC = "hxdp-profile"
+PROFILE_VERSION = 1
+
+# pcap file format
+PCAP_MAGIC = 0xa1b2c3d4
+PCAP_MAGIC_NS = 0xa1b23c4d
+PCAP_HEADER = struct.Struct("IHHiIII")
+PCAP_RECORD = struct.Struct("IIII")
+
+
+class BlockProfile:
+    # Execution counts of a program on a traffic mix, indexed by instruction ids of the original program (they do not
+    # depend on the blocks built by the optimizer)
+
+    def __init__(self, name, n_instr, checksum, packets=0):
+        self.name = name
+        self.n_instr = n_instr
+        self.checksum = checksum
+        self.packets = packets
+        self.actions = {}  # action -> # of packets
+        self.blocks = {}  # leader instruction id -> executions of the instructions up to the next leader
+        self.branches = {}  # conditional jump instruction id -> (taken, not taken)
+        self.leaders = []
+
+    def add_block(self, pos, count):
+        if pos not in self.blocks:
+            insort(self.leaders, pos)
+        self.blocks[pos] = count
+
+    def count(self, pos):
+        # This method returns the # of executions of the instruction pos
+
+        i = bisect_right(self.leaders, pos)
+        return self.blocks[self.leaders[i - 1]] if i > 0 else 0
+
+    def branch(self, pos):
+        # This method returns (taken, not taken) of the conditional jump pos
+
+        return self.branches.get(pos, (0, 0))
+
+    def check(self, program_bin):
+        # This method verifies that the profile was captured on program_bin
+
+        if self.n_instr != len(program_bin) or self.checksum != program_checksum(program_bin):
+            print("\033[91mThe profile " + str(self.name) + " was not captured on this program")
+            exit(-1)
+
+
+def program_checksum(program_bin):
+    return zlib.crc32(b"".join(instr.to_bytes(8, byteorder='big') for instr in program_bin))
+
+
+def profile_from_interpreter(name, program_bin, interpreter):
+    # This method builds the profile from the counters of the interpreter: blocks start at jump targets and after
+    # branches
+
+    profile = BlockProfile(name, len(program_bin), program_checksum(program_bin), interpreter.packets)
+    profile.actions = dict(interpreter.actions)
+
+    leaders = {0}
+    for pos in range(len(program_bin)):
+        unpkd = unpack_instruction(program_bin[pos])
+        if is_branch(unpkd) and pos + 1 < len(program_bin):
+            leaders.add(pos + 1)
+        if is_jump(unpkd):
+            leaders.add(pos + unpkd.offset + 1)
+        if is_if_branch(unpkd):
+            taken = interpreter.taken[pos]
+            profile.branches[pos] = (taken, interpreter.counts[pos] - taken)
+
+    for pos in sorted(leaders):
+        profile.add_block(pos, interpreter.counts[pos])
+    return profile
+
+
+def read_pcap(filename):
+    # This method returns the packets (bytes) of a pcap file
+
+    packets = []
+    with open(filename, 'rb') as file:
+        data = file.read()
+
+    magic = struct.unpack("<I", data[:4])[0]
+    order = "<" if magic in (PCAP_MAGIC, PCAP_MAGIC_NS) else ">"
+    if struct.unpack(order + "I", data[:4])[0] not in (PCAP_MAGIC, PCAP_MAGIC_NS):
+        print("\033[91mInvalid pcap file " + filename)
+        exit(-1)
+
+    offset = PCAP_HEADER.size
+    record = struct.Struct(order + PCAP_RECORD.format)
+    while offset + record.size <= len(data):
+        _, _, incl_len, _ = record.unpack_from(data, offset)
+        offset += record.size
+        packets.append(data[offset:offset + incl_len])
+        offset += incl_len
+    return packets
+
+
+def profile_traces(name, program_bin, traces, max_packets=None, lookup_hits=True):
+    # This method replays the packets of the pcap files through the interpreter and returns the profile
+
+    interpreter = EBPFInterpreter(program_bin, lookup_hits=lookup_hits)
+    for trace in traces:
+        for packet in read_pcap(trace):
+            if max_packets is not None and interpreter.packets >= max_packets:
+                break
+            try:
+                interpreter.run(packet)
+            except InterpreterError as e:
+                print("\033[91m" + trace + ": packet " + str(interpreter.packets) + ": " + str(e))
+                exit(-1)
+    return profile_from_interpreter(name, program_bin, interpreter)
+
+
+def write_profile(filename, profile):
+    with open(filename, 'w') as file:
+        file.write(PROFILE_MAGIC + " " + str(PROFILE_VERSION) + "\n")
+        file.write("program " + str(profile.name) + "\n")
+        file.write("instructions " + str(profile.n_instr) + "\n")
+        file.write("checksum " + "{:08x}".format(profile.checksum) + "\n")
+        file.write("packets " + str(profile.packets) + "\n")
+        for action in sorted(profile.actions):
+            name = XDPAction(action).name if action in set(XDPAction) else str(action)
+            file.write("action " + name + " " + str(profile.actions[action]) + "\n")
+        for pos in profile.leaders:
+            file.write("block " + str(pos) + " " + str(profile.blocks[pos]) + "\n")
+        for pos in sorted(profile.branches):
+            file.write("branch " + str(pos) + " " + " ".join(str(x) for x in profile.branches[pos]) + "\n")
+
+
+def read_profile(filename):
+    # This method parses a profile file (records with unknown keywords are ignored)
+
+    fields = {}
+    actions, blocks, branches = {}, [], []
+    with open(filename, 'r') as file:
+        lines = [line.split("#")[0].split() for line in file]
+    lines = [line for line in lines if line]
+
+    if not lines or lines[0] != [PROFILE_MAGIC, str(PROFILE_VERSION)]:
+        print("\033[91mInvalid profile file " + filename + " (expected " + PROFILE_MAGIC + " " +
+              str(PROFILE_VERSION) + ")")
+        exit(-1)
+
+    for line in lines[1:]:
+        if line[0] in ("program", "instructions", "checksum", "packets") and len(line) == 2:
+            fields[line[0]] = line[1]
+        elif line[0] == "action" and len(line) == 3:
+            action = XDPAction[line[1]].value if line[1] in XDPAction.__members__ else int(line[1])
+            actions[action] = int(line[2])
+        elif line[0] == "block" and len(line) == 3:
+            blocks.append((int(line[1]), int(line[2])))
+        elif line[0] == "branch" and len(line) == 4:
+            branches.append((int(line[1]), int(line[2]), int(line[3])))
+
+    if "instructions" not in fields or "checksum" not in fields:
+        print("\033[91mInvalid profile file " + filename + " (missing instructions or checksum)")
+        exit(-1)
+
+    profile = BlockProfile(fields.get("program"), int(fields["instructions"]), int(fields["checksum"], 16),
+                           int(fields.get("packets", 0)))
+    profile.actions = actions
+    for pos, count in blocks:
+        profile.add_block(pos, count)
+    for pos, taken, not_taken in branches:
+        profile.branches[pos] = (taken, not_taken)
+    return profile
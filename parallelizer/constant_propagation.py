@@ -0,0 +1,156 @@
+from ebpf_parser import CLASS_MASK, CLASS_ST, CLASS_STX, CLASS_ALU, CLASS_ALU64, CLASS_JMP, OP_MASK, SOURCE_REG, \
+    SIZE_MASK, MODE_MASK, MODE_MEM, SIZE_TO_BYTES, ALU, ALU_END, ALU_NEG, BRANCH_OPCODE, MOV_ALU, MOV_ALU_TO_ALU, \
+    MOV_IMM, GOTO_OPCODE, NOP, STR_TO_JMP_OP, twos_comp, pack_instruction, is_call, is_if_branch
+from ebpf_interpreter import alu, condition
+from helpers import helper
+from ir import BlockType, NUM_REGS, mask_regs
+
+U64_MASK = (1 << 64) - 1
+U32_MASK = (1 << 32) - 1
+MOV32_IMM = MOV_IMM & OP_MASK | CLASS_ALU
+EQUALITY_OPS = {STR_TO_JMP_OP["=="]: True, STR_TO_JMP_OP["!="]: False}  # if branch op -> equal if taken
+
+
+def is_foldable(opcode):
+    # This method returns True if the result of the instruction can be computed from its register inputs
+
+    return opcode in ALU or opcode in MOV_ALU or opcode & CLASS_MASK in (CLASS_ALU, CLASS_ALU64) and \
+        opcode & OP_MASK == ALU_END
+
+
+def immediate(value, op_class):
+    # This method returns the immediate of an instruction of op_class reading the register value (32 bit operations
+    # read its lower half, the others the sign extension of the immediate), None if it does not fit
+
+    if op_class == CLASS_ALU:
+        return value & U32_MASK
+    value = twos_comp(value, 64)
+    return value & U32_MASK if -(1 << 31) <= value < 1 << 31 else None
+
+
+class ConstantPropagation:
+    # Sparse conditional constant propagation of an XDP program: a forward pass over the acyclic CFG (in topological
+    # order) computing the registers holding a constant before each instruction. A block entry meets only the edges
+    # which can be executed: the if branches with constant operands have a single executable edge, and the equality
+    # they test makes the register constant on the edge where it holds. Registers written by loads, lddw and helper
+    # calls are unknown. The constants are then folded into the instructions by fold
+
+    def __init__(self, blocks, flow_graph):
+        self.blocks = blocks
+        self.flow_graph = flow_graph
+        self.inputs = {}  # global id -> {reg: value} of the constant input registers
+        self.values = {}  # global id -> constant written by the instruction
+        self.branches = {}  # global id -> True (False) if the if branch is always (never) taken
+        self.unreachable = []  # basic blocks never executed
+
+    def analyze(self):
+        order = self.flow_graph.topological_sort()
+        edges = {}  # (block, successor) -> constant registers on the edge, missing if never executed
+        for b in order:
+            blck = self.blocks[b]
+            states = [edges[p, b] for p in self.flow_graph.predecessors(b) if (p, b) in edges]
+            if b != order[0] and not states:
+                if blck.type == BlockType.BASIC:
+                    self.unreachable.append(b)
+                continue
+
+            consts = {reg: value for reg, value in states[0].items() if all(s.get(reg) == value for s in states)} \
+                if states else {}
+            for instr in blck.instructions:
+                self.__transfer(instr, consts)
+            for s in self.flow_graph.successors(b):
+                edges[b, s] = consts
+
+            last = blck.instructions[-1] if blck.type == BlockType.BASIC and blck.instructions else None
+            if last is None or not is_if_branch(last.unpkd) or blck.tnext[0] == blck.fnext:
+                continue
+            taken = self.branches.get(last.orig_pos)
+            if taken is not None:
+                del edges[b, blck.fnext if taken else blck.tnext[0]]
+            elif last.unpkd.opcode & OP_MASK in EQUALITY_OPS and last.unpkd.opcode & CLASS_MASK == CLASS_JMP:
+                equal = blck.tnext[0] if EQUALITY_OPS[last.unpkd.opcode & OP_MASK] else blck.fnext
+                edges[b, equal] = self.__equality(last.unpkd, consts)
+
+    def __transfer(self, instr, consts):
+        # This method updates the constant registers consts with the instruction, recording its constant inputs, the
+        # constant it writes and the outcome of if branches
+
+        unpkd = instr.unpkd
+        if is_call(unpkd):
+            for reg in mask_regs(helper(unpkd.immediate).clobbers):
+                consts.pop(reg, None)
+            return
+
+        inputs = {inp.sym_name: consts[inp.sym_name] for inp in instr.inputs if inp.sym_name in consts}
+        if inputs:
+            self.inputs[instr.orig_pos] = inputs
+        known = len(inputs) == len(instr.inputs)
+        regs = [inputs.get(reg, 0) for reg in range(NUM_REGS)]
+
+        if is_if_branch(unpkd):
+            if known:
+                self.branches[instr.orig_pos] = condition(unpkd, regs)
+            return
+        if instr.output is None:
+            return
+
+        dst = instr.output.sym_name
+        consts.pop(dst, None)
+        if known and is_foldable(unpkd.opcode):
+            if unpkd.opcode in MOV_ALU:  # Sephirot mov-alu: dst = src op imm
+                value = alu(unpkd._replace(opcode=MOV_ALU_TO_ALU[unpkd.opcode], dst=unpkd.src), regs)
+            else:
+                value = alu(unpkd, regs)
+            consts[dst] = self.values[instr.orig_pos] = value & U64_MASK
+
+    @staticmethod
+    def __equality(unpkd, consts):
+        # This method returns the constant registers on the edge where the if branch operands are equal
+
+        consts = dict(consts)
+        if not unpkd.opcode & SOURCE_REG:
+            consts[unpkd.dst] = twos_comp(unpkd.immediate, 32) & U64_MASK
+        elif unpkd.src in consts:
+            consts[unpkd.dst] = consts[unpkd.src]
+        elif unpkd.dst in consts:
+            consts[unpkd.src] = consts[unpkd.dst]
+        return consts
+
+    def fold(self, instr):
+        # This method returns the instruction with the constants folded, None if unchanged: the if branches with a
+        # known outcome become gotos (NOP if never taken), the ALU instructions writing a constant become immediate
+        # moves, the constant source registers of ALU instructions, if branches and stores become immediates (stores
+        # of zero are left to MemsetToZero)
+
+        unpkd = instr.unpkd
+        opcode = unpkd.opcode
+        op_class = opcode & CLASS_MASK
+        if instr.orig_pos in self.branches:
+            taken = self.branches[instr.orig_pos]
+            return pack_instruction(GOTO_OPCODE, offset=unpkd.offset) if taken and unpkd.offset != 0 else NOP
+
+        inputs = self.inputs.get(instr.orig_pos)
+        if inputs is None:
+            return None
+        value = self.values.get(instr.orig_pos)
+        if value is not None:
+            if immediate(value, CLASS_ALU64) is not None:
+                return pack_instruction(MOV_IMM, unpkd.dst, immediate=immediate(value, CLASS_ALU64))
+            if value <= U32_MASK:  # 32 bit moves zero the upper half
+                return pack_instruction(MOV32_IMM, unpkd.dst, immediate=value)
+
+        if not opcode & SOURCE_REG or unpkd.src not in inputs:
+            return None
+        value = inputs[unpkd.src]
+        if op_class == CLASS_STX and opcode & MODE_MASK == MODE_MEM:
+            size = SIZE_TO_BYTES[opcode & SIZE_MASK]
+            value &= (1 << 8 * size) - 1
+            if value == 0 or size == 8 and value >> 31:  # u64 stores sign extend the immediate
+                return None
+            return pack_instruction(CLASS_ST | opcode & SIZE_MASK | MODE_MEM, unpkd.dst, offset=unpkd.offset,
+                                    immediate=value)
+        imm_opcode = opcode & ~SOURCE_REG
+        if opcode in MOV_ALU or opcode & OP_MASK in (ALU_END, ALU_NEG) and op_class != CLASS_JMP or \
+                imm_opcode not in ALU and imm_opcode not in BRANCH_OPCODE or immediate(value, op_class) is None:
+            return None
+        return pack_instruction(imm_opcode, unpkd.dst, offset=unpkd.offset, immediate=immediate(value, op_class))
@@ -0,0 +1,156 @@
+from ebpf_parser import CLASS_ALU64, MOV, MOV_ALU_TO_ALU, STR_TO_ALU_OP, twos_comp, is_call, is_nop, is_mov_exit, \
+    get_mem_access
+from helpers import MemKind, helper, helper_args
+from ir import reg_mask, stack_transfer
+
+STACK_REG = 10
+STACK_SIZE = 512  # bytes of the stack frame, below r10
+ALL_STACK = (1 << STACK_SIZE) - 1
+ADD_IMM = STR_TO_ALU_OP["+="] | CLASS_ALU64
+SUB_IMM = STR_TO_ALU_OP["-="] | CLASS_ALU64
+
+
+def stack_bytes(off, size):
+    # This method returns the bitmask of the stack bytes r10 + off ... r10 + off + size - 1 (bit 0: r10 - STACK_SIZE),
+    # None if they are outside the stack frame
+
+    if off < -STACK_SIZE or off + size > 0:
+        return None
+    return ((1 << size) - 1) << off + STACK_SIZE
+
+
+class DeadCode:
+    # Dead code and dead store elimination of an XDP program: a backward liveness pass over the acyclic CFG (in reverse
+    # topological order, the uses of a definition are visited before it) of the registers and of the stack bytes. An
+    # instruction without side effects whose output is not live is dead, and so is a store to the stack (at a known
+    # offset from r10) whose bytes are all overwritten or never read before the exit. Dead instructions read nothing:
+    # the definitions read only by them are dead too. Helper calls read the stack through their pointer arguments
+    # (the bytes from the pointer to the frame top, the whole stack if the pointer offset or the memory they read is
+    # unknown). Loads with implicit address (ld_abs/ld_ind) are kept, other loads out of the stack too if keep_loads
+    # (their out of bounds packet accesses must fault with the hardware bounds protection)
+
+    def __init__(self, blocks, flow_graph, keep_loads=False):
+        self.blocks = blocks
+        self.flow_graph = flow_graph
+        self.keep_loads = keep_loads
+        self.dead = set()  # global ids of the dead instructions
+        self.dead_stores = set()  # global ids of the dead stack stores
+
+    def analyze(self):
+        # This method returns the global ids of the dead instructions
+
+        order = self.flow_graph.topological_sort()
+        pointers = self.__stack_pointers(order)
+
+        live_in = {}  # block -> (live registers, live stack bytes) at its entry
+        for b in reversed(order):
+            live, stack = 0, 0
+            for s in self.flow_graph.successors(b):
+                live |= live_in[s][0]
+                stack |= live_in[s][1]
+
+            blck = self.blocks[b]
+            for instr, (offsets, mask) in reversed(list(zip(blck.instructions, pointers[b]))):
+                unpkd = instr.unpkd
+                if is_nop(unpkd):
+                    continue
+                if is_call(unpkd):
+                    desc = helper(unpkd.immediate)
+                    if desc.reads & MemKind.STACK:
+                        stack |= self.__helper_reads(desc, offsets, mask)
+                    live = live & ~desc.clobbers | reg_mask(helper_args(unpkd.immediate))
+                    continue
+
+                uses = 0 if is_mov_exit(unpkd) else reg_mask(inp.sym_name for inp in instr.inputs)
+                defs = reg_mask([instr.output.sym_name]) if instr.output is not None else 0
+                access = get_mem_access(unpkd)
+                if access is None:
+                    if defs and not live & defs:
+                        self.dead.add(instr.orig_pos)
+                        continue
+                else:
+                    base, off, size, reads, writes = access
+                    accessed = stack_bytes(offsets[base] + off, size) if base in offsets else None
+                    if writes and not reads and accessed is not None:
+                        if not stack & accessed:
+                            self.dead.add(instr.orig_pos)
+                            self.dead_stores.add(instr.orig_pos)
+                            continue
+                        stack &= ~accessed
+                    elif reads:
+                        if base is not None and not live & defs and not writes and \
+                                (accessed is not None or not self.keep_loads):
+                            self.dead.add(instr.orig_pos)
+                            continue
+                        if accessed is not None:
+                            stack |= accessed
+                        elif base is not None and mask >> base & 1:
+                            stack |= ALL_STACK
+                live = live & ~defs | uses
+
+            live_in[b] = (live, stack)
+        return self.dead
+
+    def __stack_pointers(self, order):
+        # This method returns for each block the stack pointers before each of its instructions: the registers
+        # holding r10 + off (reg -> off) and the bitmask of the registers which may hold a stack pointer
+
+        exits = {}  # block -> (offsets, mask) at its exit
+        pointers = {}
+        for b in order:
+            preds = [exits[p] for p in self.flow_graph.predecessors(b) if p in exits]
+            if not preds:
+                offsets, mask = {STACK_REG: 0}, 1 << STACK_REG
+            else:
+                offsets = {reg: off for reg, off in preds[0][0].items() if all(p[0].get(reg) == off for p in preds)}
+                mask = 0
+                for p in preds:
+                    mask |= p[1]
+
+            pointers[b] = []
+            for instr in self.blocks[b].instructions:
+                pointers[b].append((offsets, mask))
+                offsets = self.__offsets_transfer(offsets, instr)
+                mask = stack_transfer(mask, instr.unpkd)
+            exits[b] = (offsets, mask)
+        return pointers
+
+    @staticmethod
+    def __offsets_transfer(offsets, instr):
+        # This method returns the registers holding r10 + off after the instruction
+
+        unpkd = instr.unpkd
+        if is_call(unpkd):
+            return {reg: off for reg, off in offsets.items() if not helper(unpkd.immediate).clobbers >> reg & 1}
+        if instr.output is None:
+            return offsets
+        dst = instr.output.sym_name
+        offsets = dict(offsets)
+        src = offsets.get(unpkd.src)
+        off = offsets.pop(dst, None)
+        if unpkd.opcode in MOV_ALU_TO_ALU:  # Sephirot mov-alu: dst = src op imm
+            opcode, off = MOV_ALU_TO_ALU[unpkd.opcode], src
+        else:
+            opcode = unpkd.opcode
+        if opcode == MOV and src is not None:
+            offsets[dst] = src
+        elif opcode == ADD_IMM and off is not None:
+            offsets[dst] = off + twos_comp(unpkd.immediate, 32)
+        elif opcode == SUB_IMM and off is not None:
+            offsets[dst] = off - twos_comp(unpkd.immediate, 32)
+        return offsets
+
+    @staticmethod
+    def __helper_reads(desc, offsets, mask):
+        # This method returns the stack bytes read by a helper call
+
+        if desc.mem_args is None:
+            return ALL_STACK
+        read = 0
+        for reg in desc.mem_args:
+            if reg in offsets:
+                frame = stack_bytes(offsets[reg], -offsets[reg]) if offsets[reg] < 0 else None
+                read |= frame if frame is not None else ALL_STACK
+            elif mask >> reg & 1:
+                read |= ALL_STACK
+        return read
@@ -0,0 +1,348 @@
+from ebpf_parser import unpack_instruction, twos_comp, is_if_branch, CLASS_MASK, OP_MASK, SOURCE_REG, SIZE_MASK, \
+    MODE_MASK, SIZE_TO_BYTES, CLASS_LDX, CLASS_ST, CLASS_STX, CLASS_ALU, CLASS_JMP, CLASS_JMP32, CLASS_ALU64, ALU_NEG, \
+    ALU_END, MODE_MEM, MODE_XADD, LDDW, MOV, NOP, GOTO_OPCODE, CALL_OPCODE, EXIT_OPCODE, MOV_ALU, MOV_ALU_TO_ALU, \
+    MOV_EXIT, LOAD48, STORE48, XDPAction
+from helpers import BPF_MAP_LOOKUP_ELEM, BPF_MAP_UPDATE_ELEM, BPF_KTIME_GET_NS, BPF_GET_SMP_PROCESSOR_ID, BPF_CSUM_DIFF, \
+    BPF_XDP_ADJUST_HEAD, BPF_REDIRECT_MAP, BPF_XDP_ADJUST_TAIL
+
+MASK32 = 0xffffffff
+MASK64 = 0xffffffffffffffff
+
+# address space of the interpreter: each memory region lives at its own base address
+CTX_BASE = 0x10000000
+STACK_BASE = 0x20000000
+PACKET_BASE = 0x30000000
+MAP_VALUE_BASE = 0x40000000
+
+STACK_SIZE = 512
+PACKET_HEADROOM = 256  # room for bpf_xdp_adjust_head
+PACKET_TAILROOM = 256  # room for bpf_xdp_adjust_tail
+ETH_HLEN = 14  # min packet size after adjust_head/adjust_tail
+MAP_KEY_SIZE = 4  # map keys are compared on their first bytes (map definitions are not in the dumps)
+MAP_VALUE_SIZE = 256  # bytes allocated for each map value
+MAX_STEPS = 1 << 16  # executed instructions per packet before giving up (the verifier bounds the program)
+
+# struct xdp_md fields offsets
+CTX_DATA = 0
+CTX_DATA_END = 4
+CTX_DATA_META = 8
+CTX_INGRESS_IFINDEX = 12
+CTX_RX_QUEUE_INDEX = 16
+CTX_SIZE = 24
+
+EINVAL = 22
+
+
+class InterpreterError(Exception):
+    pass
+
+
+def alu(unpkd, regs):
+    # This method computes the result of an ALU(64) instruction on the register values regs
+
+    opcode = unpkd.opcode
+    op = opcode & OP_MASK
+    bits = 64 if opcode & CLASS_MASK == CLASS_ALU64 else 32
+    mask = MASK64 if bits == 64 else MASK32
+    a = regs[unpkd.dst] & mask
+    b = (regs[unpkd.src] if opcode & SOURCE_REG else twos_comp(unpkd.immediate, 32)) & mask
+
+    if op == ALU_END:  # byte swap (le is a truncation on a little endian host)
+        size = unpkd.immediate // 8
+        value = regs[unpkd.dst] & ((1 << unpkd.immediate) - 1)
+        if opcode & SOURCE_REG:
+            value = int.from_bytes(value.to_bytes(size, byteorder='little'), byteorder='big')
+        return value
+    elif op == 0x00:
+        res = a + b
+    elif op == 0x10:
+        res = a - b
+    elif op == 0x20:
+        res = a * b
+    elif op == 0x30:
+        res = a // b if b != 0 else 0
+    elif op == 0x40:
+        res = a | b
+    elif op == 0x50:
+        res = a & b
+    elif op == 0x60:
+        res = a << (b & (bits - 1))
+    elif op == 0x70:
+        res = a >> (b & (bits - 1))
+    elif op == ALU_NEG:
+        res = -a
+    elif op == 0x90:
+        res = a % b if b != 0 else a
+    elif op == 0xa0:
+        res = a ^ b
+    elif op == 0xb0:
+        res = b
+    elif op == 0xc0:
+        res = twos_comp(a, bits) >> (b & (bits - 1))
+    else:
+        raise InterpreterError("unsupported ALU instruction 0x{:02x}".format(opcode))
+    return res & mask
+
+def condition(unpkd, regs):
+    # This method evaluates the condition of a conditional jump on the register values regs
+
+    opcode = unpkd.opcode
+    op = opcode & OP_MASK
+    bits = 64 if opcode & CLASS_MASK == CLASS_JMP else 32
+    mask = MASK64 if bits == 64 else MASK32
+    a = regs[unpkd.dst] & mask
+    b = (regs[unpkd.src] if opcode & SOURCE_REG else twos_comp(unpkd.immediate, 32)) & mask
+    sa, sb = twos_comp(a, bits), twos_comp(b, bits)
+
+    if op == 0x10:
+        return a == b
+    elif op == 0x20:
+        return a > b
+    elif op == 0x30:
+        return a >= b
+    elif op == 0x40:
+        return a & b != 0
+    elif op == 0x50:
+        return a != b
+    elif op == 0x60:
+        return sa > sb
+    elif op == 0x70:
+        return sa >= sb
+    elif op == 0xa0:
+        return a < b
+    elif op == 0xb0:
+        return a <= b
+    elif op == 0xc0:
+        return sa < sb
+    elif op == 0xd0:
+        return sa <= sb
+    raise InterpreterError("unsupported jump instruction 0x{:02x}".format(opcode))
+
+
+class EBPFInterpreter:
+    # Reference interpreter of eBPF XDP programs (with the Sephirot extensions): runs the program on packets counting
+    # how many times each instruction is executed and each conditional jump is taken. Map relocations are not applied
+    # by the readers: maps are identified by the lddw instruction which loaded r1 (moves propagate it). Lookups create
+    # the missing entries (array map semantics) unless lookup_hits is False
+
+    def __init__(self, program_bin, lookup_hits=True, max_steps=MAX_STEPS):
+        self.program_bin = program_bin
+        self.lookup_hits = lookup_hits
+        self.max_steps = max_steps
+
+        self.counts = [0] * len(program_bin)  # executions of each instruction
+        self.taken = [0] * len(program_bin)  # executions of each conditional jump with the jump taken
+        self.actions = {}  # returned value -> # of packets
+        self.packets = 0
+
+        self.maps = {}  # (lddw instruction id of the map, key) -> index of the value in map_values
+        self.map_values = []
+        self.time = 0
+
+        self.helpers = {BPF_MAP_LOOKUP_ELEM: self.__map_lookup_elem,
+                        BPF_MAP_UPDATE_ELEM: self.__map_update_elem,
+                        BPF_KTIME_GET_NS: self.__ktime_get_ns,
+                        BPF_GET_SMP_PROCESSOR_ID: self.__get_smp_processor_id,
+                        BPF_CSUM_DIFF: self.__csum_diff,
+                        BPF_XDP_ADJUST_HEAD: self.__xdp_adjust_head,
+                        BPF_REDIRECT_MAP: self.__redirect_map,
+                        BPF_XDP_ADJUST_TAIL: self.__xdp_adjust_tail}
+
+    def reset(self, packet, ingress_ifindex=0, rx_queue_index=0):
+        # This method loads the packet (bytes) in a new context and returns the registers at the program entry
+
+        self.packet = bytearray(PACKET_HEADROOM) + bytearray(packet) + bytearray(PACKET_TAILROOM)
+        self.stack = bytearray(STACK_SIZE)
+        self.ctx = bytearray(CTX_SIZE)
+        self.__write(self.ctx, CTX_DATA, 4, PACKET_BASE + PACKET_HEADROOM)
+        self.__write(self.ctx, CTX_DATA_END, 4, PACKET_BASE + PACKET_HEADROOM + len(packet))
+        self.__write(self.ctx, CTX_DATA_META, 4, PACKET_BASE + PACKET_HEADROOM)
+        self.__write(self.ctx, CTX_INGRESS_IFINDEX, 4, ingress_ifindex)
+        self.__write(self.ctx, CTX_RX_QUEUE_INDEX, 4, rx_queue_index)
+
+        regs = [0] * 16
+        self.lddw = [None] * 16  # register -> lddw instruction id which loaded its value (map references)
+        regs[1] = CTX_BASE
+        regs[10] = STACK_BASE + STACK_SIZE
+        return regs
+
+    def run(self, packet, ingress_ifindex=0, rx_queue_index=0):
+        # This method runs the program on the packet (bytes) and returns the XDP action (r0 on exit)
+
+        regs = self.reset(packet, ingress_ifindex, rx_queue_index)
+        pc, steps = 0, 0
+        while pc is not None:
+            if pc < 0 or pc >= len(self.program_bin):
+                raise InterpreterError("jump outside the program at instruction " + str(pc))
+            steps += 1
+            if steps > self.max_steps:
+                raise InterpreterError("more than " + str(self.max_steps) + " instructions executed")
+
+            self.counts[pc] += 1
+            unpkd = unpack_instruction(self.program_bin[pc])
+            if unpkd.opcode == LDDW:
+                self.counts[pc + 1] += 1
+            next_b = self.program_bin[pc + 1] if pc + 1 < len(self.program_bin) else NOP
+            next_pc = self.execute(pc, self.program_bin[pc], regs, next_b)
+            if is_if_branch(unpkd) and next_pc != pc + 1:
+                self.taken[pc] += 1
+            pc = next_pc
+
+        action = regs[0] & MASK32
+        self.actions[action] = self.actions.get(action, 0) + 1
+        self.packets += 1
+        return action
+
+    def execute(self, pc, instr_b, regs, next_b=NOP):
+        # This method executes the instruction instr_b, at pc in the program (next_b is the following instruction,
+        # upper half of lddw), on the registers regs. Returns the pc of the next instruction, None on exit
+
+        unpkd = unpack_instruction(instr_b)
+        opcode = unpkd.opcode
+        op_class = opcode & CLASS_MASK
+
+        if opcode in MOV_ALU:  # Sephirot mov-alu: dst = src op imm
+            regs[unpkd.dst] = alu(unpkd._replace(opcode=MOV_ALU_TO_ALU[opcode], dst=unpkd.src), regs)
+            self.lddw[unpkd.dst] = None
+        elif opcode == MOV_EXIT:
+            regs[0] = unpkd.immediate
+            return None
+        elif opcode == LOAD48:
+            regs[unpkd.dst] = self.load(regs[unpkd.src] + unpkd.offset, 6)
+            self.lddw[unpkd.dst] = None
+        elif opcode == STORE48:
+            self.store(regs[unpkd.dst] + unpkd.offset, 6, regs[unpkd.src])
+        elif op_class == CLASS_ALU64 or op_class == CLASS_ALU:
+            regs[unpkd.dst] = alu(unpkd, regs)
+            self.lddw[unpkd.dst] = self.lddw[unpkd.src] if opcode == MOV else None
+        elif op_class == CLASS_JMP or op_class == CLASS_JMP32:
+            if opcode == EXIT_OPCODE:
+                return None
+            elif opcode == CALL_OPCODE:
+                if unpkd.immediate not in self.helpers:
+                    raise InterpreterError("unsupported helper function " + str(unpkd.immediate))
+                regs[0] = self.helpers[unpkd.immediate](regs) & MASK64
+                self.lddw[0] = None
+            elif opcode == GOTO_OPCODE or condition(unpkd, regs):
+                return pc + unpkd.offset + 1
+        elif opcode == LDDW:  # the second half of the instruction holds the upper 32 bits of the immediate
+            regs[unpkd.dst] = unpkd.immediate | unpack_instruction(next_b).immediate << 32
+            self.lddw[unpkd.dst] = pc
+            return pc + 2
+        elif op_class == CLASS_LDX and opcode & MODE_MASK == MODE_MEM:
+            regs[unpkd.dst] = self.load(regs[unpkd.src] + unpkd.offset, SIZE_TO_BYTES[opcode & SIZE_MASK])
+            self.lddw[unpkd.dst] = None
+        elif op_class == CLASS_ST and opcode & MODE_MASK == MODE_MEM:
+            self.store(regs[unpkd.dst] + unpkd.offset, SIZE_TO_BYTES[opcode & SIZE_MASK], unpkd.immediate)
+        elif op_class == CLASS_STX and opcode & MODE_MASK == MODE_MEM:
+            self.store(regs[unpkd.dst] + unpkd.offset, SIZE_TO_BYTES[opcode & SIZE_MASK], regs[unpkd.src])
+        elif op_class == CLASS_STX and opcode & MODE_MASK == MODE_XADD:
+            size = SIZE_TO_BYTES[opcode & SIZE_MASK]
+            addr = regs[unpkd.dst] + unpkd.offset
+            self.store(addr, size, self.load(addr, size) + regs[unpkd.src])
+        elif opcode != NOP:
+            raise InterpreterError("unsupported instruction 0x{:02x} at {}".format(opcode, pc))
+        return pc + 1
+
+    def __region(self, addr, size):
+        # This method resolves an address to (memory region, offset in the region)
+
+        if MAP_VALUE_BASE <= addr < MAP_VALUE_BASE + len(self.map_values) * MAP_VALUE_SIZE:
+            index = (addr - MAP_VALUE_BASE) // MAP_VALUE_SIZE
+            region, base = self.map_values[index], MAP_VALUE_BASE + index * MAP_VALUE_SIZE
+        elif PACKET_BASE <= addr < PACKET_BASE + len(self.packet):
+            region, base = self.packet, PACKET_BASE
+        elif STACK_BASE <= addr < STACK_BASE + STACK_SIZE:
+            region, base = self.stack, STACK_BASE
+        elif CTX_BASE <= addr < CTX_BASE + CTX_SIZE:
+            region, base = self.ctx, CTX_BASE
+        else:
+            raise InterpreterError("invalid memory access at 0x{:x}".format(addr))
+
+        if addr + size > base + len(region):
+            raise InterpreterError("out of bounds memory access at 0x{:x} ({} bytes)".format(addr, size))
+        return region, addr - base
+
+    @staticmethod
+    def __read(region, offset, size):
+        return int.from_bytes(region[offset:offset + size], byteorder='little')
+
+    @staticmethod
+    def __write(region, offset, size, value):
+        region[offset:offset + size] = (value & ((1 << 8 * size) - 1)).to_bytes(size, byteorder='little')
+
+    def load(self, addr, size):
+        region, offset = self.__region(addr & MASK64, size)
+        return self.__read(region, offset, size)
+
+    def store(self, addr, size, value):
+        region, offset = self.__region(addr & MASK64, size)
+        self.__write(region, offset, size, value)
+
+    def __bytes(self, addr, size):
+        # This method reads size bytes (at most the bytes left in the region)
+
+        region, offset = self.__region(addr & MASK64, 1)
+        return bytes(region[offset:offset + size])
+
+    def __map_entry(self, key_addr, create):
+        # This method returns the address of the value of the map entry of the map in r1 (0 if missing and not
+        # created)
+
+        key = (self.lddw[1], self.__bytes(key_addr, MAP_KEY_SIZE))
+        if key not in self.maps:
+            if not create:
+                return 0
+            self.maps[key] = len(self.map_values)
+            self.map_values.append(bytearray(MAP_VALUE_SIZE))
+        return MAP_VALUE_BASE + self.maps[key] * MAP_VALUE_SIZE
+
+    def __map_lookup_elem(self, regs):
+        return self.__map_entry(regs[2], self.lookup_hits)
+
+    def __map_update_elem(self, regs):
+        index = (self.__map_entry(regs[2], True) - MAP_VALUE_BASE) // MAP_VALUE_SIZE
+        value = self.__bytes(regs[3], MAP_VALUE_SIZE)
+        self.map_values[index][:len(value)] = value
+        return 0
+
+    def __ktime_get_ns(self, regs):
+        self.time += 1000
+        return self.time
+
+    @staticmethod
+    def __get_smp_processor_id(regs):
+        return 0
+
+    def __csum_diff(self, regs):
+        # 32 bit one's complement sum of the to words minus the from words, plus the seed
+
+        csum = regs[5] & MASK32
+        for addr, size, neg in ((regs[1], regs[2], True), (regs[3], regs[4], False)):
+            for i in range(0, size & MASK32, 4):
+                word = self.load(addr + i, 4)
+                csum += (~word & MASK32) if neg else word
+        while csum >> 32:
+            csum = (csum & MASK32) + (csum >> 32)
+        return csum
+
+    def __xdp_adjust_head(self, regs):
+        data = self.__read(self.ctx, CTX_DATA, 4) + twos_comp(regs[2] & MASK32, 32)
+        data_end = self.__read(self.ctx, CTX_DATA_END, 4)
+        if data < PACKET_BASE or data > data_end - ETH_HLEN:
+            return -EINVAL
+        self.__write(self.ctx, CTX_DATA, 4, data)
+        self.__write(self.ctx, CTX_DATA_META, 4, data)
+        return 0
+
+    def __xdp_adjust_tail(self, regs):
+        data = self.__read(self.ctx, CTX_DATA, 4)
+        data_end = self.__read(self.ctx, CTX_DATA_END, 4) + twos_comp(regs[2] & MASK32, 32)
+        if data_end < data + ETH_HLEN or data_end > PACKET_BASE + len(self.packet):
+            return -EINVAL
+        self.__write(self.ctx, CTX_DATA_END, 4, data_end)
+        return 0
+
+    @staticmethod
+    def __redirect_map(regs):
+        return XDPAction.REDIRECT
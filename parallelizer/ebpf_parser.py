@@ -7,7 +7,12 @@ msb                                                                   lsb
 +-------------+-------+-------+----------------+------------------------+
 0            7 8    11 12   15 16            31 32                     63
 """
+import re
+from collections import namedtuple
 from enum import IntEnum
+from functools import lru_cache
+
+import numpy as np
 
 # eBPF instruction field masks
 OPCODE_MASK = 0xff
@@ -30,6 +35,9 @@ SRC_SHIFT_MOD = 52
 OFFSET_SHIFT_MOD = 32
 IMMEDIATE_SHIFT_MOD = 0
 
+# max number of distinct raw instructions kept decoded by unpack_instruction
+UNPACK_CACHE_SIZE = 4096
+
 # eBPF standard opcodes
 BRANCH_OPCODE = {0x05, 0x15, 0x1d, 0x25, 0x2d, 0x35, 0x3d, 0xa5, 0xad, 0xb5, 0xbd, 0x45, 0x4d, 0x55, 0x5d, 0x65, 0x6d,
                  0x75, 0x7d, 0xc5, 0xcd, 0xd5, 0xdd, 0x85, 0x95, 0x96}
@@ -38,9 +46,11 @@ IF_BRANCH = BRANCH_OPCODE.difference(BRANCH_NO_INPUT)  # jumps
 IF_GREATER = {0x2d, 0x3d}  # if rx >[=] ry jumps
 CALL_OPCODE = 0x85
 GOTO_OPCODE = 0x05
+EXIT_OPCODE = 0x95
 EXIT = {0x95, 0x96}
 
 MOV = 0xbf
+LDDW = 0x18
 ALU_ADD_IMM = {0x07, 0x8f}
 ALU_ADD_REG = {0x0f}
 NOP = 0x0
@@ -90,64 +100,307 @@ STORE_TO_SIZE = {0x63: 32, 0x6b: 16, 0x73: 8, 0x7b: 64, 0x5a: 48}
 LOAD_TO_SIZE48 = {0x69: 16, 0x71: 8}
 STORE_TO_SIZE48 = {0x6b: 16, 0x73: 8}
 
+# eBPF opcode sub-fields, used to build the mnemonics
+CLASS_MASK = 0x07
+OP_MASK = 0xf0
+SOURCE_REG = 0x08
+SIZE_MASK = 0x18
+MODE_MASK = 0xe0
+
+CLASS_LD = 0x00
+CLASS_LDX = 0x01
+CLASS_ST = 0x02
+CLASS_STX = 0x03
+CLASS_ALU = 0x04
+CLASS_JMP = 0x05
+CLASS_JMP32 = 0x06
+CLASS_ALU64 = 0x07
+
+ALU_NEG = 0x80
+ALU_END = 0xd0
+MODE_ABS = 0x20
+MODE_IND = 0x40
+MODE_MEM = 0x60
+MODE_XADD = 0xc0
+
+# mnemonics (llvm-objdump syntax)
+ALU_OP_TO_STR = {0x00: "+=", 0x10: "-=", 0x20: "*=", 0x30: "/=", 0x40: "|=", 0x50: "&=", 0x60: "<<=", 0x70: ">>=",
+                 0x90: "%=", 0xa0: "^=", 0xb0: "=", 0xc0: "s>>="}
+JMP_OP_TO_STR = {0x10: "==", 0x20: ">", 0x30: ">=", 0x40: "&", 0x50: "!=", 0x60: "s>", 0x70: "s>=", 0xa0: "<",
+                 0xb0: "<=", 0xc0: "s<", 0xd0: "s<="}
+SIZE_TO_STR = {0x00: "u32", 0x08: "u16", 0x10: "u8", 0x18: "u64"}
+SIZE_TO_BYTES = {0x00: 4, 0x08: 2, 0x10: 1, 0x18: 8}
+MOV_ALU_TO_ALU = {CORRESPONDENT[x]: x for x in CORRESPONDENT}
+
+STR_TO_ALU_OP = {ALU_OP_TO_STR[x]: x for x in ALU_OP_TO_STR}
+STR_TO_JMP_OP = {JMP_OP_TO_STR[x]: x for x in JMP_OP_TO_STR}
+STR_TO_SIZE = {SIZE_TO_STR[x]: x for x in SIZE_TO_STR}
+STR_TO_MOV_ALU = {ALU_OP_TO_STR[x & OP_MASK][:-1] + ("" if x & CLASS_MASK == CLASS_ALU64 else "32"): CORRESPONDENT[x]
+                  for x in CORRESPONDENT}
+
+# assembler syntax (inverse of disassemble), matched in order
+REG_RE = "([rw])(\\d+)"
+IMM_RE = "(-?\\d+)"
+MEM_RE = "\\(r(\\d+) ([+-]) (\\d+)\\)"
+ALU_OP_RE = "(" + "|".join(re.escape(op) for op in sorted(STR_TO_ALU_OP, key=len, reverse=True)) + ")"
+JMP_OP_RE = "(" + "|".join(re.escape(op) for op in sorted(STR_TO_JMP_OP, key=len, reverse=True)) + ")"
+ASM_SYNTAX = [("nop", re.compile("NOP$")),
+              ("mov_exit", re.compile("exit " + IMM_RE + "$")),
+              ("exit", re.compile("exit$")),
+              ("call", re.compile("call " + IMM_RE + "$")),
+              ("goto", re.compile("goto ([+-]\\d+)$")),
+              ("if", re.compile("if " + REG_RE + " " + JMP_OP_RE + " (?:[rw](\\d+)|" + IMM_RE + ") goto ([+-]\\d+)$")),
+              ("load48", re.compile("r(\\d+) = \\*\\(uint48 \\*\\) \\(r(\\d+) \\+ " + IMM_RE + "\\)$")),
+              ("store48", re.compile("\\*\\(uint48 \\*\\) \\(r(\\d+) \\+ " + IMM_RE + "\\) = r(\\d+)$")),
+              ("ld_pseudo", re.compile("ld_pseudo\\tr(\\d+), (\\d+), (\\d+)$")),
+              ("lddw", re.compile("r(\\d+) = " + IMM_RE + " ll$")),
+              ("ld_abs", re.compile("r0 = \\*\\((u\\d+) \\*\\)skb\\[" + IMM_RE + "\\]$")),
+              ("ld_ind", re.compile("r0 = \\*\\((u\\d+) \\*\\)skb\\[r(\\d+) \\+ " + IMM_RE + "\\]$")),
+              ("ldx", re.compile("r(\\d+) = \\*\\((u\\d+) \\*\\)" + MEM_RE + "$")),
+              ("stx", re.compile("\\*\\((u\\d+) \\*\\)" + MEM_RE + " = r(\\d+)$")),
+              ("st", re.compile("\\*\\((u\\d+) \\*\\)" + MEM_RE + " = " + IMM_RE + "$")),
+              ("xadd", re.compile("lock \\*\\((u\\d+) \\*\\)" + MEM_RE + " \\+= r(\\d+)$")),
+              ("end", re.compile("r(\\d+) = (be|le)(\\d+) r\\d+$")),
+              ("neg", re.compile(REG_RE + " = -[rw]\\d+$")),
+              ("mov_alu", re.compile(REG_RE + " = [rw](\\d+) ([^ =]+) \\(?" + IMM_RE + "\\)?$")),
+              ("alu", re.compile(REG_RE + " " + ALU_OP_RE + " (?:[rw](\\d+)|" + IMM_RE + ")$"))]
+
+
+# decoded instruction fields, immutable so that it can be shared between passes and cached
+UnpackedInstruction = namedtuple("UnpackedInstruction", ["opcode", "dst", "src", "offset", "immediate"])
+
+# decoded whole program, one record per instruction (see unpack_program)
+PROGRAM_DTYPE = np.dtype([("opcode", np.uint8),
+                          ("dst", np.uint8),
+                          ("src", np.uint8),
+                          ("offset", np.int16),
+                          ("immediate", np.uint32)])
+
 
 class XDPAction(IntEnum):
     ABORTED = 0,
     DROP = 1,
     PASS = 2,
-    TX = 3
+    TX = 3,
+    REDIRECT = 4
+
+
+class InputForm(IntEnum):
+    NONE = 0,  # no input operands
+    DST = 1,  # input operand on dst field only
+    SRC = 2,  # input operand on src field only
+    SRC_DST = 3,  # input operands on both src & dst fields
+    RETURN = 4  # exit, reads the return register r0
+
+
+class BranchKind(IntEnum):
+    NONE = 0,  # not a branch
+    IF = 1,  # conditional jump
+    GOTO = 2,  # unconditional jump
+    CALL = 3,  # helper function call
+    EXIT = 4  # exit and mov-exit
+
+
+# properties of an opcode, precomputed for all the 256 opcodes in OPCODES
+OpcodeDescriptor = namedtuple("OpcodeDescriptor", ["inputs",  # InputForm
+                                                   "no_input",  # in NO_INPUT
+                                                   "output",  # has an output operand (dst)
+                                                   "branch_kind",  # BranchKind
+                                                   "branch",  # any branch (jumps, calls & exits)
+                                                   "jump",  # conditional or unconditional jump
+                                                   "if_greater",  # if rx >[=] ry jumps
+                                                   "alu",
+                                                   "alu_add_imm",
+                                                   "alu_add_reg",
+                                                   "mov",
+                                                   "mov_imm",
+                                                   "nop",
+                                                   "load",
+                                                   "store",
+                                                   "load_size",  # memory access size in bits (None if not a load)
+                                                   "store_size",  # memory access size in bits (None if not a store)
+                                                   "load48",  # candidate to be promoted to load48
+                                                   "store48",  # candidate to be promoted to store48
+                                                   "sephirot",  # Sephirot ISA extension
+                                                   "correspondent",  # mov-alu opcode (None if not optimizable)
+                                                   "mov_alu",  # Sephirot mov-alu instruction
+                                                   "mov_exit",
+                                                   "mem_read",  # reads memory (loads, xadd)
+                                                   "mem_write",  # writes memory (stores, xadd)
+                                                   "mem_bytes",  # accessed bytes (None if no memory access)
+                                                   "mem_base"])  # InputForm of the address register (NONE: packet)
+
+
+def describe_opcode(opcode):
+    # computes the OpcodeDescriptor of opcode from the opcode sets
+
+    if opcode in ONLY_SRC_INPUT:
+        inputs = InputForm.SRC
+    elif opcode in ONLY_DST_INPUT:
+        inputs = InputForm.DST
+    elif opcode in DST_SRC_INPUT:
+        inputs = InputForm.SRC_DST
+    elif opcode in EXIT:
+        inputs = InputForm.RETURN
+    else:
+        inputs = InputForm.NONE
+
+    if opcode in EXIT:
+        branch_kind = BranchKind.EXIT
+    elif opcode == CALL_OPCODE:
+        branch_kind = BranchKind.CALL
+    elif opcode == GOTO_OPCODE:
+        branch_kind = BranchKind.GOTO
+    elif opcode in IF_BRANCH:
+        branch_kind = BranchKind.IF
+    else:
+        branch_kind = BranchKind.NONE
+
+    mem_read, mem_write, mem_base = False, False, InputForm.NONE
+    if opcode == LOAD48 or opcode in LOAD_OPCODE and opcode & CLASS_MASK == CLASS_LDX:
+        mem_read, mem_base = True, InputForm.SRC
+    elif opcode in LOAD_OPCODE and opcode != LDDW:  # ld_abs & ld_ind, implicit packet address
+        mem_read = True
+    elif opcode in STORE_OPCODE:
+        mem_write, mem_base = True, InputForm.DST
+    elif opcode & CLASS_MASK == CLASS_STX and opcode & MODE_MASK == MODE_XADD:
+        mem_read, mem_write, mem_base = True, True, InputForm.DST
+
+    if opcode in {LOAD48, STORE48}:
+        mem_bytes = 6
+    elif mem_read or mem_write:
+        mem_bytes = SIZE_TO_BYTES[opcode & SIZE_MASK]
+    else:
+        mem_bytes = None
+
+    return OpcodeDescriptor(inputs=inputs,
+                            no_input=opcode in NO_INPUT,
+                            output=opcode not in NO_OUTPUT,
+                            branch_kind=branch_kind,
+                            branch=opcode in BRANCH_OPCODE,
+                            jump=branch_kind == BranchKind.IF or branch_kind == BranchKind.GOTO,
+                            if_greater=opcode in IF_GREATER,
+                            alu=opcode in ALU,
+                            alu_add_imm=opcode in ALU_ADD_IMM,
+                            alu_add_reg=opcode in ALU_ADD_REG,
+                            mov=opcode == MOV,
+                            mov_imm=opcode == MOV_IMM,
+                            nop=opcode == NOP,
+                            load=opcode in LOAD_OPCODE,
+                            store=opcode in STORE_OPCODE,
+                            load_size=LOAD_TO_SIZE.get(opcode),
+                            store_size=STORE_TO_SIZE.get(opcode),
+                            load48=opcode in LOAD_TO_SIZE48,
+                            store48=opcode in STORE_TO_SIZE48,
+                            sephirot=opcode in MOV_ALU or opcode in {LOAD48, STORE48, MOV_EXIT},
+                            correspondent=CORRESPONDENT.get(opcode),
+                            mov_alu=opcode in MOV_ALU,
+                            mov_exit=opcode == MOV_EXIT,
+                            mem_read=mem_read,
+                            mem_write=mem_write,
+                            mem_bytes=mem_bytes,
+                            mem_base=mem_base)
+
+
+OPCODES = tuple(describe_opcode(opcode) for opcode in range(OPCODE_MASK + 1))  # opcode -> OpcodeDescriptor
+
+
+def check_opcode_table():
+    # self-check of the OPCODES table against the opcode sets, returns the list of inconsistent (opcode, property)
+
+    errors = []
+    for opcode in range(OPCODE_MASK + 1):
+        unpkd = UnpackedInstruction(opcode, 1, 2, 0, 0)
+        expected = {"is_branch": opcode in BRANCH_OPCODE,
+                    "is_call": opcode == CALL_OPCODE,
+                    "is_goto": opcode == GOTO_OPCODE,
+                    "is_jump": opcode in BRANCH_OPCODE - EXIT.union({CALL_OPCODE}),
+                    "is_if_branch": opcode in IF_BRANCH,
+                    "is_if_greater_eq": opcode in IF_GREATER,
+                    "is_exit": opcode in EXIT,
+                    "is_mov_exit": opcode == MOV_EXIT,
+                    "is_no_input_branch": opcode in BRANCH_NO_INPUT,
+                    "is_no_offset_branch": opcode in BRANCH_NO_OFFSET,
+                    "is_alu": opcode in ALU,
+                    "is_alu_add_imm": opcode in ALU_ADD_IMM,
+                    "is_alu_add_reg": opcode in ALU_ADD_REG,
+                    "is_mov_imm": opcode == MOV_IMM,
+                    "is_mov": opcode == MOV,
+                    "is_nop": opcode == NOP,
+                    "is_load": opcode in LOAD_OPCODE,
+                    "is_store": opcode in STORE_OPCODE,
+                    "is_no_input": opcode not in NO_INPUT,
+                    "is_optimizable_mov_alu": opcode in CORRESPONDENT,
+                    "is_optimized_mov_alu": opcode in MOV_ALU,
+                    "is_a_load48": opcode in LOAD_TO_SIZE48,
+                    "is_a_store48": opcode in STORE_TO_SIZE48,
+                    "load_to_size": LOAD_TO_SIZE.get(opcode),
+                    "store_to_size": STORE_TO_SIZE.get(opcode),
+                    "get_output": None if opcode in NO_OUTPUT else 1,
+                    "get_inputs": [2] if opcode in ONLY_SRC_INPUT else [1] if opcode in ONLY_DST_INPUT else
+                    [2, 1] if opcode in DST_SRC_INPUT else [0] if opcode in EXIT else []}
+
+        for name in expected:
+            if globals()[name](unpkd) != expected[name]:
+                errors.append((opcode, name))
+
+        if get_correspondent(opcode) != CORRESPONDENT.get(opcode):
+            errors.append((opcode, "get_correspondent"))
+        if OPCODES[opcode].sephirot != (opcode in MOV_ALU.union({LOAD48, STORE48, MOV_EXIT})):
+            errors.append((opcode, "sephirot"))
+    return errors
 
 
 def is_if_greater_eq(unpkd):
-    return unpkd["opcode"] in IF_GREATER
+    return OPCODES[unpkd.opcode].if_greater
 
 
 def is_branch(unpacked_instruction):
-    return unpacked_instruction["opcode"] in BRANCH_OPCODE
+    return OPCODES[unpacked_instruction.opcode].branch
 
 
 def is_call(unpacked_instruction):
-    return unpacked_instruction["opcode"] == CALL_OPCODE
+    return OPCODES[unpacked_instruction.opcode].branch_kind == BranchKind.CALL
 
 
 def is_goto(unpacked_instruction):
-    return unpacked_instruction["opcode"] == GOTO_OPCODE
+    return OPCODES[unpacked_instruction.opcode].branch_kind == BranchKind.GOTO
 
 
 def is_jump(unpkd):
-    return unpkd["opcode"] in BRANCH_OPCODE - EXIT.union({CALL_OPCODE})
+    return OPCODES[unpkd.opcode].jump
 
 
 def is_exit(unpkd):
-    return unpkd["opcode"] in EXIT
+    return OPCODES[unpkd.opcode].branch_kind == BranchKind.EXIT
 
 
 def is_mov_exit(unpkd):
-    return unpkd["opcode"] == MOV_EXIT
+    return OPCODES[unpkd.opcode].mov_exit
 
 
 def is_alu(unpkd):
-    return unpkd["opcode"] in ALU
+    return OPCODES[unpkd.opcode].alu
 
 
 def is_alu_add_imm(unpkd):
-    return unpkd["opcode"] in ALU_ADD_IMM
+    return OPCODES[unpkd.opcode].alu_add_imm
 
 
 def is_alu_add_reg(unpkd):
-    return unpkd["opcode"] in ALU_ADD_REG
+    return OPCODES[unpkd.opcode].alu_add_reg
 
 
 def is_mov_imm(unpkd):
-    return unpkd["opcode"] == MOV_IMM
+    return OPCODES[unpkd.opcode].mov_imm
 
 
 def is_mov(unpkd):
-    return unpkd["opcode"] == MOV
+    return OPCODES[unpkd.opcode].mov
 
 
 def get_correspondent(opcode):
-    return CORRESPONDENT.get(opcode)
+    return OPCODES[opcode].correspondent
 
 
 def big_to_little(instruct, size=8, signed=False):
@@ -166,65 +419,245 @@ def twos_comp(val, bits):
 
 
 def modify_offset(instruct, offset):
-    offset = little_to_big(offset, 2, True)
-
-    for i in range(16):
-        bit = ((offset & (1 << i)) != 0)
-        if bit == 0:
-            instruct &= ~(1 << (i + OFFSET_SHIFT_MOD))
-        else:
-            instruct |= (1 << (i + OFFSET_SHIFT_MOD))
-    return instruct
+    return instruct & ~(OFFSET_MASK << OFFSET_SHIFT_MOD) | \
+           (little_to_big(offset, 2, True) & OFFSET_MASK) << OFFSET_SHIFT_MOD
 
 
 def copy_immediate(instruct, immediate):
-    immediate = little_to_big(immediate, size=4)
-
-    for i in range(32):
-        bit = ((immediate & (1 << i)) != 0)
-        if bit == 0:
-            instruct &= ~(1 << (i + IMMEDIATE_SHIFT_MOD))
-        else:
-            instruct |= (1 << (i + IMMEDIATE_SHIFT_MOD))
-    return instruct
+    return instruct & ~(IMMEDIATE_MASK << IMMEDIATE_SHIFT_MOD) | little_to_big(immediate, size=4) << IMMEDIATE_SHIFT_MOD
 
 
 def modify_register(instruct, register, shift):
-    register = little_to_big(register, size=1)
-
-    for i in range(4):
-        bit = ((register & (1 << i)) != 0)
-        if bit == 0:
-            instruct &= ~(1 << (i + shift))
-        else:
-            instruct |= (1 << (i + shift))
-    return instruct
+    return instruct & ~(DST_MASK << shift) | (register & DST_MASK) << shift
 
 
 def extract_field(instruct, mask, shift):
     return little_to_big(instruct) >> shift & mask
 
 
+@lru_cache(maxsize=UNPACK_CACHE_SIZE)
 def unpack_instruction(instruct):
-    return {"opcode": extract_field(instruct, OPCODE_MASK, OPCODE_SHIFT),
-            "dst": extract_field(instruct, DST_MASK, DST_SHIFT),
-            "src": extract_field(instruct, SRC_MASK, SRC_SHIFT),
-            "offset": twos_comp(extract_field(instruct, OFFSET_MASK, OFFSET_SHIFT), 16),
-            "immediate": extract_field(instruct, IMMEDIATE_MASK, IMMEDIATE_SHIFT)
-            }
+    # decodes the raw instruction with a single byte swap, results are memoized on the raw 64 bit word
+    swapped = little_to_big(instruct)
+    return UnpackedInstruction(swapped >> OPCODE_SHIFT & OPCODE_MASK,
+                               swapped >> DST_SHIFT & DST_MASK,
+                               swapped >> SRC_SHIFT & SRC_MASK,
+                               twos_comp(swapped >> OFFSET_SHIFT & OFFSET_MASK, 16),
+                               swapped >> IMMEDIATE_SHIFT & IMMEDIATE_MASK)
 
 
-def get_inputs(unpacked_instruction):
-    if unpacked_instruction["opcode"] in ONLY_SRC_INPUT:
-        return [unpacked_instruction["src"]]
-    elif unpacked_instruction["opcode"] in ONLY_DST_INPUT:
-        return [unpacked_instruction["dst"]]
-    elif unpacked_instruction["opcode"] in DST_SRC_INPUT:
-        return [unpacked_instruction["src"], unpacked_instruction["dst"]]
-    elif is_exit(unpacked_instruction):
-        return [0]
+def pack_instruction(opcode, dst=0, src=0, offset=0, immediate=0):
+    # inverse of unpack_instruction, negative offset and immediate are encoded in 2's complement
+    return (opcode & OPCODE_MASK) << OPCODE_SHIFT_MOD | (src & SRC_MASK) << SRC_SHIFT_MOD | \
+           (dst & DST_MASK) << DST_SHIFT_MOD | little_to_big(offset & OFFSET_MASK, 2) << OFFSET_SHIFT_MOD | \
+           little_to_big(immediate & IMMEDIATE_MASK, 4) << IMMEDIATE_SHIFT_MOD
+
+
+def unpack_program(program_bin):
+    # vectorized unpack_instruction: decodes the whole program in a structured array (PROGRAM_DTYPE)
+
+    swapped = np.array(program_bin, dtype=np.uint64).byteswap()
+
+    program = np.empty(len(swapped), dtype=PROGRAM_DTYPE)
+    program["opcode"] = swapped >> OPCODE_SHIFT & OPCODE_MASK
+    program["dst"] = swapped >> DST_SHIFT & DST_MASK
+    program["src"] = swapped >> SRC_SHIFT & SRC_MASK
+    program["offset"] = (swapped >> OFFSET_SHIFT & OFFSET_MASK).astype(np.uint16).view(np.int16)
+    program["immediate"] = swapped >> IMMEDIATE_SHIFT & IMMEDIATE_MASK
+    return program
+
+
+def opcode_lut(prop):
+    # returns a 256 entries boolean table with the given OpcodeDescriptor property of each opcode
+    return np.array([bool(getattr(descriptor, prop)) for descriptor in OPCODES])
+
+
+# opcode class tables used to compute the masks of an unpacked program
+JUMP_LUT = opcode_lut("jump")
+CALL_LUT = np.array([descriptor.branch_kind == BranchKind.CALL for descriptor in OPCODES])
+EXIT_LUT = np.array([descriptor.branch_kind == BranchKind.EXIT for descriptor in OPCODES])
+BRANCH_LUT = opcode_lut("branch")
+LOAD_LUT = opcode_lut("load")
+STORE_LUT = opcode_lut("store")
+ALU_LUT = opcode_lut("alu")
+
+
+def jump_mask(program):
+    return JUMP_LUT[program["opcode"]]
+
+
+def call_mask(program):
+    return CALL_LUT[program["opcode"]]
+
+
+def exit_mask(program):
+    return EXIT_LUT[program["opcode"]]
+
+
+def branch_mask(program):
+    return BRANCH_LUT[program["opcode"]]
+
+
+def load_mask(program):
+    return LOAD_LUT[program["opcode"]]
+
+
+def store_mask(program):
+    return STORE_LUT[program["opcode"]]
+
+
+def alu_mask(program):
+    return ALU_LUT[program["opcode"]]
+
+
+def disassemble(instruct):
+    # returns the mnemonic of the instruction (llvm-objdump syntax, Sephirot extensions as generated by the passes)
+
+    unpkd = unpack_instruction(instruct)
+    opcode, dst, src, offset = unpkd.opcode, unpkd.dst, unpkd.src, unpkd.offset
+    imm = twos_comp(unpkd.immediate, 32)
+    op_class, op = opcode & CLASS_MASK, opcode & OP_MASK
+    reg = "r" if op_class != CLASS_ALU and op_class != CLASS_JMP32 else "w"
+
+    if opcode == NOP:
+        return "NOP"
+    elif opcode == MOV_EXIT:
+        return "exit " + str(unpkd.immediate)
+    elif opcode == LOAD48:
+        return "r" + str(dst) + " = *(uint48 *) (r" + str(src) + " + " + str(offset) + ")"
+    elif opcode == STORE48:
+        return "*(uint48 *) (r" + str(dst) + " + " + str(offset) + ") = r" + str(src)
+    elif opcode in MOV_ALU:
+        alu = MOV_ALU_TO_ALU[opcode]
+        return reg + str(dst) + " = " + reg + str(src) + " " + ALU_OP_TO_STR[alu & OP_MASK][:-1] + " " + (
+            str(imm) if imm >= 0 else "(" + str(imm) + ")")
+
+    elif op_class == CLASS_ALU64 or op_class == CLASS_ALU:
+        if op == ALU_NEG:
+            return reg + str(dst) + " = -" + reg + str(dst)
+        elif op == ALU_END:
+            return "r" + str(dst) + " = " + ("be" if opcode & SOURCE_REG else "le") + str(imm) + " r" + str(dst)
+        elif op in ALU_OP_TO_STR:
+            return reg + str(dst) + " " + ALU_OP_TO_STR[op] + " " + (
+                reg + str(src) if opcode & SOURCE_REG else str(imm))
+
+    elif op_class == CLASS_JMP or op_class == CLASS_JMP32:
+        target = ("+" if offset >= 0 else "") + str(offset)
+        if opcode == GOTO_OPCODE:
+            return "goto " + target
+        elif opcode == CALL_OPCODE:
+            return "call " + str(imm)
+        elif opcode == EXIT_OPCODE:
+            return "exit"
+        elif op in JMP_OP_TO_STR:
+            return "if " + reg + str(dst) + " " + JMP_OP_TO_STR[op] + " " + (
+                reg + str(src) if opcode & SOURCE_REG else str(imm)) + " goto " + target
+
+    elif op_class == CLASS_LD:
+        size = SIZE_TO_STR[opcode & SIZE_MASK]
+        if opcode == LDDW and src != 0:  # pseudo map load
+            return "ld_pseudo\tr" + str(dst) + ", " + str(src) + ", " + str(unpkd.immediate)
+        elif opcode == LDDW:
+            return "r" + str(dst) + " = " + str(unpkd.immediate) + " ll"
+        elif opcode & MODE_MASK == MODE_ABS:
+            return "r0 = *(" + size + " *)skb[" + str(imm) + "]"
+        elif opcode & MODE_MASK == MODE_IND:
+            return "r0 = *(" + size + " *)skb[r" + str(src) + " + " + str(imm) + "]"
+
+    elif op_class == CLASS_LDX:
+        return "r" + str(dst) + " = *(" + SIZE_TO_STR[opcode & SIZE_MASK] + " *)" + mem_operand(src, offset)
+    elif op_class == CLASS_ST:
+        return "*(" + SIZE_TO_STR[opcode & SIZE_MASK] + " *)" + mem_operand(dst, offset) + " = " + str(imm)
+    elif op_class == CLASS_STX:
+        size = SIZE_TO_STR[opcode & SIZE_MASK]
+        if opcode & MODE_MASK == MODE_XADD:
+            return "lock *(" + size + " *)" + mem_operand(dst, offset) + " += r" + str(src)
+        return "*(" + size + " *)" + mem_operand(dst, offset) + " = r" + str(src)
+
+    return "unknown 0x{:02x}".format(opcode)
+
+
+def mem_operand(reg, offset):
+    return "(r" + str(reg) + (" + " if offset >= 0 else " - ") + str(abs(offset)) + ")"
+
+
+def assemble(instr_s):
+    # returns the binary instruction of a mnemonic in the disassemble syntax (objdump trailing labels are ignored)
+
+    instr_s = re.sub("\\s*(<\\w+>)?\\s*$", "", instr_s)
+    for kind, syntax in ASM_SYNTAX:
+        m = syntax.match(instr_s)
+        if m is not None:
+            return assemble_match(kind, m.groups())
+    raise ValueError("invalid eBPF instruction '" + instr_s + "'")
+
+
+def assemble_match(kind, g):
+    # encodes the fields matched by the ASM_SYNTAX entry kind
+
+    if kind == "nop":
+        return NOP
+    elif kind == "mov_exit":
+        return pack_instruction(MOV_EXIT, immediate=int(g[0]))
+    elif kind == "exit":
+        return pack_instruction(EXIT_OPCODE)
+    elif kind == "call":
+        return pack_instruction(CALL_OPCODE, immediate=int(g[0]))
+    elif kind == "goto":
+        return pack_instruction(GOTO_OPCODE, offset=int(g[0]))
+    elif kind == "if":
+        op_class = CLASS_JMP if g[0] == "r" else CLASS_JMP32
+        if g[3] is not None:
+            return pack_instruction(op_class | STR_TO_JMP_OP[g[2]] | SOURCE_REG, int(g[1]), int(g[3]), int(g[5]))
+        return pack_instruction(op_class | STR_TO_JMP_OP[g[2]], int(g[1]), 0, int(g[5]), int(g[4]))
+    elif kind == "load48":
+        return pack_instruction(LOAD48, int(g[0]), int(g[1]), int(g[2]))
+    elif kind == "store48":
+        return pack_instruction(STORE48, int(g[0]), int(g[2]), int(g[1]))
+    elif kind == "ld_pseudo":
+        return pack_instruction(LDDW, int(g[0]), int(g[1]), immediate=int(g[2]))
+    elif kind == "lddw":
+        return pack_instruction(LDDW, int(g[0]), immediate=int(g[1]))
+    elif kind == "ld_abs":
+        return pack_instruction(CLASS_LD | MODE_ABS | STR_TO_SIZE[g[0]], immediate=int(g[1]))
+    elif kind == "ld_ind":
+        return pack_instruction(CLASS_LD | MODE_IND | STR_TO_SIZE[g[0]], src=int(g[1]), immediate=int(g[2]))
+    elif kind == "ldx":
+        return pack_instruction(CLASS_LDX | MODE_MEM | STR_TO_SIZE[g[1]], int(g[0]), int(g[2]),
+                                int(g[3] + g[4]))
+    elif kind == "stx":
+        return pack_instruction(CLASS_STX | MODE_MEM | STR_TO_SIZE[g[0]], int(g[1]), int(g[4]), int(g[2] + g[3]))
+    elif kind == "st":
+        return pack_instruction(CLASS_ST | MODE_MEM | STR_TO_SIZE[g[0]], int(g[1]), 0, int(g[2] + g[3]), int(g[4]))
+    elif kind == "xadd":
+        return pack_instruction(CLASS_STX | MODE_XADD | STR_TO_SIZE[g[0]], int(g[1]), int(g[4]), int(g[2] + g[3]))
+    elif kind == "end":
+        return pack_instruction(CLASS_ALU | ALU_END | (SOURCE_REG if g[1] == "be" else 0), int(g[0]),
+                                immediate=int(g[2]))
+    elif kind == "neg":
+        return pack_instruction((CLASS_ALU64 if g[0] == "r" else CLASS_ALU) | ALU_NEG, int(g[1]))
+    elif kind == "mov_alu":
+        return pack_instruction(STR_TO_MOV_ALU[g[3] + ("" if g[0] == "r" else "32")], int(g[1]), int(g[2]),
+                                immediate=int(g[4]))
     else:
+        op_class = CLASS_ALU64 if g[0] == "r" else CLASS_ALU
+        if g[3] is not None:
+            return pack_instruction(op_class | STR_TO_ALU_OP[g[2]] | SOURCE_REG, int(g[1]), int(g[3]))
+        return pack_instruction(op_class | STR_TO_ALU_OP[g[2]], int(g[1]), immediate=int(g[4]))
+
+
+def get_inputs(unpacked_instruction):
+    inputs = OPCODES[unpacked_instruction.opcode].inputs
+    if inputs == InputForm.NONE:
         return []
+    elif inputs == InputForm.SRC:
+        return [unpacked_instruction.src]
+    elif inputs == InputForm.DST:
+        return [unpacked_instruction.dst]
+    elif inputs == InputForm.SRC_DST:
+        return [unpacked_instruction.src, unpacked_instruction.dst]
+    else:
+        return [0]
 
 
 def del_src(instruct):
@@ -232,22 +665,16 @@ def del_src(instruct):
 
 
 def set_opcode(instruct, opcode):
-    for i in range(8):
-        bit = ((opcode & (1 << i)) != 0)
-        if bit == 0:
-            instruct &= ~(1 << (i + OPCODE_SHIFT_MOD))
-        else:
-            instruct |= (1 << (i + OPCODE_SHIFT_MOD))
-    return instruct
+    return instruct & ~(OPCODE_MASK << OPCODE_SHIFT_MOD) | (opcode & OPCODE_MASK) << OPCODE_SHIFT_MOD
 
 
 def set_inputs(instruct, inputs):
-    unpkd = unpack_instruction(instruct)
-    if unpkd["opcode"] in ONLY_SRC_INPUT:
+    form = OPCODES[unpack_instruction(instruct).opcode].inputs
+    if form == InputForm.SRC:
         return modify_register(instruct, inputs[0], SRC_SHIFT_MOD)
-    elif unpkd["opcode"] in ONLY_DST_INPUT:
+    elif form == InputForm.DST:
         return modify_register(instruct, inputs[0], DST_SHIFT_MOD)
-    elif unpkd["opcode"] in DST_SRC_INPUT:
+    elif form == InputForm.SRC_DST:
         instruct = modify_register(instruct, inputs[0], SRC_SHIFT_MOD)
         return modify_register(instruct, inputs[1], DST_SHIFT_MOD)
 
@@ -257,68 +684,81 @@ def set_output(instruct, output):
 
 
 def get_output(unpacked_instruction):
-    if unpacked_instruction["opcode"] in NO_OUTPUT:
-        return None
-    else:
-        return unpacked_instruction["dst"]
+    return unpacked_instruction.dst if OPCODES[unpacked_instruction.opcode].output else None
 
 
 def is_load(unpacked_instruction):
-    return unpacked_instruction["opcode"] in LOAD_OPCODE
+    return OPCODES[unpacked_instruction.opcode].load
 
 
 def is_store(unpacked_instruction):
-    return unpacked_instruction["opcode"] in STORE_OPCODE
+    return OPCODES[unpacked_instruction.opcode].store
 
 
 def is_no_input_branch(unpacked_instruction):
-    return unpacked_instruction["opcode"] in BRANCH_NO_INPUT
+    return OPCODES[unpacked_instruction.opcode].branch_kind >= BranchKind.GOTO
 
 
 def is_no_offset_branch(unpacked_instruction):
-    return unpacked_instruction["opcode"] in BRANCH_NO_OFFSET
+    return OPCODES[unpacked_instruction.opcode].branch_kind >= BranchKind.CALL
 
 
 def is_nop(unpacked_instruction):
-    return unpacked_instruction["opcode"] == NOP
+    return OPCODES[unpacked_instruction.opcode].nop
 
 
 def print_unpkd(unpkd, n=None):
     number = str(n) + ": " if n is not None else ""
-    print(number + "|0x{:02x}".format(unpkd["opcode"]) + "|0x{:01x}".format(
-        unpkd["dst"]) + "|0x{:01x}".format(unpkd["src"]) +
-          "|0x{:04x}".format(unpkd["offset"]) +
+    print(number + "|0x{:02x}".format(unpkd.opcode) + "|0x{:01x}".format(
+        unpkd.dst) + "|0x{:01x}".format(unpkd.src) +
+          "|0x{:04x}".format(unpkd.offset) +
           "|0x{:08x}".format(
-              unpkd["immediate"]) + "|")
+              unpkd.immediate) + "|")
 
 
 def is_no_input(unpkd):
-    return unpkd["opcode"] not in NO_INPUT
+    return not OPCODES[unpkd.opcode].no_input
 
 
 def is_optimizable_mov_alu(unpkd):
-    return unpkd["opcode"] in CORRESPONDENT
+    return OPCODES[unpkd.opcode].correspondent is not None
 
 
 def is_optimized_mov_alu(unpkd):
-    return unpkd["opcode"] in MOV_ALU
+    return OPCODES[unpkd.opcode].mov_alu
 
 
 def load_to_size(unpkd):
-    return LOAD_TO_SIZE[unpkd["opcode"]] if unpkd["opcode"] in LOAD_TO_SIZE else None
+    return OPCODES[unpkd.opcode].load_size
 
 
 def store_to_size(unpkd):
-    return STORE_TO_SIZE[unpkd["opcode"]] if unpkd["opcode"] in STORE_TO_SIZE else None
+    return OPCODES[unpkd.opcode].store_size
 
 
 def is_a_load48(unpkd):
-    return unpkd["opcode"] in LOAD_TO_SIZE48
+    return OPCODES[unpkd.opcode].load48
 
 
 def is_a_store48(unpkd):
-    return unpkd["opcode"] in STORE_TO_SIZE48
+    return OPCODES[unpkd.opcode].store48
+
+
+def get_mem_access(unpkd):
+    # returns (address register, offset, bytes, reads, writes) of a memory access, the address register is None for
+    # packet loads with implicit address (ld_abs/ld_ind). Returns None if the instruction does not access memory
+
+    desc = OPCODES[unpkd.opcode]
+    if desc.mem_bytes is None:
+        return None
+    if desc.mem_base == InputForm.SRC:
+        base = unpkd.src
+    elif desc.mem_base == InputForm.DST:
+        base = unpkd.dst
+    else:
+        base = None
+    return base, unpkd.offset, desc.mem_bytes, desc.mem_read, desc.mem_write
 
 
 def is_if_branch(unpkd):
-    return unpkd["opcode"] in IF_BRANCH
+    return OPCODES[unpkd.opcode].branch_kind == BranchKind.IF
@@ -0,0 +1,153 @@
+import mmap
+import struct
+
+from ebpf_parser import disassemble, unpack_instruction, LDDW, NOP
+
+# ELF identification (only 64 bit little endian BPF objects are supported)
+ELF_MAGIC = b"\x7fELF"
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+EM_BPF = 247
+
+# section types and flags
+SHT_PROGBITS = 1
+SHT_SYMTAB = 2
+SHT_REL = 9
+SHF_EXECINSTR = 0x4
+
+# symbol types
+STT_OBJECT = 1
+STT_FUNC = 2
+STT_SECTION = 3
+
+# BPF relocation types
+R_BPF_64_64 = 1  # map address loaded by lddw
+R_BPF_64_32 = 10  # bpf to bpf function call
+
+MAPS_SECTIONS = {"maps", ".maps"}
+SUBPROGRAMS_SECTION = ".text"
+
+ELF_HEADER = struct.Struct("<16sHHIQQQIHHHHHH")
+SECTION_HEADER = struct.Struct("<IIQQQQIIQQ")
+SYMBOL = struct.Struct("<IBBHQQ")
+RELOCATION = struct.Struct("<QQ")
+INSTR_SIZE = 8
+
+
+class ElfProgram:
+    # Executable section of a BPF object, instructions are numbered as in the llvm-objdump output (lddw takes
+    # two slots, the second one is a NOP)
+
+    def __init__(self, name):
+        self.name = name
+        self.program_bin = []
+        self.program_str = []
+        self.functions = {}  # instruction index -> function name
+        self.relocations = {}  # instruction index -> (symbol name, relocation type)
+
+
+class ElfObject:
+    # Compiled BPF object (.o), parsed from a read only mmap of the file
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.programs = {}  # section name -> ElfProgram, in section order
+        self.maps = {}  # map name -> offset in the maps section
+
+        with open(filename, 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as elf:
+                self.__parse(elf)
+
+    def __parse(self, elf):
+        ident, _, machine, _, _, _, shoff, _, _, _, _, shentsize, shnum, shstrndx = ELF_HEADER.unpack_from(elf, 0)
+        if ident[:4] != ELF_MAGIC or ident[4] != ELFCLASS64 or ident[5] != ELFDATA2LSB or machine != EM_BPF:
+            print("\033[91m[elf_reader] " + self.filename + " is not a 64 bit little endian BPF object")
+            exit(-1)
+
+        sections = [SECTION_HEADER.unpack_from(elf, shoff + i * shentsize) for i in range(shnum)]
+        names = [self.__string(elf, sections[shstrndx], sec[0]) for sec in sections]
+
+        # program sections
+        for i in range(shnum):
+            _, sh_type, flags, _, offset, size, _, _, _, _ = sections[i]
+            if sh_type == SHT_PROGBITS and flags & SHF_EXECINSTR and size > 0:
+                self.programs[names[i]] = self.__parse_program(elf, names[i], offset, size)
+
+        # symbol table: functions and maps
+        symbols = []
+        for sec in sections:
+            if sec[1] == SHT_SYMTAB:
+                strtab = sections[sec[6]]
+                for off in range(sec[4], sec[4] + sec[5], SYMBOL.size):
+                    name, info, _, shndx, value, _ = SYMBOL.unpack_from(elf, off)
+                    symbols.append((self.__string(elf, strtab, name), info & 0xf, shndx, value))
+
+        for name, sym_type, shndx, value in symbols:
+            if shndx >= shnum:  # undefined, absolute or common symbols
+                continue
+            if sym_type == STT_FUNC and names[shndx] in self.programs:
+                self.programs[names[shndx]].functions[value // INSTR_SIZE] = name
+            elif sym_type == STT_OBJECT and names[shndx] in MAPS_SECTIONS:
+                self.maps[name] = value
+
+        # relocations of the program sections
+        for sec in sections:
+            if sec[1] == SHT_REL and names[sec[7]] in self.programs:
+                program = self.programs[names[sec[7]]]
+                for off in range(sec[4], sec[4] + sec[5], RELOCATION.size):
+                    r_offset, r_info = RELOCATION.unpack_from(elf, off)
+                    name, sym_type, shndx, _ = symbols[r_info >> 32]
+                    if sym_type == STT_SECTION:
+                        name = names[shndx]
+                    program.relocations[r_offset // INSTR_SIZE] = (name, r_info & 0xffffffff)
+
+    @staticmethod
+    def __parse_program(elf, name, offset, size):
+        # instructions are read as big endian words, as the hex dump of llvm-objdump
+
+        program = ElfProgram(name)
+        words = struct.unpack_from(">" + str(size // INSTR_SIZE) + "Q", elf, offset)
+
+        i = 0
+        while i < len(words):
+            program.program_bin.append(words[i])
+            program.program_str.append(disassemble(words[i]))
+            if unpack_instruction(words[i]).opcode == LDDW:  # 16 bytes instruction
+                program.program_bin.append(NOP)
+                program.program_str.append("NOP")
+                i += 1
+            i += 1
+        return program
+
+    @staticmethod
+    def __string(elf, strtab, offset):
+        start = strtab[4] + offset
+        return elf[start:elf.find(b"\0", start)].decode()
+
+    def get_program(self, section=None):
+        # returns the program in section, by default the first program section which is not .text (subprograms)
+
+        if section is None:
+            candidates = [name for name in self.programs if name != SUBPROGRAMS_SECTION] or list(self.programs)
+            if len(candidates) == 0:
+                print("\033[91m[elf_reader] no program sections in " + self.filename)
+                exit(-1)
+            section = candidates[0]
+
+        if section not in self.programs:
+            print("\033[91m[elf_reader] section " + section + " not found in " + self.filename +
+                  ", available: " + ", ".join(self.programs))
+            exit(-1)
+        return self.programs[section]
+
+
+def is_elf_file(filename):
+    with open(filename, 'rb') as file:
+        return file.read(len(ELF_MAGIC)) == ELF_MAGIC
+
+
+def read_elf_file(filename, section=None):
+    # parse a BPF object and returns the list of instructions as integers, and the list of str mnemonics, as read_file
+
+    program = ElfObject(filename).get_program(section)
+    return list(program.program_bin), list(program.program_str)
@@ -1,5 +1,7 @@
 import re
 
+from ebpf_parser import unpack_program
+
 INSTR_REGEX = '([A-Fa-f0-9]{2}( )){7}([A-Fa-f0-9]{2})(( )([A-Fa-f0-9]{2}( )){7}([A-Fa-f0-9]{2}))?'
 COMMENTS_REGEX = '(;).*?'
 
@@ -31,6 +33,13 @@ def read_file(filename):
     return program_bin, program_str
 
 
+def read_file_unpacked(filename):
+    # as read_file, but returns the program decoded in a single structured array (see ebpf_parser.unpack_program)
+
+    program_bin, program_str = read_file(filename)
+    return unpack_program(program_bin), program_str
+
+
 def print_line(line):
     bins = "{0:64b}".format(line).replace(" ", "0")
     print("|"+bins[:8]+"|"+bins[8:12]+"|"+bins[12:16]+"|"+bins[16:32]+"|"+bins[32:64]+"|")
@@ -1,27 +1,30 @@
 from ebpf_parser import little_to_big
-from optimizer_core import INSTR_B
+from machine import SEPHIROT
 
 STR_FORMAT_32 = "{:016x}"
-NUM_ROWS = 256
 
 
-def write_program_to_file(filename, parallel_program):
+def write_program_to_file(filename, parallel_program, machine=SEPHIROT):
+    # This method writes the rows of the parallelized program (lanes in reverse order), padded with empty rows to the
+    # size of the instruction memory of the machine
+
+    num_rows = machine.imem_rows
     with open(filename, 'w') as file:
         for row in range(len(parallel_program)):
             for column in range(len(parallel_program[row]) -1, -1, -1):
-                file.write(STR_FORMAT_32.format(little_to_big(parallel_program[row][column][INSTR_B] if parallel_program[row][column] is not None else 0)))
+                file.write(STR_FORMAT_32.format(little_to_big(parallel_program[row][column].instr_b if parallel_program[row][column] is not None else 0)))
             if row < len(parallel_program) - 1:
                 file.write("\n")
 
-        if NUM_ROWS - len(parallel_program) < 0:
+        if num_rows - len(parallel_program) < 0:
             print("Error the parallelized program is longer than the available memory")
             exit(-1)
-        elif NUM_ROWS - len(parallel_program) > 0:
+        elif num_rows - len(parallel_program) > 0:
             file.write("\n")
-            for row in range(NUM_ROWS - len(parallel_program)):
-                for column in range(len(parallel_program[0]) - 1, -1, -1):
+            for row in range(num_rows - len(parallel_program)):
+                for column in range(machine.n_lanes - 1, -1, -1):
                     file.write(STR_FORMAT_32.format(0))
-                if row < NUM_ROWS - len(parallel_program) - 1:
+                if row < num_rows - len(parallel_program) - 1:
                     file.write("\n")
 
 
@@ -0,0 +1,164 @@
+import heapq
+from collections import deque
+
+
+class Graph:
+    # Directed graph on insertion ordered adjacency lists (CFG & DDG of the compiler). Each edge carries a kind
+    # bitmask (DDG dependency kinds). Topological orders are cached until the graph is modified, networkx is only
+    # needed to draw it
+
+    __slots__ = ("succ", "pred", "attrs", "edges", "__topo", "__lex_topo")
+
+    def __init__(self):
+        self.succ = {}  # node -> [successors]
+        self.pred = {}  # node -> [predecessors]
+        self.attrs = {}  # node -> drawing attributes
+        self.edges = {}  # (u, v) -> kind bitmask
+        self.__topo = None
+        self.__lex_topo = None
+
+    def __len__(self):
+        return len(self.succ)
+
+    def __contains__(self, node):
+        return node in self.succ
+
+    def nodes(self):
+        return list(self.succ)
+
+    def add_node(self, node, **attrs):
+        if node not in self.succ:
+            self.succ[node] = []
+            self.pred[node] = []
+            self.__topo = self.__lex_topo = None
+        if attrs:
+            self.attrs.setdefault(node, {}).update(attrs)
+
+    def add_edge(self, u, v, kind=0):
+        # This method adds the edge u -> v, a parallel edge only adds its kind to the existing one
+
+        if (u, v) in self.edges:
+            self.edges[(u, v)] |= kind
+            return
+        self.add_node(u)
+        self.add_node(v)
+        self.edges[(u, v)] = kind
+        self.succ[u].append(v)
+        self.pred[v].append(u)
+        self.__topo = self.__lex_topo = None
+
+    def add_edges_from(self, edges, kind=0):
+        for u, v in edges:
+            self.add_edge(u, v, kind)
+
+    def kind(self, u, v):
+        return self.edges[(u, v)]
+
+    def successors(self, node, kind=None):
+        # successors of node, only through edges with one of the kinds in the kind bitmask if given
+
+        if kind is None:
+            return self.succ[node]
+        return [s for s in self.succ[node] if self.edges[(node, s)] & kind]
+
+    def predecessors(self, node, kind=None):
+        # predecessors of node, only through edges with one of the kinds in the kind bitmask if given
+
+        if kind is None:
+            return self.pred[node]
+        return [p for p in self.pred[node] if self.edges[(p, node)] & kind]
+
+    def reverse(self):
+        # This method returns a copy of the graph with all the edges reversed
+
+        rev = Graph()
+        rev.succ = {node: list(preds) for node, preds in self.pred.items()}
+        rev.pred = {node: list(succs) for node, succs in self.succ.items()}
+        rev.attrs = {node: dict(attrs) for node, attrs in self.attrs.items()}
+        rev.edges = {(v, u): kind for (u, v), kind in self.edges.items()}
+        return rev
+
+    def topological_sort(self):
+        # This method returns a topological order of the nodes (Kahn, nodes ready at the same time in insertion order)
+
+        if self.__topo is None:
+            in_degree = {node: len(self.pred[node]) for node in self.pred}
+            ready = deque(node for node in self.succ if in_degree[node] == 0)
+            order = []
+            while ready:
+                node = ready.popleft()
+                order.append(node)
+                for s in self.succ[node]:
+                    in_degree[s] -= 1
+                    if in_degree[s] == 0:
+                        ready.append(s)
+            assert len(order) == len(self.succ), "Graph contains a cycle, topological sort is undefined"
+            self.__topo = order
+        return self.__topo
+
+    def lexicographical_topological_sort(self):
+        # This method returns the topological order picking the smallest ready node first (same order as networkx)
+
+        if self.__lex_topo is None:
+            in_degree = {node: len(self.pred[node]) for node in self.pred}
+            ready = [node for node in self.succ if in_degree[node] == 0]
+            heapq.heapify(ready)
+            order = []
+            while ready:
+                node = heapq.heappop(ready)
+                order.append(node)
+                for s in self.succ[node]:
+                    in_degree[s] -= 1
+                    if in_degree[s] == 0:
+                        heapq.heappush(ready, s)
+            assert len(order) == len(self.succ), "Graph contains a cycle, topological sort is undefined"
+            self.__lex_topo = order
+        return self.__lex_topo
+
+    def dominators(self, root=None):
+        # This method computes the dominators of each node (iterative dataflow on the topological order), nodes not
+        # reachable from root only dominate themselves
+
+        order = self.lexicographical_topological_sort()
+        if root is None:
+            root = order[0]
+
+        all_nodes = set(self.succ)
+        dominators = {node: set(all_nodes) for node in self.succ}
+        dominators[root] = {root}
+
+        changed = True
+        while changed:
+            changed = False
+            for node in order:
+                if node == root:
+                    continue
+                preds = [dominators[p] for p in self.pred[node]]
+                new_set = set.intersection(*preds).union({node}) if preds else {node}
+
+                if new_set != dominators[node]:
+                    dominators[node] = new_set
+                    changed = True
+
+        return dominators
+
+    def draw(self, filename, labels=None, edge_labels=None):
+        # This method writes the graph as png with pydot (debug only), labels: optional node -> label function,
+        # edge_labels: optional kind -> label function
+
+        import networkx as nx
+
+        g = nx.DiGraph()
+        for node in self.succ:
+            attrs = dict(self.attrs.get(node, {}))
+            if labels is not None and labels(node) is not None:
+                attrs["label"] = labels(node)
+            g.add_node(node, **attrs)
+        for node in self.succ:
+            for s in self.succ[node]:
+                if edge_labels is not None and self.edges[(node, s)]:
+                    g.add_edge(node, s, label=edge_labels(self.edges[(node, s)]))
+                else:
+                    g.add_edge(node, s)
+
+        nx.drawing.nx_pydot.to_pydot(g).write_png(filename)
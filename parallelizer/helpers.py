@@ -0,0 +1,137 @@
+from collections import namedtuple
+from enum import IntEnum, IntFlag
+
+CALL_CLOBBERED_MASK = 0x3f  # r0-r5: return value and arguments, not preserved by helper calls
+
+
+class MemKind(IntFlag):
+    # memory read or written by a helper function
+    NONE = 0
+    PACKET = 1  # packet data (and its bounds in the context)
+    MAP = 2  # map values
+    STACK = 4  # program stack
+    ANY = 7
+
+
+class HelperClass(IntEnum):
+    # latency class of a helper function
+    FAST = 0,  # no memory access (time, cpu id, random numbers, redirects)
+    MAP = 1,  # map accesses
+    PACKET = 2,  # packet resizing and checksums
+    SLOW = 3  # lookups in kernel tables (fib, sockets), event outputs and traces
+
+
+HelperDescriptor = namedtuple("HelperDescriptor", ["name",
+                                                   "n_args",  # arguments in r1-r5
+                                                   "clobbers",  # bitmask of the registers written (r0 is returned)
+                                                   "reads",  # MemKind read
+                                                   "writes",  # MemKind written
+                                                   "mem_args",  # pointer arguments to all the memory read, None if
+                                                                # it is read through other pointers (e.g. the context)
+                                                   "latency"])  # HelperClass
+
+
+def descriptor(name, n_args, reads=MemKind.NONE, writes=MemKind.NONE, mem_args=(), latency=HelperClass.FAST):
+    return HelperDescriptor(name, n_args, CALL_CLOBBERED_MASK, reads, writes, mem_args, latency)
+
+
+# helper function ids (linux/bpf.h)
+BPF_MAP_LOOKUP_ELEM = 1
+BPF_MAP_UPDATE_ELEM = 2
+BPF_MAP_DELETE_ELEM = 3
+BPF_KTIME_GET_NS = 5
+BPF_TRACE_PRINTK = 6
+BPF_GET_PRANDOM_U32 = 7
+BPF_GET_SMP_PROCESSOR_ID = 8
+BPF_TAIL_CALL = 12
+BPF_REDIRECT = 23
+BPF_PERF_EVENT_OUTPUT = 25
+BPF_CSUM_DIFF = 28
+BPF_GET_NUMA_NODE_ID = 42
+BPF_XDP_ADJUST_HEAD = 44
+BPF_REDIRECT_MAP = 51
+BPF_XDP_ADJUST_META = 54
+BPF_XDP_ADJUST_TAIL = 65
+BPF_FIB_LOOKUP = 69
+BPF_SK_LOOKUP_TCP = 84
+BPF_SK_LOOKUP_UDP = 85
+BPF_SK_RELEASE = 86
+BPF_MAP_PUSH_ELEM = 87
+BPF_MAP_POP_ELEM = 88
+BPF_MAP_PEEK_ELEM = 89
+BPF_SPIN_LOCK = 93
+BPF_SPIN_UNLOCK = 94
+BPF_SKC_LOOKUP_TCP = 99
+BPF_TCP_CHECK_SYNCOOKIE = 100
+BPF_TCP_GEN_SYNCOOKIE = 110
+BPF_JIFFIES64 = 118
+BPF_XDP_OUTPUT = 121
+BPF_KTIME_GET_BOOT_NS = 125
+BPF_RINGBUF_OUTPUT = 130
+BPF_RINGBUF_RESERVE = 131
+BPF_RINGBUF_SUBMIT = 132
+BPF_RINGBUF_DISCARD = 133
+BPF_CHECK_MTU = 163
+BPF_XDP_GET_BUFF_LEN = 189
+BPF_XDP_LOAD_BYTES = 190
+BPF_XDP_STORE_BYTES = 191
+
+# helper functions available to XDP programs: reads of the memory pointed by their arguments are ordered only with
+# the stores which may alias it, helpers writing memory are barriers for all the memory accesses
+HELPERS = {
+    BPF_MAP_LOOKUP_ELEM: descriptor("map_lookup_elem", 2, MemKind.STACK, mem_args=(2,), latency=HelperClass.MAP),
+    BPF_MAP_UPDATE_ELEM: descriptor("map_update_elem", 4, MemKind.STACK, MemKind.MAP, (2, 3), HelperClass.MAP),
+    BPF_MAP_DELETE_ELEM: descriptor("map_delete_elem", 2, MemKind.STACK, MemKind.MAP, (2,), HelperClass.MAP),
+    BPF_KTIME_GET_NS: descriptor("ktime_get_ns", 0),
+    BPF_TRACE_PRINTK: descriptor("trace_printk", 5, MemKind.ANY, mem_args=(1,), latency=HelperClass.SLOW),
+    BPF_GET_PRANDOM_U32: descriptor("get_prandom_u32", 0),
+    BPF_GET_SMP_PROCESSOR_ID: descriptor("get_smp_processor_id", 0),
+    BPF_TAIL_CALL: descriptor("tail_call", 3, MemKind.ANY, MemKind.ANY, None, HelperClass.SLOW),
+    BPF_REDIRECT: descriptor("redirect", 2),
+    BPF_PERF_EVENT_OUTPUT: descriptor("perf_event_output", 5, MemKind.ANY, mem_args=None, latency=HelperClass.SLOW),
+    BPF_CSUM_DIFF: descriptor("csum_diff", 5, MemKind.ANY, mem_args=(1, 3), latency=HelperClass.PACKET),
+    BPF_GET_NUMA_NODE_ID: descriptor("get_numa_node_id", 0),
+    BPF_XDP_ADJUST_HEAD: descriptor("xdp_adjust_head", 2, MemKind.PACKET, MemKind.PACKET, None, HelperClass.PACKET),
+    BPF_REDIRECT_MAP: descriptor("redirect_map", 3, latency=HelperClass.MAP),
+    BPF_XDP_ADJUST_META: descriptor("xdp_adjust_meta", 2, MemKind.PACKET, MemKind.PACKET, None, HelperClass.PACKET),
+    BPF_XDP_ADJUST_TAIL: descriptor("xdp_adjust_tail", 2, MemKind.PACKET, MemKind.PACKET, None, HelperClass.PACKET),
+    BPF_FIB_LOOKUP: descriptor("fib_lookup", 4, MemKind.STACK, MemKind.STACK, (2,), HelperClass.SLOW),
+    BPF_SK_LOOKUP_TCP: descriptor("sk_lookup_tcp", 5, MemKind.ANY, mem_args=(2,), latency=HelperClass.SLOW),
+    BPF_SK_LOOKUP_UDP: descriptor("sk_lookup_udp", 5, MemKind.ANY, mem_args=(2,), latency=HelperClass.SLOW),
+    BPF_SK_RELEASE: descriptor("sk_release", 1, MemKind.ANY, MemKind.ANY, None, HelperClass.SLOW),
+    BPF_MAP_PUSH_ELEM: descriptor("map_push_elem", 3, MemKind.STACK, MemKind.MAP, (2,), HelperClass.MAP),
+    BPF_MAP_POP_ELEM: descriptor("map_pop_elem", 2, MemKind.MAP, MemKind.ANY, None, HelperClass.MAP),
+    BPF_MAP_PEEK_ELEM: descriptor("map_peek_elem", 2, MemKind.MAP, MemKind.ANY, None, HelperClass.MAP),
+    BPF_SPIN_LOCK: descriptor("spin_lock", 1, MemKind.MAP, MemKind.MAP, None, HelperClass.MAP),
+    BPF_SPIN_UNLOCK: descriptor("spin_unlock", 1, MemKind.MAP, MemKind.MAP, None, HelperClass.MAP),
+    BPF_SKC_LOOKUP_TCP: descriptor("skc_lookup_tcp", 5, MemKind.ANY, mem_args=(2,), latency=HelperClass.SLOW),
+    BPF_TCP_CHECK_SYNCOOKIE: descriptor("tcp_check_syncookie", 5, MemKind.ANY, mem_args=(2, 4),
+                                        latency=HelperClass.SLOW),
+    BPF_TCP_GEN_SYNCOOKIE: descriptor("tcp_gen_syncookie", 5, MemKind.ANY, mem_args=(2, 4), latency=HelperClass.SLOW),
+    BPF_JIFFIES64: descriptor("jiffies64", 0),
+    BPF_XDP_OUTPUT: descriptor("xdp_output", 5, MemKind.ANY, mem_args=None, latency=HelperClass.SLOW),
+    BPF_KTIME_GET_BOOT_NS: descriptor("ktime_get_boot_ns", 0),
+    BPF_RINGBUF_OUTPUT: descriptor("ringbuf_output", 4, MemKind.ANY, mem_args=(2,), latency=HelperClass.MAP),
+    BPF_RINGBUF_RESERVE: descriptor("ringbuf_reserve", 3, MemKind.MAP, MemKind.MAP, None, HelperClass.MAP),
+    BPF_RINGBUF_SUBMIT: descriptor("ringbuf_submit", 2, MemKind.MAP, MemKind.MAP, None, HelperClass.MAP),
+    BPF_RINGBUF_DISCARD: descriptor("ringbuf_discard", 2, MemKind.MAP, MemKind.MAP, None, HelperClass.MAP),
+    BPF_CHECK_MTU: descriptor("check_mtu", 5, MemKind.STACK, MemKind.STACK, (3,), HelperClass.SLOW),
+    BPF_XDP_GET_BUFF_LEN: descriptor("xdp_get_buff_len", 1, MemKind.PACKET, mem_args=None),
+    BPF_XDP_LOAD_BYTES: descriptor("xdp_load_bytes", 4, MemKind.PACKET, MemKind.ANY, None, HelperClass.PACKET),
+    BPF_XDP_STORE_BYTES: descriptor("xdp_store_bytes", 4, MemKind.ANY, MemKind.PACKET, None, HelperClass.PACKET),
+}
+
+# unknown helpers: all the argument registers, any memory read and written
+UNKNOWN_HELPER = descriptor("unknown", 5, MemKind.ANY, MemKind.ANY, None, HelperClass.SLOW)
+
+
+def helper(call_id):
+    # This method returns the descriptor of the helper function call_id
+
+    return HELPERS.get(call_id, UNKNOWN_HELPER)
+
+
+def helper_args(call_id):
+    # This method returns the argument registers of the helper function call_id
+
+    return list(range(1, helper(call_id).n_args + 1))
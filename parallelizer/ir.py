@@ -0,0 +1,282 @@
+from enum import Enum, IntFlag
+
+from ebpf_parser import unpack_instruction, get_inputs, get_output, is_nop, is_call, is_mov, is_optimized_mov_alu, \
+    is_alu_add_imm, get_mem_access
+from helpers import helper
+
+NUM_REGS = 16  # architectural registers r0-r15, register sets are bitmasks over them
+
+
+class BlockType(Enum):
+    START = 0,  # entry point for the program (pseudoblock)
+    EXIT = 1,  # exit point for the program (pseudoblock)
+    BASIC = 2,  # actual block with code
+    CALL = 3,  # helper function call pseudoblock
+    DISABLED = 4  # empty block after optimizations (pseudoblock)
+
+
+class DepKind(IntFlag):
+    # kind of a dependency edge in the DDG (an edge can carry more than one kind)
+    RAW = 1  # read after write of a register (true dependency)
+    WAR = 2  # write after read of a register (anti dependency)
+    WAW = 4  # write after write of a register (output dependency)
+    MEM = 8  # memory ordering between loads, stores and helper calls on the same memory
+
+
+def reg_mask(regs):
+    # This method returns the bitmask of the registers in regs
+
+    mask = 0
+    for reg in regs:
+        mask |= 1 << reg
+    return mask
+
+
+def mask_regs(mask):
+    # This method returns the registers in the bitmask, in ascending order
+
+    regs = []
+    while mask:
+        low = mask & -mask
+        regs.append(low.bit_length() - 1)
+        mask ^= low
+    return regs
+
+
+def stack_transfer(mask, unpkd):
+    # This method returns the bitmask of registers which may hold a stack pointer after the instruction unpkd:
+    # outputs are stack pointers if computed from (or loaded through) a stack pointer, helpers clobber r0-r5
+
+    if is_call(unpkd):
+        return mask & ~helper(unpkd.immediate).clobbers
+    out = get_output(unpkd)
+    if out is None or is_nop(unpkd):
+        return mask
+    if mask & reg_mask(get_inputs(unpkd)):
+        return mask | 1 << out
+    return mask & ~(1 << out)
+
+
+class Operand:
+    # Register operand of an instruction (or entry of a block symbol table), with its liveness info
+
+    __slots__ = ("sym_name", "live", "next_use")
+
+    def __init__(self, sym_name, live=False, next_use=None):
+        self.sym_name = sym_name
+        self.live = live
+        self.next_use = next_use  # global id of the next instruction using the value
+
+    def __repr__(self):
+        return "Operand(r" + str(self.sym_name) + ", live=" + str(self.live) + ", next_use=" + str(self.next_use) + ")"
+
+
+class Instruction:
+    # Parsed instruction: input(output) operands, original pos in the ebpf asm (global id in the compiler), the
+    # landing block (if it's a jump) and the # of pending instructions to be evaluated for the input operands
+
+    __slots__ = ("instr_b", "unpkd", "inputs", "output", "orig_pos", "jmp_block", "pending_deps")
+
+    def __init__(self, instr_b, orig_pos):
+        self.instr_b = instr_b
+        self.unpkd = unpack_instruction(instr_b)
+
+        inputs = get_inputs(self.unpkd)
+        output = get_output(self.unpkd)
+
+        self.inputs = [Operand(op) for op in inputs]
+        self.output = Operand(output) if output is not None and not is_nop(self.unpkd) else None
+        self.orig_pos = orig_pos
+        self.jmp_block = None
+        self.pending_deps = len(inputs)
+
+    def set_instr_b(self, instr_b):
+        # This method replaces the binary instruction keeping the unpacked fields in sync
+
+        self.instr_b = instr_b
+        self.unpkd = unpack_instruction(instr_b)
+
+    def uses(self, reg):
+        # This method returns True if reg is one of the input operands
+
+        for inp in self.inputs:
+            if inp.sym_name == reg:
+                return True
+        return False
+
+    def defines(self, reg):
+        return self.output is not None and self.output.sym_name == reg
+
+
+class Block:
+    # Basic block (or pseudoblock) of the program, with its per register def/use indexes (local instruction ids)
+    # FNEXT: default next block, TNEXT: next blocks if the jump is taken
+
+    __slots__ = ("type", "start", "len", "instructions", "out_operands", "in_operands", "defs", "uses", "sym_table",
+                 "tnext", "fnext", "reg_defs", "reg_uses", "use_mask", "def_mask", "in_mask", "out_mask", "stack_in")
+
+    def __init__(self, type, start, length, fnext=None):
+        self.type = type
+        self.start = start
+        self.len = length
+        self.instructions = []
+        self.out_operands = {}  # symbols live in exit (living outputs for the block) -> first use in successors
+        self.in_operands = {}  # input symbols for the block -> first use
+        self.defs = {}  # defined symbols
+        self.uses = {}  # used symbols (before being defined in the block)
+        self.sym_table = {}  # sym_name: Operand(LIVE: True|False, NEXT_USE: i) (i index in seq program)
+        self.tnext = []
+        self.fnext = fnext
+        self.reg_defs = {}  # reg -> [local ids of the instructions defining it]
+        self.reg_uses = {}  # reg -> [local ids of the instructions using it]
+        self.use_mask = 0  # bitmasks of uses, defs, in & out operands
+        self.def_mask = 0
+        self.in_mask = 0
+        self.out_mask = 0
+        self.stack_in = 0  # bitmask of registers which may hold a stack pointer at the block entry
+
+    def index_registers(self):
+        # This method (re)builds the per register def/use indexes, must be called when operands are modified
+
+        self.reg_defs, self.reg_uses = {}, {}
+        for i in range(len(self.instructions)):
+            instr = self.instructions[i]
+            for inp in instr.inputs:
+                uses = self.reg_uses.setdefault(inp.sym_name, [])
+                if not uses or uses[-1] != i:
+                    uses.append(i)
+            if instr.output is not None:
+                self.reg_defs.setdefault(instr.output.sym_name, []).append(i)
+
+    def first_def(self, reg):
+        # This method returns the local id of the first instruction defining reg (None if not defined)
+
+        defs = self.reg_defs.get(reg)
+        return defs[0] if defs else None
+
+    def last_def(self, reg):
+        # This method returns the local id of the last instruction defining reg (None if not defined)
+
+        defs = self.reg_defs.get(reg)
+        return defs[-1] if defs else None
+
+
+class MemoryDependencies:
+    # Memory ordering tables for the forward construction of a block DDG. Addresses are tracked symbolically as
+    # base + constant offset, where the base is the value of a register at the block entry or the instruction which
+    # computed it: accesses on the same base are ordered only if their bytes overlap. Accesses on different bases may
+    # alias, unless one is on the stack and the other can not point to the stack. Packet loads with implicit address
+    # and helper calls are ordered with every access they may conflict with: helpers only reading memory as loads of
+    # the memory pointed by their arguments (of any memory if unknown), helpers writing memory as barriers
+
+    __slots__ = ("stack_reg", "stack_mask", "ptrs", "may_stack", "stores", "loads", "wild_loads", "barrier")
+
+    def __init__(self, stack_reg, stack_mask):
+        self.stack_reg = stack_reg
+        self.stack_mask = stack_mask  # regs which may hold a stack pointer (at the current instruction)
+        self.ptrs = {}  # reg -> (base, offset), regs not redefined in the block are their own entry base
+        self.may_stack = {}  # base -> may point to the stack
+        self.stores = {}  # base -> {byte: last store}
+        self.loads = {}  # base -> {byte: [loads since its last store]}
+        self.wild_loads = []  # loads with implicit address (ld_abs/ld_ind)
+        self.barrier = None  # last helper call
+
+    def access(self, i, unpkd):
+        # This method records the memory access of instruction i, returning the previous accesses it must follow
+
+        deps = set() if self.barrier is None else {self.barrier}
+
+        if is_call(unpkd):
+            desc = helper(unpkd.immediate)
+            if desc.writes:
+                for table in self.stores.values():
+                    deps.update(table.values())
+                for table in self.loads.values():
+                    for loads in table.values():
+                        deps.update(loads)
+                deps.update(self.wild_loads)
+                self.stores, self.loads, self.wild_loads, self.barrier = {}, {}, [], i
+                return deps
+            if not desc.reads:
+                return set()
+            bases = None if desc.mem_args is None else [self.pointer(reg)[0] for reg in desc.mem_args]
+            for other, table in self.stores.items():
+                if bases is None or any(other == base or self.__may_alias(base, other) for base in bases):
+                    deps.update(table.values())
+            self.wild_loads.append(i)  # the following stores are ordered with the call
+            return deps
+
+        access = get_mem_access(unpkd)
+        if access is None:
+            return set()
+        base_reg, offset, size, reads, writes = access
+
+        if base_reg is None:
+            for table in self.stores.values():
+                deps.update(table.values())
+            self.wild_loads.append(i)
+            return deps
+
+        base, base_offset = self.pointer(base_reg)
+        accessed = range(base_offset + offset, base_offset + offset + size)
+
+        for other, table in self.stores.items():
+            if other == base:
+                deps.update(table[byte] for byte in accessed if byte in table)
+            elif self.__may_alias(base, other):
+                deps.update(table.values())
+
+        if writes:
+            for other, table in self.loads.items():
+                if other == base or self.__may_alias(base, other):
+                    for byte, loads in table.items():
+                        if other != base or byte in accessed:
+                            deps.update(loads)
+            deps.update(self.wild_loads)
+
+            stores, loads = self.stores.setdefault(base, {}), self.loads.setdefault(base, {})
+            for byte in accessed:
+                stores[byte] = i
+                loads.pop(byte, None)
+        else:
+            loads = self.loads.setdefault(base, {})
+            for byte in accessed:
+                loads.setdefault(byte, []).append(i)
+
+        deps.discard(i)
+        return deps
+
+    def pointer(self, reg):
+        # This method returns the symbolic address (base, offset) held by reg
+
+        if reg in self.ptrs:
+            return self.ptrs[reg]
+        base = ("entry", reg)
+        self.may_stack[base] = bool(self.stack_mask >> reg & 1)
+        return base, 0
+
+    def track_pointers(self, i, unpkd):
+        # This method updates the symbolic address held by the output register of instruction i
+
+        out = get_output(unpkd)
+        if out is not None and not is_nop(unpkd):
+            if is_mov(unpkd):
+                self.ptrs[out] = self.pointer(unpkd.src)
+            elif is_alu_add_imm(unpkd):
+                base, offset = self.pointer(unpkd.src if is_optimized_mov_alu(unpkd) else out)
+                imm = unpkd.immediate - (1 << 32) if unpkd.immediate & 0x80000000 else unpkd.immediate
+                self.ptrs[out] = (base, offset + imm)
+            else:
+                self.ptrs[out] = (("def", i), 0)
+                self.may_stack[("def", i)] = bool(stack_transfer(self.stack_mask, unpkd) >> out & 1)
+        self.stack_mask = stack_transfer(self.stack_mask, unpkd)
+
+    def __may_alias(self, base, other):
+        # different bases: the stack can not alias memory reached from a pointer which can not point to the stack
+
+        stack = ("entry", self.stack_reg)
+        if base == stack:
+            return self.may_stack[other]
+        if other == stack:
+            return self.may_stack[base]
+        return True
@@ -0,0 +1,116 @@
+from enum import IntEnum
+
+from ebpf_parser import OPCODES, BranchKind, OPCODE_MASK, OP_MASK, CLASS_MASK, CLASS_ALU, CLASS_ALU64
+from helpers import HelperClass, helper
+from ir import NUM_REGS
+
+NUM_LANES = 4
+DEFAULT_BRANCH_LANE = 0
+LANE_FORWARD_CONSTRAINT = True  # depending instructions scheduled back to back must be on the same lane
+IMEM_ROWS = 256  # rows of the instruction memory
+MIN_REGS = 11  # registers used by the eBPF ABI (r0-r9 and the stack pointer r10)
+
+MUL_OPS = {0x20, 0x30, 0x90}  # *=, /=, %=
+
+
+class OpClass(IntEnum):
+    # latency class of an instruction
+    ALU = 0,  # ALU, moves and any instruction without a register output
+    MUL = 1,  # multiplications, divisions and modulos
+    LOAD = 2,  # memory loads
+    CALL = 3  # helper function calls (return value in r0)
+
+
+DEFAULT_LATENCIES = {OpClass.ALU: 1, OpClass.MUL: 1, OpClass.LOAD: 1, OpClass.CALL: 1}
+
+
+def opcode_class(opcode):
+    # This method returns the latency class of the instructions with the opcode
+
+    desc = OPCODES[opcode]
+    if desc.branch_kind == BranchKind.CALL:
+        return OpClass.CALL
+    if desc.mem_read:
+        return OpClass.LOAD
+    if opcode & CLASS_MASK in (CLASS_ALU, CLASS_ALU64) and opcode & OP_MASK in MUL_OPS:
+        return OpClass.MUL
+    return OpClass.ALU
+
+
+OPCODE_CLASSES = tuple(opcode_class(opcode) for opcode in range(OPCODE_MASK + 1))  # opcode -> OpClass
+
+
+def op_class(unpkd):
+    # This method returns the latency class of an unpacked instruction
+
+    return OPCODE_CLASSES[unpkd.opcode]
+
+
+class Machine:
+    # Description of the Sephirot core programs are compiled for: lanes of the VLIW resource table, lanes able to
+    # execute branches, lane forwarding rule, registers, rows of the instruction memory and latencies (an instruction
+    # output can be read latency rows after it, helper calls by latency class of the helper, by default the latency of
+    # OpClass.CALL). Instances are plain values, they can be sent to worker processes
+
+    def __init__(self, n_lanes=NUM_LANES, branch_lanes=None, lane_forward_constraint=LANE_FORWARD_CONSTRAINT,
+                 n_regs=NUM_REGS, imem_rows=IMEM_ROWS, latencies=None, helper_latencies=None):
+        self.n_lanes = n_lanes
+        self.branch_lanes = sorted(set(branch_lanes)) if branch_lanes is not None else list(range(n_lanes))
+        self.lane_forward_constraint = lane_forward_constraint
+        self.n_regs = n_regs
+        self.imem_rows = imem_rows
+        self.latencies = dict(DEFAULT_LATENCIES)
+        if latencies is not None:
+            self.latencies.update(latencies)
+        self.helper_latencies = {c: self.latencies[OpClass.CALL] for c in HelperClass}
+        if helper_latencies is not None:
+            self.helper_latencies.update(helper_latencies)
+
+        if n_lanes < 1 or not self.branch_lanes or not all(0 <= lane < n_lanes for lane in self.branch_lanes):
+            print("\033[91mInvalid machine: " + str(n_lanes) + " lanes, branch lanes " + str(self.branch_lanes))
+            exit(-1)
+        if not MIN_REGS <= n_regs <= NUM_REGS:
+            print("\033[91mInvalid machine: " + str(n_regs) + " registers (" + str(MIN_REGS) + "-" + str(NUM_REGS) +
+                  " supported)")
+            exit(-1)
+        if any(latency < 1 for latency in list(self.latencies.values()) + list(self.helper_latencies.values())):
+            print("\033[91mInvalid machine: latencies must be at least 1 row")
+            exit(-1)
+
+    def __eq__(self, other):
+        return isinstance(other, Machine) and vars(self) == vars(other)
+
+    def __repr__(self):
+        return "Machine(" + ", ".join(k + "=" + repr(v) for k, v in vars(self).items()) + ")"
+
+    @property
+    def branch_all_lanes(self):
+        return len(self.branch_lanes) == self.n_lanes
+
+    def latency(self, unpkd):
+        # This method returns the # of rows after which the output of the instruction can be read
+
+        op = OPCODE_CLASSES[unpkd.opcode]
+        if op == OpClass.CALL:
+            return self.helper_latencies[helper(unpkd.immediate).latency]
+        return self.latencies[op]
+
+    def label(self):
+        # This method returns a short description of the machine (for reports)
+
+        label = str(self.n_lanes) + "L"
+        if not self.branch_all_lanes:
+            label += " br" + ",".join(str(lane) for lane in self.branch_lanes)
+        if not self.lane_forward_constraint:
+            label += " nofwd"
+        if self.n_regs != NUM_REGS:
+            label += " " + str(self.n_regs) + "r"
+        slow = [c.name.lower() + str(self.latencies[c]) for c in OpClass if self.latencies[c] != 1]
+        slow += [c.name.lower() + str(self.helper_latencies[c]) for c in HelperClass
+                 if self.helper_latencies[c] != self.latencies[OpClass.CALL]]
+        if slow:
+            label += " " + " ".join(slow)
+        return label
+
+
+SEPHIROT = Machine()  # the default core: 4 lanes, branches on any lane, lane forwarding
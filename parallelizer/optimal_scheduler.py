@@ -0,0 +1,96 @@
+import time
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+class OptimalBlockScheduler:
+    # Branch-and-bound search of a minimum rows schedule for a small block on the VLIW resource table. Nodes are the
+    # instructions to place, numbered in a topological order of the DDG. Edges (p, s, delay, forward) require
+    # row(s) >= row(p) + delay and, if forward is set, the same lane when s is placed in the row row(p) + delay (lane
+    # forwarding). The branch closing the block (if any) is placed in the last row, on one of the branch lanes
+
+    def __init__(self, num_lanes, branch_lanes, budget):
+        self.num_lanes = num_lanes
+        self.branch_lanes = branch_lanes  # lanes allowed for branches
+        self.budget = budget  # seconds for each search
+
+    def schedule(self, n, edges, branch=None, entry_lanes=None, upper_bound=None, release=None):
+        # This method searches a schedule using less than upper_bound rows, entry_lanes: node -> {row: lanes allowed
+        # in the row} (forwarding from previous blocks), release: node -> first row allowed (values of previous blocks
+        # not readable yet). Returns (rows, {node: (row, lane)}, lower_bound): the placement is None if no better
+        # schedule was found, lower_bound is the # of rows proved to be needed
+
+        self.n = n
+        self.branch = branch
+        self.entry_lanes = entry_lanes if entry_lanes is not None else {}
+        self.release = release if release is not None else {}
+        self.preds = [[] for _ in range(n)]
+        self.tail = [0] * n  # min # of rows after the node (longest delay path to the block end)
+        for p, s, delay, forward in edges:
+            self.preds[s].append((p, delay, forward))
+        for s in reversed(range(n)):
+            for p, delay, forward in self.preds[s]:
+                self.tail[p] = max(self.tail[p], self.tail[s] + delay)
+        if branch is not None:
+            for p in range(n):
+                if p != branch:
+                    self.tail[p] = max(self.tail[p], self.tail[branch])
+
+        lower_bound = max(max([self.release.get(p, 0) + self.tail[p] for p in range(n)], default=0) + 1,
+                          -(-n // self.num_lanes))
+        if upper_bound is None:
+            upper_bound = n + max(self.tail, default=0) + max(self.release.values(), default=0) + 2
+
+        self.deadline = time.perf_counter() + self.budget
+        for rows in range(lower_bound, upper_bound):
+            try:
+                placement = self.__search(rows)
+            except SearchTimeout:
+                return None, None, rows
+            if placement is not None:
+                return rows, placement, rows
+        return None, None, upper_bound
+
+    def __search(self, rows):
+        # This method looks for a placement in rows rows (depth first, nodes in topological order)
+
+        self.rows = rows
+        self.table = [[None] * self.num_lanes for _ in range(rows)]
+        self.placement = {}
+        self.steps = 0
+        return dict(self.placement) if self.__place(0) else None
+
+    def __place(self, node):
+        if node == self.n:
+            return True
+
+        self.steps += 1
+        if self.steps % 256 == 0 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        earliest, latest = self.release.get(node, 0), self.rows - 1 - self.tail[node]
+        for p, delay, forward in self.preds[node]:
+            earliest = max(earliest, self.placement[p][0] + delay)
+        if node == self.branch:
+            earliest = max(earliest, self.rows - 1)
+
+        for row in range(earliest, latest + 1):
+            lanes = self.branch_lanes if node == self.branch else range(self.num_lanes)
+            if row in self.entry_lanes.get(node, {}):
+                lanes = [lane for lane in lanes if lane in self.entry_lanes[node][row]]
+            for p, delay, forward in self.preds[node]:
+                if forward and self.placement[p][0] == row - delay:
+                    lanes = [lane for lane in lanes if lane == self.placement[p][1]]
+
+            for lane in lanes:
+                if self.table[row][lane] is not None:
+                    continue
+                self.table[row][lane] = node
+                self.placement[node] = (row, lane)
+                if self.__place(node + 1):
+                    return True
+                self.table[row][lane] = None
+                del self.placement[node]
+        return False
@@ -1,21 +1,22 @@
-from enum import Enum
-import networkx as nx
+from collections import deque
+import numpy as np
 from ebpf_parser import *
-import re
 import TableIt
 
-from optimizations.Load48Store48 import Load48Store48
-from optimizations.LoadStore48 import LoadStore48
-from optimizations.MemsetToZero import MemsetToZero
 from register_cache import *
-
-NUM_LANES = 4
-DEFAULT_BRANCH_LANE = 0
-BRANCH_ALL_LANES = True  # branches can be assigned to any lane
-LANE_FORWARD_CONSTRAINT = True  # depending instructions scheduled back to back must be on the same lane
+from register_allocator import Webs, RegisterAllocator
+from helpers import helper, helper_args
+from packet_bounds import PacketBounds
+from constant_propagation import ConstantPropagation
+from dead_code import DeadCode
+from peephole import Peephole
+from resource_table import ResourceTable
+from ir import *
+from graph import Graph
+from optimal_scheduler import OptimalBlockScheduler
+from machine import SEPHIROT
 
 # ABI physical register constraint
-NUM_PHY_REGS = 10
 CALLS_REGS = list(range(1, 6))
 STACK_REG = 10
 RETURN_REG = 0
@@ -23,9 +24,17 @@ RETURN_REG = 0
 ALL_CALL_MODIFIED = list(CALLS_REGS)
 ALL_CALL_MODIFIED.extend([RETURN_REG])
 
-REMOVE_MEM_BOUNDARY_CHECKS = False  # remove memory boundary checks
-ADVANCED_OPTIMIZATIONS = True  # enable advanced optimizations (e.g., LoadStore48, Load48Store48, MemsetToZero)
+CONSTANT_PROPAGATION = True  # fold the constants into the instructions, removing the branches with a known outcome
+BOUNDS_ANALYSIS = True  # remove the packet bounds checks proved redundant by the packet bounds analysis
+REMOVE_MEM_BOUNDARY_CHECKS = False  # also remove the bounds checks made redundant by the hardware bounds protection
+DEAD_CODE_ELIMINATION = True  # remove the dead instructions and stack stores, with the local optimizations
+ADVANCED_OPTIMIZATIONS = True  # enable the peephole patterns (LOAD48/STORE48 fusion, memory zeroing removal)
 CODE_MOVEMENT = False  # enable code movement optimization
+IF_CONVERSION = True  # remove the if branches of triangles/diamonds whose conditional code is a no-op on the other path
+REGISTER_ALLOCATION = True  # schedule values ignoring the reuse of their registers, assigned after by graph coloring
+SUPERBLOCK_SCHEDULING = True  # hoist instructions across the branches of the likely path (superblocks)
+OPTIMAL_SCHED_MAX_BLOCK = 10  # blocks with up to this # of instructions are scheduled by branch-and-bound (0 disables)
+OPTIMAL_SCHED_BUDGET = 0.05  # time budget (seconds) of the branch-and-bound search for each block
 
 # debug prints and graph plot
 DEBUG_DRAW_CFG = False  # draw program CFG
@@ -34,32 +43,8 @@ DEBUG_PRINT_BLOCKS_PRE_SCHED = False  # print blocks before scheduling (after lo
 DEBUG_DRAW_DDG = False  # draw block DDG
 DEBUG_PRINT_RESOURCE_TABLE = True  # print the final resource table (with instructions in their str representation)
 
-TYPE = "type"
-START = "start"
-LEN = "len"
-INSTRUCTIONS = "instructions"
-OUT_OPERANDS = "out_operands"
-IN_OPERANDS = "in_operands"
-DEFS = "defs"
-USES = "uses"
-SYM_TABLE = "sym_table"
-TNEXT = "tnext"
-FNEXT = "fnext"
 RESOURCE_TABLE = "resource_table"
 
-INSTR_B = "instr_b"
-INSTR_S = "instr_s"
-INPUTS = "inputs"
-OUTPUT = "output"
-ORIG_POS = "orig_pos"
-JMP_BLOCK = "jmp_block"
-PENDING_DEPS = "pending_deps"
-
-SYM_NAME = "sym_name"
-LIVE = "live"
-NEXT_USE = "next_use"
-
-OFFSET = "offset"
 BRANCHES = "branches"
 
 BLOCK = "block"
@@ -68,21 +53,29 @@ LANE = "lane"
 
 SYMBOLS = "symbols"
 
-
-class BlockType(Enum):
-    START = 0,  # entry point for the program (pseudoblock)
-    EXIT = 1,  # exit point for the program (pseudoblock)
-    BASIC = 2,  # actual block with code
-    CALL = 3,  # helper function call pseudoblock
-    DISABLED = 4  # empty block after optimizations (pseudoblock)
+# if-conversion: relation of the operands of an unsigned if branch when it is not taken (NEGATED) and when they are
+# swapped (SWAPPED), ALU operations leaving the destination unchanged with a 0 (1) operand
+NEGATED_RELATION = {"==": "!=", "!=": "==", ">": "<=", "<=": ">", ">=": "<", "<": ">="}
+SWAPPED_RELATION = {"==": "==", "!=": "!=", ">": "<", "<": ">", ">=": "<=", "<=": ">="}
+ZERO_IDENTITY_OPS = {"+=", "-=", "|=", "^=", "<<=", ">>=", "s>>="}
+ONE_IDENTITY_OPS = {"*=", "/="}
+U64_MASK = (1 << 64) - 1
 
 
 class Optimizer:
-    def __init__(self, program_bin, program_str, filename=None, branch_all_lanes=BRANCH_ALL_LANES,
-                 lane_forward_constraint=LANE_FORWARD_CONSTRAINT,
+    def __init__(self, program_bin, filename=None, machine=SEPHIROT,
+                 constant_propagation=CONSTANT_PROPAGATION,
+                 bounds_analysis=BOUNDS_ANALYSIS,
                  remove_mem_boundary_checks=REMOVE_MEM_BOUNDARY_CHECKS,
+                 dead_code_elimination=DEAD_CODE_ELIMINATION,
                  advanced_optimizations=ADVANCED_OPTIMIZATIONS,
                  code_movement=CODE_MOVEMENT,
+                 if_conversion=IF_CONVERSION,
+                 register_allocation=REGISTER_ALLOCATION,
+                 superblock_scheduling=SUPERBLOCK_SCHEDULING,
+                 optimal_sched_max_block=OPTIMAL_SCHED_MAX_BLOCK,
+                 optimal_sched_budget=OPTIMAL_SCHED_BUDGET,
+                 profile=None,
                  debug_draw_cfg=DEBUG_DRAW_CFG,
                  debug_print_blocks_pre_sched=DEBUG_PRINT_BLOCKS_PRE_SCHED,
                  debug_print_blocks_pre_opt=DEBUG_PRINT_BLOCKS_PRE_OPT,
@@ -90,94 +83,96 @@ class Optimizer:
                  debug_print_resource_table=DEBUG_PRINT_RESOURCE_TABLE):
         # params
         self.filename = filename  # filename, used for debugging
-        self.branch_all_lanes = branch_all_lanes
-        self.lane_forward_constraint = lane_forward_constraint
+        self.machine = machine  # Machine the program is scheduled for (lanes, branch lanes, forwarding, latencies)
+        self.constant_propagation = constant_propagation
+        self.bounds_analysis = bounds_analysis
         self.remove_mem_boundary_checks = remove_mem_boundary_checks
+        self.dead_code_elimination = dead_code_elimination
         self.advanced_optimizations = advanced_optimizations
         self.code_movement = code_movement
+        self.if_conversion = if_conversion
+        self.register_allocation = register_allocation
+        self.superblock_scheduling = superblock_scheduling
+        self.optimal_sched_max_block = optimal_sched_max_block
+        self.optimal_sched_budget = optimal_sched_budget
+        self.profile = profile  # BlockProfile of the program on a traffic mix (hot and cold paths), None if missing
         self.debug_draw_cfg = debug_draw_cfg
         self.debug_print_blocks_pre_sched = debug_print_blocks_pre_sched
         self.debug_print_blocks_pre_opt = debug_print_blocks_pre_opt
         self.debug_draw_ddg = debug_draw_ddg
         self.debug_print_resource_table = debug_print_resource_table
 
-        self.program_bin = program_bin  # as int array
-        self.program_str = program_str  # as str array
+        self.program_bin = program_bin  # as int array (str mnemonics are generated on demand by disassemble)
+        if self.profile is not None:
+            self.profile.check(self.program_bin)
 
         self.__reinit_block_info_data_structs()
 
-        self.resource_table = [[None for i in range(NUM_LANES)] for i in
-                               self.program_bin]  # global resource table (each lane at each clock cycle)
-
-        self.bound_check_cache = {"pkt_act_reg": None,  # reg containing action if default not defined
-                                  "pkt_act": None,
-                                  # action, if pkt_act is None is the default action of the program (mov-exit)
-                                  "ctx": (None, 0),  # pointer to xdp context
-                                  "ctx_data": (None, 0),  # ctx->data
-                                  "ctx_data_end": (None, 0),  # ctx->data_end
-                                  "ctx_data_+_offset": (None, None, 0)  # (reg_name, offset, valid_until_line)
-                                  }  # (reg_name, valid_until_line)
+        # global resource table (each lane at each clock cycle), grows on demand
+        self.resource_table = ResourceTable(self.machine.n_lanes, len(self.program_bin))
 
         # stats
         self.mov_alu_compressed = 0
+        self.if_converted = 0  # if branches removed by if-conversion
+        self.constants_folded = 0  # instructions with constants folded into immediates
+        self.branches_folded = 0  # if branches with a known outcome (always or never taken)
+        self.constants_removed = 0  # instructions removed by the constant propagation (also unreachable code)
+        self.bounds_redundant = 0  # bounds checks removed, proved by the previous checks
+        self.bounds_protected = 0  # bounds checks removed, made redundant by the hardware bounds protection
+        self.bounds_removed = 0  # instructions removed with the bounds checks (operands and unreachable code)
+        self.dead_removed = 0  # dead instructions removed (definitions never read and stack stores never read)
+        self.dead_stores_removed = 0  # dead stack stores removed
+        self.renamed_values = 0  # values assigned to a register different from their original one
+        self.coalesced_moves = 0  # moves removed, their source and destination values assigned the same register
+        self.allocation_fallback = False  # values not fitting the registers, scheduled on their original registers
+        self.hoisted = 0  # instructions scheduled in the rows of a previous block of their superblock
+        self.optimal_sched_report = []  # (block, greedy rows, rows, lower bound) of the blocks searched for optimality
+        self.block_rows = {}  # block -> # of rows of its schedule
         self.movi_exit_compressed = 0
+        self.peephole_matched = {}  # peephole pattern -> # of rewrites
 
         # output symbols in use
         self.reg_cache = RegisterCache()  # in use registers cache
+        self.webs = None  # values of the program (webs of definitions and uses), see __compute_webs
+        self.fixed_webs = set()  # values bound to their register by the ABI
+        self.virtual_regs = {}  # web -> virtual register (its register if bound by the ABI)
+        self.virtual_registers = False  # scheduling on virtual registers (false dependencies between values ignored)
+        self.abi_order = False  # values bound by the ABI scheduled in order with the other values of their register
 
     def __find_branches(self):
-        # This method do a forward pass to the ebpf assembly and identifies branches (divided in jumps, calls & exits)
-
-        for i in range(len(self.program_bin)):
-            unpkd = unpack_instruction(self.program_bin[i])
+        # This method identifies branches (divided in jumps, calls & exits) on the columns of the unpacked program
 
-            if is_jump(unpkd):
-                self.jumps_indexes.add(i)
+        jumps = np.flatnonzero(jump_mask(self.program_unpkd))
+        targets = jumps + self.program_unpkd["offset"][jumps] + 1
 
-                target = i + unpkd[OFFSET] + 1
+        for i, target in zip(jumps.tolist(), targets.tolist()):
+            self.jumps_indexes.add(i)
 
-                if target >= len(self.program_bin):
-                    print("\033[91mInvalid offset (outside program) for branch instruction " + "0x{:16x}".format(
-                        self.program_bin[i]))
-                    exit(-1)
+            if target >= len(self.program_bin):
+                print("\033[91mInvalid offset (outside program) for branch instruction " + "0x{:16x}".format(
+                    self.program_bin[i]))
+                exit(-1)
 
-                if target not in self.jumps_targets_indexes:
-                    self.jumps_targets_indexes[target] = {BRANCHES: [i]}
-                else:
-                    self.jumps_targets_indexes[target][BRANCHES].append(i)
-
-            elif is_call(unpkd):
-                self.calls_indexes.add(i)
+            if target not in self.jumps_targets_indexes:
+                self.jumps_targets_indexes[target] = {BRANCHES: [i]}
+            else:
+                self.jumps_targets_indexes[target][BRANCHES].append(i)
 
-            elif is_exit(unpkd):
-                self.exits_indexes.add(i)
+        self.calls_indexes.update(np.flatnonzero(call_mask(self.program_unpkd)).tolist())
+        self.exits_indexes.update(np.flatnonzero(exit_mask(self.program_unpkd)).tolist())
 
     def __parse_instruction(self, pos):
         # This method parses the instruction unpacking its input(output) operands, saving its original pos in the
         # ebpf asm (global id in the compiler), the landing block (if it's a jump) and the # of pending instructions
         # to be evaluated for the input operands
 
-        instr_b = self.program_bin[pos]
-        instr_s = self.program_str[pos]
-
-        unpkd = unpack_instruction(instr_b)
-
-        return {INSTR_B: instr_b,
-                INSTR_S: instr_s,
-                INPUTS: [{SYM_NAME: op, LIVE: False, NEXT_USE: None} for op in get_inputs(unpkd)],
-                OUTPUT: {SYM_NAME: get_output(unpkd), LIVE: False, NEXT_USE: None} if get_output(
-                    unpkd) is not None and not is_nop(unpkd) else None,
-                ORIG_POS: pos,
-                JMP_BLOCK: None,
-                PENDING_DEPS: len(get_inputs(unpkd))
-                }
+        return Instruction(self.program_bin[pos], pos)
 
     def __leader_to_block(self, leader):
         # This method resolves from the leader instruction id the correspondent block
 
-        for b in range(len(self.blocks)):
-            if self.blocks[b][START] == leader:
-                return b
+        if leader in self.leader_index:
+            return self.leader_index[leader]
         if leader == len(self.program_bin) - 1:
             return len(self.blocks) - 1
 
@@ -187,85 +182,42 @@ class Optimizer:
     def __inst_to_block(self, inst_pos):
         # This method resolves from the instruction id to the correspondent block
 
-        found = False
-        for b in range(len(self.blocks)):
-            for inst in self.blocks[b][INSTRUCTIONS]:
-                if inst[ORIG_POS] == inst_pos:
-                    found = True
-                    break
-            if found:
-                return b
+        if inst_pos in self.pos_index:
+            return self.pos_index[inst_pos][0]
 
         print("\033[91m[optimizer_core] __inst_to_block: invalid instruction " + str(inst_pos))
         exit(-1)
 
+    def __add_block(self, blck):
+        # This method appends a block, indexing it by its leader instruction (pseudoblocks share the leader with the
+        # block they follow, which keeps the index)
+
+        self.leader_index.setdefault(blck.start, len(self.blocks))
+        self.blocks.append(blck)
+
     def __find_blocks(self):
         # This method finds block boundaries with boundaries found by __find_branches
 
         calls_exits = self.calls_indexes.union(self.exits_indexes) - {len(self.program_bin) - 1}
+        calls = call_mask(self.program_unpkd)
 
         leaders = sorted(
             set(map(lambda x: x + 1 if x < len(self.program_bin) - 1 else x,
                     self.jumps_indexes.union(calls_exits))).union(
                 self.jumps_targets_indexes.keys()))  # leader instructions from branches boundaries
 
-        if len(leaders) and leaders[0] > 0:
-            self.blocks.append({TYPE: BlockType.BASIC,
-                                START: 0,
-                                LEN: leaders[0],
-                                INSTRUCTIONS: [],
-                                OUT_OPERANDS: {},  # symbols live in exit (living outputs for the block)
-                                IN_OPERANDS: {},  # input symbols for the block
-                                DEFS: {},  # defined symbols
-                                USES: {},  # used symbols
-                                SYM_TABLE: {},  # sym_name: {LIVE: True|False, NEXT_USE: i} (i index in seq program)
-                                TNEXT: [],
-                                FNEXT: None,
-                                })
+        if not leaders or leaders[0] > 0:  # program without branches (e.g., after if-conversion): a single block
+            self.__add_block(Block(BlockType.BASIC, 0, leaders[0] if leaders else len(self.program_bin)))
 
         for i in range(len(leaders)):
             length = leaders[i + 1] - leaders[i] if i < len(leaders) - 1 else len(self.program_bin) - leaders[i]
 
-            self.blocks.append({TYPE: BlockType.BASIC,
-                                START: leaders[i],
-                                LEN: length,
-                                INSTRUCTIONS: [],
-                                OUT_OPERANDS: {},  # symbols live in exit (living outputs for the block)
-                                IN_OPERANDS: {},  # input symbols for the block
-                                DEFS: {},  # defined symbols
-                                USES: {},  # used symbols
-                                SYM_TABLE: {},  # sym_name: {LIVE: True|False, NEXT_USE: i} (i index in seq program)
-                                TNEXT: [],
-                                FNEXT: None,
-                                })
-
-            last = unpack_instruction(self.program_bin[leaders[i] + length - 1])
-            if is_call(last):
-                self.blocks.append({TYPE: BlockType.CALL,
-                                    START: leaders[i],
-                                    LEN: 0,
-                                    INSTRUCTIONS: [],
-                                    OUT_OPERANDS: {},  # symbols live in exit (living outputs for the block)
-                                    IN_OPERANDS: {},  # input symbols for the block
-                                    DEFS: {},  # defined symbols
-                                    USES: {},  # used symbols
-                                    SYM_TABLE: {},  # sym_name: {LIVE: True|False, NEXT_USE: i} (i index in seq program)
-                                    TNEXT: [],
-                                    FNEXT: None,
-                                    })
-
-        self.blocks.append({TYPE: BlockType.EXIT,
-                            START: len(self.program_bin),
-                            LEN: 0,
-                            INSTRUCTIONS: [],
-                            OUT_OPERANDS: {},  # symbols live in exit (living outputs for the block)
-                            IN_OPERANDS: {},  # input symbols for the block
-                            DEFS: {},  # defined symbols
-                            USES: {},  # used symbols
-                            SYM_TABLE: {},  # sym_name: {LIVE: True|False, NEXT_USE: i} (i index in seq program)
-                            TNEXT: [],
-                            FNEXT: None,
-                            })
+            self.__add_block(Block(BlockType.BASIC, leaders[i], length))
+
+            if calls[leaders[i] + length - 1]:
+                self.__add_block(Block(BlockType.CALL, leaders[i], 0))
+
+        self.__add_block(Block(BlockType.EXIT, len(self.program_bin), 0))
 
     def __parse_blocks(self):
         # This method uses boundaries fond by __find_blocks and divides the eBPF asm in blocks
@@ -275,58 +227,61 @@ class Optimizer:
         for b in range(1, len(self.blocks) - 1):
             blck = self.blocks[b]
 
-            for i in range(blck[START], blck[START] + blck[LEN]):
+            for i in range(blck.start, blck.start + blck.len):
                 instr = self.__parse_instruction(i)
 
-                blck[INSTRUCTIONS].append(instr)
+                self.pos_index[i] = (b, len(blck.instructions))
+                blck.instructions.append(instr)
                 self.schedule[i][BLOCK] = b
 
-            blck[FNEXT] = b + 1
+            blck.index_registers()
 
-            if blck[TYPE] == BlockType.CALL:
-                blck[FNEXT] = b + 1
-                blck[TNEXT] = []
+            blck.fnext = b + 1
+
+            if blck.type == BlockType.CALL:
+                blck.fnext = b + 1
+                blck.tnext = []
 
             else:
-                last = unpack_instruction(blck[INSTRUCTIONS][-1][INSTR_B])
+                last = blck.instructions[-1].unpkd
                 if is_call(last):
-                    blck[TNEXT].append(b + 1)
-                    blck[FNEXT] = None
+                    blck.tnext.append(b + 1)
+                    blck.fnext = None
                 elif is_jump(last):
-                    blck[TNEXT].append(self.__leader_to_block(blck[START] + blck[LEN] + last[OFFSET]))
-                    blck[INSTRUCTIONS][-1][JMP_BLOCK] = blck[TNEXT][-1]
+                    blck.tnext.append(self.__leader_to_block(blck.start + blck.len + last.offset))
+                    blck.instructions[-1].jmp_block = blck.tnext[-1]
                     if is_goto(last):
-                        blck[FNEXT] = None
+                        blck.fnext = None
                 elif is_exit(last):
-                    blck[TNEXT].append(len(self.blocks) - 1)
-                    blck[FNEXT] = None
+                    blck.tnext.append(len(self.blocks) - 1)
+                    blck.fnext = None
 
     def __build_flow_graph(self):
         # Build program CFG using information computed by __parse_blocks, computing dominators and postdominators
         # for each block
 
-        self.flow_graph = nx.DiGraph()
+        self.flow_graph = Graph()
         edges = []
         for b in range(len(self.blocks)):
-            if self.blocks[b][TYPE] == BlockType.START:
+            if self.blocks[b].type == BlockType.START:
                 self.flow_graph.add_node(b, shape="square", style="filled", fillcolor="royalblue", label='START')
-            elif self.blocks[b][TYPE] == BlockType.EXIT:
+            elif self.blocks[b].type == BlockType.EXIT:
                 self.flow_graph.add_node(b, shape="square", style="filled", fillcolor="royalblue", label='EXIT')
-            elif self.blocks[b][TYPE] == BlockType.CALL:
+            elif self.blocks[b].type == BlockType.CALL:
                 self.flow_graph.add_node(b, shape="square", style="filled", fillcolor="orange", label='CALL')
             else:
                 self.flow_graph.add_node(b, label="B" + str(b))
 
-            for dst_blck in self.blocks[b][TNEXT]:
+            for dst_blck in self.blocks[b].tnext:
                 edges.append((b, dst_blck))
-            if self.blocks[b][FNEXT] is not None:
-                edges.append((b, self.blocks[b][FNEXT]))
+            if self.blocks[b].fnext is not None:
+                edges.append((b, self.blocks[b].fnext))
 
         self.flow_graph.add_edges_from(edges)
 
         if self.code_movement:  # TODO: minor performance improvement, disabled for now
-            self.dominators = self.__compute_dominators(self.flow_graph)
-            self.postdominators = self.__compute_dominators(self.flow_graph.reverse())
+            self.dominators = self.flow_graph.dominators()
+            self.postdominators = self.flow_graph.reverse().dominators()
 
     def __reinit_block_info_data_structs(self):
         # This method reinit the compiler data structures containing info on blocks. Must be called before
@@ -338,18 +293,10 @@ class Optimizer:
 
         self.jumps_targets_indexes = {}  # target_index -> BRANCHES: [x, y, ...]
 
-        self.blocks = [{TYPE: BlockType.START,
-                        START: -1,
-                        LEN: 0,
-                        INSTRUCTIONS: [],
-                        OUT_OPERANDS: {},  # symbols live in exit (living outputs for the block)
-                        IN_OPERANDS: {},  # input symbols for the block
-                        DEFS: {},  # defined symbols
-                        USES: {},  # used symbols
-                        SYM_TABLE: {},  # sym_name: {LIVE: True|False, NEXT_USE: i} (i index in seq program)
-                        TNEXT: [],
-                        FNEXT: 1,
-                        }]
+        self.blocks = []
+        self.leader_index = {}  # leader instruction id -> block
+        self.pos_index = {}  # instruction global id -> (block, local id)
+        self.__add_block(Block(BlockType.START, -1, 0, fnext=1))
 
         self.schedule = [{BLOCK: None, TIME: i, LANE: None} for i in
                          range(len(self.program_bin))]  # global schedule for each instruction (block, time, lane)
@@ -357,6 +304,7 @@ class Optimizer:
     def __analyze_program_cfg(self):
         # This method analyze the eBPF asm program blocks and computes CFG
 
+        self.program_unpkd = unpack_program(self.program_bin)  # whole program decoded in columns
         self.__find_branches()  # fw pass to find branch boundaries
         self.__find_blocks()  # fw pass to identify basic blocks
         self.__parse_blocks()  # fw pass parse instructions and divide in basic blocks
@@ -367,47 +315,114 @@ class Optimizer:
 
         self.__compute_liveness_global()  # compute liveness between blocks
         self.__compute_next_use_liveness_local()  # compute liveness inside each basic block
+        self.__compute_stack_pointers()  # registers which may point to the stack (memory dependencies)
+        self.__compute_reaching_definitions()  # def-use/use-def chains of the whole program
 
     def optimize(self):
         self.__analyze_program_cfg()
 
+        # Constant propagation: the CFG must be recomputed without the folded branches
+        if self.constant_propagation and self.__propagate_constants():
+            self.__reinit_block_info_data_structs()
+            self.__analyze_program_cfg()
+
+        # If-conversion: the CFG must be recomputed without the removed branches
+        if self.if_conversion and self.__if_conversion():
+            self.__reinit_block_info_data_structs()
+            self.__analyze_program_cfg()
+
+        # Packet bounds checks: the CFG must be recomputed without the removed checks
+        if (self.bounds_analysis or self.remove_mem_boundary_checks) and self.__remove_bounds_checks():
+            self.__reinit_block_info_data_structs()
+            self.__analyze_program_cfg()
+
         # DEBUG: print program blocks
         if self.debug_print_blocks_pre_opt:
             self.__print_blocks()
 
         # DEBUG: draw program CFG
         if self.debug_draw_cfg:
-            p = nx.drawing.nx_pydot.to_pydot(self.flow_graph)
-            p.write_png(self.filename + '_CFG.png' if self.filename is not None else "flow_graph.png")
-
-        # Local optimizations
-        self.__local_optimizations()  # mov-alu & mov-exit compression
-        self.__analyze_program_data_deps()
-
-        if self.remove_mem_boundary_checks:
-            self.__remove_memory_boundaries_checks()
-
-        if self.advanced_optimizations:
-            self.__advanced_optimizations()
-
-        # After local optimizations CFG and data deps must be recomputed
-        if self.remove_mem_boundary_checks or self.__advanced_optimizations():
+            self.flow_graph.draw(self.filename + '_CFG.png' if self.filename is not None else "flow_graph.png")
+
+        # Local optimizations (mov-alu & mov-exit compression), peephole patterns and dead code elimination until the
+        # program does not change: the CFG must be recomputed after each pass modifying the program
+        while True:
+            if self.__local_optimizations():
+                self.__reinit_block_info_data_structs()
+                self.__analyze_program_cfg()
+            if self.advanced_optimizations and self.__advanced_optimizations():
+                self.__reinit_block_info_data_structs()
+                self.__analyze_program_cfg()
+            if not self.dead_code_elimination or not self.__eliminate_dead_code():
+                break
             self.__reinit_block_info_data_structs()
             self.__analyze_program_cfg()
-            self.__analyze_program_data_deps()
+        self.__analyze_program_data_deps()
 
-        # Register renaming pass in order to remove WAW dependencies
-        # self.__pre_schedule_register_assignment()
+        # Register renaming pass in order to remove WAR/WAW dependencies
+        self.__pre_schedule_register_assignment()
 
         if self.debug_print_blocks_pre_sched:
             self.__print_blocks()
 
-        # Scheduling
+        # Scheduling on virtual registers, then register allocation. If the values do not fit the registers, the
+        # program is scheduled again keeping the order of the values bound by the ABI with the other values of their
+        # registers, then with the dependencies of the original registers (always a valid allocation)
         self.__global_schedule()
+        if self.virtual_registers and not self.__allocate_registers():
+            self.abi_order = True
+            self.__reset_schedule()
+            self.__global_schedule()
+            if not self.__allocate_registers():
+                self.allocation_fallback = True
+                self.virtual_registers = False
+                self.__reset_schedule()
+                self.__global_schedule()
 
         print("\nLocal Optimizations:")
         print(" ~ mov-alu: " + str(self.mov_alu_compressed))
         print(" ~ movi-exit: " + str(self.movi_exit_compressed))
+        print(" ~ if-conversion: " + str(self.if_converted))
+        print(" ~ superblock hoisted: " + str(self.hoisted))
+        if self.dead_code_elimination:
+            print(" ~ dead code: " + str(self.dead_removed) + " (stack stores: " + str(self.dead_stores_removed) + ")")
+        for name, n in self.peephole_matched.items():
+            print(" ~ " + name + ": " + str(n))
+
+        if self.constant_propagation:
+            print("\nConstant Propagation:")
+            print(" ~ folded: " + str(self.constants_folded))
+            print(" ~ branches: " + str(self.branches_folded))
+            print(" ~ instructions removed: " + str(self.constants_removed))
+
+        if self.bounds_analysis or self.remove_mem_boundary_checks:
+            print("\nBounds Checks:")
+            print(" ~ redundant: " + str(self.bounds_redundant))
+            if self.remove_mem_boundary_checks:
+                print(" ~ hardware protected: " + str(self.bounds_protected))
+            print(" ~ instructions removed: " + str(self.bounds_removed))
+
+        if self.register_allocation:
+            print("\nRegister Allocation:")
+            print(" ~ renamed values: " + str(self.renamed_values))
+            print(" ~ coalesced moves: " + str(self.coalesced_moves))
+            if self.allocation_fallback:
+                print(" ~ not enough registers, scheduled on the original registers")
+
+        if self.optimal_sched_report:
+            print("\nOptimal Block Scheduling:")
+            for b, greedy, rows, bound in self.optimal_sched_report:
+                print(" ~ B" + str(b) + ": " + str(rows) + " rows (greedy: " + str(greedy) + ", lower bound: " +
+                      str(bound) + ", gap: " + str(rows - bound) + ")")
+
+        if self.profile is not None and self.profile.packets > 0:
+            hot = [b for b in self.block_rows if self.__block_count(b) > 0]
+            print("\nProfile (" + str(self.profile.packets) + " packets):")
+            print(" ~ hot blocks: " + str(len(hot)) + "/" + str(len(self.block_rows)))
+            print(" ~ eBPF instructions per packet: " + "{0:.2f}".format(
+                sum(self.__block_count(b) * self.blocks[b].len for b in hot) / self.profile.packets))
+            print(" ~ rows per packet: " + "{0:.2f}".format(
+                sum(self.__block_count(b) * self.block_rows[b] for b in hot) / self.profile.packets))
 
         print("\nBranches found:")
         print(" ~ jumps:         " + str(sorted(self.jumps_indexes)))
@@ -424,68 +439,272 @@ class Optimizer:
         print("START block\n")
         for b in range(1, len(self.blocks) - 1):
             blck = self.blocks[b]
-            print("B" + str(b) + " - " + str(blck[TYPE])[10:])
+            print("B" + str(b) + " - " + str(blck.type)[10:])
             print("------------------")
 
-            for instr in blck[INSTRUCTIONS]:
-                print(instr[INSTR_S])
+            for instr in blck.instructions:
+                print(disassemble(instr.instr_b))
 
             print()
-            print("USE: " + str(blck[USES]))
-            print("DEF: " + str(blck[DEFS]))
-            print("IN: " + str(blck[IN_OPERANDS]))
-            print("OUT: " + str(blck[OUT_OPERANDS]))
+            print("USE: " + str(blck.uses))
+            print("DEF: " + str(blck.defs))
+            print("IN: " + str(blck.in_operands))
+            print("OUT: " + str(blck.out_operands))
 
-            if blck[TYPE] == BlockType.CALL:
+            if blck.type == BlockType.CALL:
                 print("... helper function code ...")
 
             print()
         print("EXIT block\n")
 
     def __compute_liveness_global(self):
-        # This method uses info calculated by __compute_liveness_global for computing data dependencies inside each
-        # block
+        # This method computes the live in/out registers of each block (as bitmasks over the registers), keeping for
+        # each live register the id of its first use
 
-        b = 0
         for blck in self.blocks:
-            blck[USES] = {}
-            blck[DEFS] = {}
-            blck[OUT_OPERANDS] = {}
-            blck[IN_OPERANDS] = {}
-            for instr in blck[INSTRUCTIONS]:
-                if is_call(unpack_instruction(instr[INSTR_B])):
-                    id = unpack_instruction(instr[INSTR_B])["immediate"]
-                    for inp in self.__call_to_regs(id):  # input regs from ABI
-                        if inp not in blck[DEFS]:
-                            blck[USES][inp] = instr[ORIG_POS]
-                    blck[DEFS][0] = instr[ORIG_POS]  # r0 as out reg
+            blck.uses = {}
+            blck.defs = {}
+            blck.out_operands = {}
+            blck.in_operands = {}
+            for instr in blck.instructions:
+                if is_call(instr.unpkd):
+                    id = instr.unpkd.immediate
+                    for inp in helper_args(id):  # input regs from ABI
+                        if inp not in blck.defs:
+                            blck.uses[inp] = instr.orig_pos
+                    for reg in mask_regs(helper(id).clobbers):  # r0 as out reg, r1-r5 clobbered
+                        blck.defs[reg] = instr.orig_pos
                     continue
-                for instr_in in instr[INPUTS]:
-                    if instr_in[SYM_NAME] not in blck[DEFS]:
-                        blck[USES][instr_in[SYM_NAME]] = instr[ORIG_POS]
-                if instr[OUTPUT] is not None:
-                    blck[DEFS][instr[OUTPUT][SYM_NAME]] = instr[ORIG_POS]
-            b += 1
-        fg_rev = self.flow_graph.reverse()
-        blocks = list(nx.topological_sort(fg_rev))
-        changed = True
-        while changed:
-            changed = False
+                for instr_in in instr.inputs:
+                    if instr_in.sym_name not in blck.defs:
+                        blck.uses[instr_in.sym_name] = instr.orig_pos
+                if instr.output is not None:
+                    blck.defs[instr.output.sym_name] = instr.orig_pos
+            blck.use_mask, blck.def_mask = reg_mask(blck.uses), reg_mask(blck.defs)
+            blck.in_mask, blck.out_mask = 0, 0
+
+        # worklist seeded with successors first, only predecessors of changed blocks are revisited
+        worklist = deque(reversed(self.flow_graph.topological_sort()))
+        pending = set(worklist)
+        while worklist:
+            b = worklist.popleft()
+            pending.discard(b)
+            blck = self.blocks[b]
 
-            for b in blocks:
-                blck = self.blocks[b]
-                last_in, last_out = self.__light_copy(blck[IN_OPERANDS]), self.__light_copy(blck[OUT_OPERANDS])
+            out_mask, out_operands = 0, {}
+            for s in self.flow_graph.successors(b):
+                succ = self.blocks[s]
+                out_mask |= succ.in_mask
+                for reg in mask_regs(succ.in_mask):
+                    if reg not in out_operands or out_operands[reg] > succ.in_operands[reg]:
+                        out_operands[reg] = succ.in_operands[reg]
+
+            in_mask = blck.use_mask | out_mask & ~blck.def_mask
+            in_operands = {}
+            for reg in mask_regs(in_mask):  # first use: in the block, otherwise in its successors
+                in_operands[reg] = min(blck.uses[reg], out_operands.get(reg, blck.uses[reg])) \
+                    if blck.use_mask >> reg & 1 else out_operands[reg]
+
+            blck.out_mask, blck.out_operands = out_mask, {reg: out_operands[reg] for reg in mask_regs(out_mask)}
+            if in_mask != blck.in_mask or in_operands != blck.in_operands:
+                blck.in_mask, blck.in_operands = in_mask, in_operands
+                for p in self.flow_graph.predecessors(b):
+                    if p not in pending:
+                        pending.add(p)
+                        worklist.append(p)
+
+    def __compute_stack_pointers(self):
+        # This method computes for each block the registers which may hold a stack pointer at its entry (forward, in
+        # topological order): at the program entry only the stack register
+
+        order = self.flow_graph.topological_sort()
+        for b in order:
+            self.blocks[b].stack_in = 0
+        self.blocks[order[0]].stack_in = 1 << STACK_REG
+
+        for b in order:
+            blck = self.blocks[b]
+            mask = blck.stack_in
+            for instr in blck.instructions:
+                mask = stack_transfer(mask, instr.unpkd)
+            for s in self.flow_graph.successors(b):
+                self.blocks[s].stack_in |= mask
+
+    def __reg_accesses(self, instr):
+        # This method returns the registers used and defined by instr, helper calls use their ABI arguments and
+        # clobber r0-r5
+
+        if is_call(instr.unpkd):
+            return helper_args(instr.unpkd.immediate), mask_regs(helper(instr.unpkd.immediate).clobbers)
+        return [inp.sym_name for inp in instr.inputs], [instr.output.sym_name] if instr.output is not None else []
+
+    def __compute_reaching_definitions(self):
+        # This method computes the definitions reaching each block (bitsets over the definitions, forward in
+        # topological order since the CFG is acyclic) and from them the chains of the whole program:
+        # use_def: (use, reg) -> [reaching definitions], def_use: (definition, reg) -> [uses], ids are global ids and
+        # -1 is the program entry (defining every register)
+
+        def_ids = [(-1, reg) for reg in range(NUM_REGS)]  # definition bit -> (global id, reg)
+        reg_def_masks = [1 << reg for reg in range(NUM_REGS)]  # reg -> bitmask of all its definitions
+        gen, kill = {}, {}  # block -> bitmask of generated (killed) definitions
+
+        for b in range(len(self.blocks)):
+            last = {}  # reg -> last definition bit in the block
+            for instr in self.blocks[b].instructions:
+                for reg in self.__reg_accesses(instr)[1]:
+                    last[reg] = len(def_ids)
+                    reg_def_masks[reg] |= 1 << len(def_ids)
+                    def_ids.append((instr.orig_pos, reg))
+            gen[b] = reg_mask(last.values())
+            kill[b] = list(last)
+
+        order = self.flow_graph.topological_sort()
+        reach_in = {b: 0 for b in order}
+        reach_in[order[0]] = reg_mask(range(NUM_REGS))  # entry definitions
+        for b in order:
+            reach_out = reach_in[b]
+            for reg in kill[b]:
+                reach_out &= ~reg_def_masks[reg]
+            reach_out |= gen[b]
+            for s in self.flow_graph.successors(b):
+                reach_in[s] |= reach_out
+
+        self.use_def, self.def_use = {}, {}
+        for b in range(len(self.blocks)):  # program order, uses are appended sorted
+            reaching = {}  # reg -> [reaching definitions] (lazily decoded from the bitset)
+            for instr in self.blocks[b].instructions:
+                uses, defs = self.__reg_accesses(instr)
+                for reg in uses:
+                    if reg not in reaching:
+                        reaching[reg] = [def_ids[d][0] for d in mask_regs(reach_in[b] & reg_def_masks[reg])]
+                    self.use_def[(instr.orig_pos, reg)] = reaching[reg]
+                    for d in reaching[reg]:
+                        self.def_use.setdefault((d, reg), []).append(instr.orig_pos)
+                for reg in defs:
+                    reaching[reg] = [instr.orig_pos]
+
+    def __pre_schedule_register_assignment(self):
+        # This method renames the values of the program into virtual registers before the scheduling, so that the DDG
+        # only holds their true dependencies: the values bound by the ABI keep their register, the others get a fresh
+        # one (from NUM_REGS). They are coalesced back into the registers of the machine after the scheduling, see
+        # __allocate_registers
+
+        self.__compute_webs()
+        self.virtual_regs = {}
+        fresh = NUM_REGS
+        for web in self.webs.roots():
+            if web in self.fixed_webs:
+                self.virtual_regs[web] = web[1]
+            else:
+                self.virtual_regs[web] = fresh
+                fresh += 1
+        self.virtual_registers = self.register_allocation
+
+    def __compute_webs(self):
+        # This method merges the definitions reaching a common use into webs, the values assigned to registers.
+        # Two-address instructions (dst both input and output) tie their input and output values. The values read or
+        # written by helper calls and exits, defined at the program entry or held by the stack register are bound to
+        # their register by the ABI (fixed)
+
+        self.webs = Webs()
+        fixed = [(-1, reg) for reg in range(NUM_REGS)]
+        for reg in range(NUM_REGS):
+            self.webs.add((-1, reg))
+        for blck in self.blocks:
+            for instr in blck.instructions:
+                uses, defs = self.__reg_accesses(instr)
+                abi = is_call(instr.unpkd) or is_exit(instr.unpkd)
+                for reg in defs:
+                    self.webs.add((instr.orig_pos, reg))
+                    if abi or reg == STACK_REG:
+                        fixed.append((instr.orig_pos, reg))
+                for reg in uses:
+                    reaching = self.use_def[(instr.orig_pos, reg)]
+                    for d in reaching:
+                        self.webs.add((d, reg))
+                        self.webs.union((reaching[0], reg), (d, reg))
+                    if abi or reg == STACK_REG:
+                        fixed.append((reaching[0], reg))
+                if instr.output is not None and instr.output.sym_name == instr.unpkd.dst and \
+                        instr.unpkd.dst in get_inputs(instr.unpkd):
+                    self.webs.union(self.__use_web(instr.orig_pos, instr.unpkd.dst),
+                                    (instr.orig_pos, instr.unpkd.dst))
+        self.fixed_webs = set(self.webs.find(d) for d in fixed)
+
+    def __use_web(self, pos, reg):
+        # This method returns the web of the value of reg read by the instruction with global id pos
+
+        return self.webs.find((self.use_def[(pos, reg)][0], reg))
+
+    def __def_web(self, pos, reg):
+        # This method returns the web of the value of reg written by the instruction with global id pos
+
+        return self.webs.find((pos, reg))
+
+    def __allocate_registers(self):
+        # This method assigns the registers of the machine to the values of the scheduled program (graph coloring of
+        # their live ranges in the resource table rows) and rewrites the instructions. Returns False if the values do
+        # not fit the registers
+
+        allocator = RegisterAllocator(len(self.resource_table),
+                                      [reg for reg in range(self.machine.n_regs) if reg != STACK_REG])
+        for web in self.fixed_webs:
+            allocator.fix(web, web[1])
+        for r in range(len(self.resource_table)):
+            falls = True
+            for instr in self.resource_table[r]:
+                if instr is None:
+                    continue
+                uses, defs = self.__reg_accesses(instr)
+                for reg in uses:
+                    allocator.add_use(r, self.__use_web(instr.orig_pos, reg), reg)
+                for reg in defs:
+                    allocator.add_def(r, self.__def_web(instr.orig_pos, reg), reg, self.machine.latency(instr.unpkd))
+                if is_exit(instr.unpkd) or is_goto(instr.unpkd):
+                    falls = False
+                if is_jump(instr.unpkd):
+                    allocator.add_flow(r, self.__entry_row(instr.jmp_block))
+            if falls:
+                allocator.add_flow(r, r + 1)
+
+        regs = allocator.allocate()
+        if regs is None:
+            return False
 
-                blck[IN_OPERANDS] = self.__union_dicts(self.__diff_dicts(blck[OUT_OPERANDS], blck[DEFS]), blck[USES])
+        for row in self.resource_table:
+            for instr in row:
+                if instr is None or is_call(instr.unpkd):
+                    continue
+                for inp in instr.inputs:
+                    inp.sym_name = regs[self.__use_web(instr.orig_pos, inp.sym_name)]
+                instr_b = set_inputs(instr.instr_b, [inp.sym_name for inp in instr.inputs]) \
+                    if instr.inputs and not is_exit(instr.unpkd) else instr.instr_b
+                if instr.output is not None:
+                    reg = regs[self.__def_web(instr.orig_pos, instr.output.sym_name)]
+                    self.renamed_values += reg != instr.output.sym_name
+                    instr.output.sym_name = reg
+                    instr_b = set_output(instr_b, reg)
+                instr.set_instr_b(instr_b)
+
+        # moves between values coalesced in the same register are removed
+        for r in range(len(self.resource_table)):
+            for lane, instr in enumerate(self.resource_table[r]):
+                if instr is not None and is_mov(instr.unpkd) and instr.inputs[0].sym_name == instr.output.sym_name:
+                    self.resource_table.remove(r, lane)
+                    self.schedule[instr.orig_pos][LANE] = None
+                    self.program_bin[instr.orig_pos] = NOP
+                    self.coalesced_moves += 1
+        for blck in self.blocks:
+            blck.index_registers()
+        return True
 
-                successors = list(self.flow_graph.successors(b))
-                if len(successors) > 0:
-                    for s in successors:
-                        succ = self.blocks[s]
-                        blck[OUT_OPERANDS] = self.__union_dicts(succ[IN_OPERANDS], blck[OUT_OPERANDS])
+    def __last_use(self, def_pos, reg):
+        # This method returns the global id of the last instruction using the value of reg defined by def_pos (-1 for
+        # the program entry), None if the value is never used. Helper calls are not counted, the register cache does
+        # not track their ABI operands
 
-                if last_in.keys() != blck[IN_OPERANDS].keys() or last_out.keys() != blck[OUT_OPERANDS].keys():
-                    changed = True
+        uses = [u for u in self.def_use.get((def_pos, reg), []) if u not in self.calls_indexes]
+        return uses[-1] if uses else None
 
     def __compute_next_use_liveness_local(self):
         # This method uses info calculated by __compute_liveness_global for computing data dependencies inside each
@@ -494,87 +713,71 @@ class Optimizer:
         b = 0
         for blck in self.blocks:
             b += 1
-            if blck[TYPE] != BlockType.BASIC:  # only BASIC block contain instructions
+            if blck.type != BlockType.BASIC:  # only BASIC block contain instructions
                 continue
 
-            blck[SYM_TABLE] = {}  # sym_name -> LIVE, NEXT_USE
-            for instr in reversed(blck[INSTRUCTIONS]):
-                if instr[OUTPUT] is not None:
-                    if instr[OUTPUT][SYM_NAME] not in blck[SYM_TABLE]:
-                        if instr[OUTPUT][SYM_NAME] not in blck[OUT_OPERANDS]:
-                            blck[SYM_TABLE][instr[OUTPUT][SYM_NAME]] = {LIVE: False, NEXT_USE: None}
+            blck.sym_table = {}  # sym_name -> Operand(LIVE, NEXT_USE)
+            for instr in reversed(blck.instructions):
+                if instr.output is not None:
+                    if instr.output.sym_name not in blck.sym_table:
+                        if instr.output.sym_name not in blck.out_operands:
+                            blck.sym_table[instr.output.sym_name] = Operand(instr.output.sym_name)
                         else:
-                            blck[SYM_TABLE][instr[OUTPUT][SYM_NAME]] = {LIVE: True, NEXT_USE: blck[OUT_OPERANDS][
-                                instr[OUTPUT][SYM_NAME]]}
-                            instr[OUTPUT][LIVE], instr[OUTPUT][NEXT_USE] = True, blck[OUT_OPERANDS][
-                                instr[OUTPUT][SYM_NAME]]
+                            blck.sym_table[instr.output.sym_name] = Operand(instr.output.sym_name, True,
+                                                                            blck.out_operands[instr.output.sym_name])
+                            instr.output.live, instr.output.next_use = True, blck.out_operands[
+                                instr.output.sym_name]
                     else:
-                        entry = blck[SYM_TABLE][instr[OUTPUT][SYM_NAME]]
-                        instr[OUTPUT][LIVE], instr[OUTPUT][NEXT_USE] = entry[LIVE], entry[NEXT_USE]
-                        entry[LIVE], entry[NEXT_USE] = False, None
-
-                for instr_in in instr[INPUTS]:
-                    if instr_in[SYM_NAME] not in blck[SYM_TABLE]:
-                        blck[SYM_TABLE][instr_in[SYM_NAME]] = {LIVE: True, NEXT_USE: instr[ORIG_POS]}
-                        if instr_in[SYM_NAME] in blck[OUT_OPERANDS]:
-                            instr_in[NEXT_USE], instr_in[LIVE] = blck[OUT_OPERANDS][instr_in[SYM_NAME]], True
+                        entry = blck.sym_table[instr.output.sym_name]
+                        instr.output.live, instr.output.next_use = entry.live, entry.next_use
+                        entry.live, entry.next_use = False, None
+
+                for instr_in in instr.inputs:
+                    if instr_in.sym_name not in blck.sym_table:
+                        blck.sym_table[instr_in.sym_name] = Operand(instr_in.sym_name, True, instr.orig_pos)
+                        if instr_in.sym_name in blck.out_operands:
+                            instr_in.next_use, instr_in.live = blck.out_operands[instr_in.sym_name], True
                     else:
-                        entry = blck[SYM_TABLE][instr_in[SYM_NAME]]
-                        instr_in[LIVE], instr_in[NEXT_USE] = entry[LIVE], entry[NEXT_USE]
-                        entry[LIVE], entry[NEXT_USE] = True, instr[ORIG_POS]
+                        entry = blck.sym_table[instr_in.sym_name]
+                        instr_in.live, instr_in.next_use = entry.live, entry.next_use
+                        entry.live, entry.next_use = True, instr.orig_pos
 
         # remove dependencies for instructions using operands from B0 (START) block, e.g., stack pointer, ctx
-        for out in self.blocks[0][OUT_OPERANDS]:
-            target_instr = self.blocks[0][OUT_OPERANDS][out]
-            target_block = self.schedule[target_instr][BLOCK]
-
-            for instr in self.blocks[target_block][INSTRUCTIONS]:
-                if instr[ORIG_POS] == target_instr:
-                    instr[PENDING_DEPS] -= 1
-
-    @staticmethod
-    def __diff_dicts(a, b):
-        # This method returns a set a - b (elements are copied not referenced), a & b dicts
-
-        a_copy, b_copy = a, b
-        return {k: a_copy[k] for k in set(set(a_copy.keys()) - set(b_copy.keys()))}
-
-    @staticmethod
-    def __light_copy(a):
-        # This method returns a copy of a, a dict
-
-        res = {}
-        for k in a.keys():
-            res[k] = a[k]
-
-        return res
-
-    def __union_dicts(self, dict1, dict2):
-        # This method returns a set a U b (elements are copied not referenced), a & b dicts
-
-        res = self.__light_copy(dict1)
-
-        for elem in dict2:
-            if elem not in res or res[elem] > dict2[elem]:
-                res[elem] = dict2[elem]
-
-        return res
+        for out in self.blocks[0].out_operands:
+            target_instr = self.blocks[0].out_operands[out]
+            target_block, target_local = self.pos_index[target_instr]
+            self.blocks[target_block].instructions[target_local].pending_deps -= 1
 
     def __local_optimizations(self):
-        # This method applies to each block mov-alu and movi-exit compression
+        # This method applies to each block mov-alu and movi-exit compression. Returns True if the program has been
+        # modified
 
+        compressed = self.mov_alu_compressed + self.movi_exit_compressed
         for blck in self.blocks:
             self.compress_mov_alu(blck)
 
         for b in list(self.flow_graph.predecessors(len(self.flow_graph) - 1)):
             self.compress_movi_exit(self.blocks[b])
+        return self.mov_alu_compressed + self.movi_exit_compressed > compressed
+
+    def __eliminate_dead_code(self):
+        # This method removes the dead instructions and stack stores (see DeadCode). Out of the stack, the loads are
+        # kept with remove_mem_boundary_checks: the checks removed rely on their faults. Returns True if the program
+        # has been modified
+
+        analysis = DeadCode(self.blocks, self.flow_graph, keep_loads=self.remove_mem_boundary_checks)
+        for pos in analysis.analyze():
+            self.program_bin[pos] = NOP
+        self.dead_removed += len(analysis.dead)
+        self.dead_stores_removed += len(analysis.dead_stores)
+        return len(analysis.dead) > 0
 
     @staticmethod
     def is_in_inputs(inputs, output):
         # This method returns True if the output operand is in the input operands set
 
         for inp in inputs:
-            if output == inp[SYM_NAME]:
+            if output == inp.sym_name:
                 return True
         return False
 
@@ -583,24 +786,21 @@ class Optimizer:
         # the mov-alu LLVM expansion of 3 operands ALU instructions, since are not supported by x86
         # (but they are in Sephirot)
 
-        for curr in range(1, len(blck[INSTRUCTIONS])):
-            curri = blck[INSTRUCTIONS][curr]
-            previ = blck[INSTRUCTIONS][curr - 1]
+        for curr in range(1, len(blck.instructions)):
+            curri = blck.instructions[curr]
+            previ = blck.instructions[curr - 1]
 
-            if is_alu(unpack_instruction(curri[INSTR_B])) and is_mov(unpack_instruction(previ[INSTR_B])) \
-                    and (previ[OUTPUT][SYM_NAME] == curri[OUTPUT][SYM_NAME]) \
-                    and self.is_in_inputs(curri[INPUTS], curri[OUTPUT][SYM_NAME]) \
-                    and is_optimizable_mov_alu(unpack_instruction(curri[INSTR_B])):
-                self.program_bin[curri[ORIG_POS]] = modify_register(curri[INSTR_B], previ[INPUTS][0][SYM_NAME],
+            if is_alu(curri.unpkd) and is_mov(previ.unpkd) \
+                    and (previ.output.sym_name == curri.output.sym_name) \
+                    and self.is_in_inputs(curri.inputs, curri.output.sym_name) \
+                    and is_optimizable_mov_alu(curri.unpkd):
+                self.program_bin[curri.orig_pos] = modify_register(curri.instr_b, previ.inputs[0].sym_name,
                                                                     SRC_SHIFT_MOD)
-                self.program_bin[curri[ORIG_POS]] = set_opcode(self.program_bin[curri[ORIG_POS]],
+                self.program_bin[curri.orig_pos] = set_opcode(self.program_bin[curri.orig_pos],
                                                                get_correspondent(
                                                                    unpack_instruction(
-                                                                       self.program_bin[curri[ORIG_POS]])["opcode"]))
-                self.program_str[curri[ORIG_POS]] = self.generate_mov_alu_str(blck[INSTRUCTIONS][curr][INSTR_S],
-                                                                              previ[INPUTS][0][SYM_NAME])
-                self.program_bin[curri[ORIG_POS] - 1] = NOP
-                self.program_str[curri[ORIG_POS] - 1] = "NOP"
+                                                                       self.program_bin[curri.orig_pos]).opcode))
+                self.program_bin[curri.orig_pos - 1] = NOP
 
                 self.mov_alu_compressed += 1  # update statistic of removed instructions
 
@@ -608,48 +808,167 @@ class Optimizer:
         # This method compresses sequences of movi-exit in a single instruction. This optimization leverages the
         # early exit instruction supported by Sephirot
 
-        for curr in range(1, len(blck[INSTRUCTIONS])):
-            curri = blck[INSTRUCTIONS][curr]
-            previ = blck[INSTRUCTIONS][curr - 1]
-            if is_exit(unpack_instruction(curri[INSTR_B])) and is_mov_imm(unpack_instruction(previ[INSTR_B])):
-                self.program_bin[curri[ORIG_POS] - 1] = modify_register(previ[INSTR_B], 0, SRC_SHIFT_MOD)
-                self.program_bin[curri[ORIG_POS] - 1] = set_opcode(self.program_bin[curri[ORIG_POS] - 1], MOV_EXIT)
-                self.program_str[curri[ORIG_POS] - 1] = "exit " + str(unpack_instruction(previ[INSTR_B])["immediate"])
+        for curr in range(1, len(blck.instructions)):
+            curri = blck.instructions[curr]
+            previ = blck.instructions[curr - 1]
+            if curri.unpkd.opcode == EXIT_OPCODE and is_mov_imm(previ.unpkd) and previ.output.sym_name == RETURN_REG:
+                self.program_bin[curri.orig_pos - 1] = modify_register(previ.instr_b, 0, SRC_SHIFT_MOD)
+                self.program_bin[curri.orig_pos - 1] = set_opcode(self.program_bin[curri.orig_pos - 1], MOV_EXIT)
 
-                self.program_bin[curri[ORIG_POS]] = NOP
-                self.program_str[curri[ORIG_POS]] = "NOP"
+                self.program_bin[curri.orig_pos] = NOP
 
                 self.movi_exit_compressed += 1  # update statistic of removed instructions
 
-    @staticmethod
-    def generate_mov_alu_str(string, inp):
-        # Generate mov-alu instruction string representation, starting from original ALU instruction string
-
-        outreg = re.search("(r)[0-9]+", string).regs[0]
-        opcode = re.search("([+^|&-]|[<>]{2})", string).regs[0]
-        immediate = re.search("[^r][0-9]+", string).regs[0]
-
-        imm = string[immediate[0]:immediate[1]]
-        if imm[0] == "-":
-            imm = "(" + imm + ")"
+    def __if_conversion(self):
+        # This method converts to straight line code the triangles (if c goto J; F; J) and the diamonds
+        # (if c goto T; F; goto J; T; J) whose conditional code (ALU only) leaves every register unchanged on the other
+        # path (e.g., the carry fold r3 = r2 >> 16, if r3 == 0 goto J, r2 &= 65535, r2 += r3): the code is executed on
+        # both paths and its branches removed (Sephirot has no predication or conditional moves to select a result).
+        # Returns True if the program has been modified
+
+        converted = 0
+        for p in range(1, len(self.blocks) - 1):
+            blck = self.blocks[p]
+            if blck.type != BlockType.BASIC or not is_if_branch(blck.instructions[-1].unpkd) or blck.fnext is None:
+                continue
+            f, t = blck.fnext, blck.tnext[0]
+            if not self.__is_convertible_side(f, p):
+                continue
 
-        return string[outreg[0]:outreg[1]] + " = r" + str(inp) + " " + string[opcode[0]:opcode[1]] + " " + imm
+            side = self.blocks[f].instructions
+            if self.blocks[f].fnext == t or self.blocks[f].tnext == [t]:  # triangle (F may end with goto J)
+                removed = [blck.instructions[-1].orig_pos]
+                consts, bounds = self.__branch_facts(blck, True)
+                if not all(self.__is_identity(instr.unpkd, consts, bounds) for instr in side):
+                    continue
+            else:  # diamond
+                # F falls into T once its goto is removed, T falls into J
+                if not is_goto(side[-1].unpkd) or t != f + 1 or not self.__is_convertible_side(t, p) or \
+                        is_branch(self.blocks[t].instructions[-1].unpkd) or \
+                        self.blocks[f].tnext != [self.blocks[t].fnext]:
+                    continue
+                removed = [blck.instructions[-1].orig_pos, side[-1].orig_pos]
+                consts, bounds = self.__branch_facts(blck, True)
+                if not all(self.__is_identity(instr.unpkd, consts, bounds) for instr in side[:-1]):
+                    continue
+                # T runs after F on the not taken path: the facts on the registers defined by F are lost
+                consts, bounds = self.__branch_facts(blck, False)
+                for instr in side[:-1]:
+                    if instr.output is not None:
+                        consts.pop(instr.output.sym_name, None)
+                        bounds.pop(instr.output.sym_name, None)
+                if not all(self.__is_identity(instr.unpkd, consts, bounds) for instr in self.blocks[t].instructions):
+                    continue
 
-    @staticmethod
-    def modify_reg_str(instr_str, old_reg, new_reg, only_in=False, only_out=False):
-        # Modify register(s) in a instruction string. Can replace only input, only output or both
+            for pos in removed:
+                self.program_bin[pos] = NOP
+            converted += 1
 
-        splitted = instr_str.split("= ")
+        self.if_converted += converted
+        return converted > 0
 
-        if only_in:
-            if "if" in instr_str:
-                return instr_str.replace("r" + str(old_reg), "r" + str(new_reg))
-            return splitted[0] + "= " + splitted[1].replace("r" + str(old_reg), "r" + str(new_reg))
+    def __is_convertible_side(self, b, p):
+        # This method returns True if the block b can be executed on both paths of the if branch ending p: p is its
+        # only predecessor and it has no side effects (no memory accesses, helper calls or exits)
 
-        elif only_out:
-            return splitted[0].replace("r" + str(old_reg), "r" + str(new_reg)) + "= " + splitted[1]
+        blck = self.blocks[b]
+        if blck.type != BlockType.BASIC or list(self.flow_graph.predecessors(b)) != [p]:
+            return False
+        for instr in blck.instructions:
+            if is_nop(instr.unpkd) or is_goto(instr.unpkd) and instr is blck.instructions[-1]:
+                continue
+            if is_branch(instr.unpkd) or get_mem_access(instr.unpkd) is not None or \
+                    instr.unpkd.opcode & CLASS_MASK not in (CLASS_ALU, CLASS_ALU64):
+                return False
+        return True
+
+    def __branch_facts(self, blck, taken):
+        # This method returns the register values (consts) and exclusive unsigned upper bounds (bounds) known when the
+        # if branch ending blck is taken (not taken): constants moved in the block, the relation tested by the branch
+        # and, for rt == 0 with rt = rs >> k, rs < 2^k
+
+        consts, copies, shifts = {}, {}, {}  # reg -> value, reg -> copied reg, reg -> (shifted reg, k)
+        for instr in blck.instructions[:-1]:
+            unpkd = instr.unpkd
+            if instr.output is None:
+                continue
+            dst = instr.output.sym_name
+            value, copy, shift = None, None, None
+            if unpkd.opcode == MOV_IMM:
+                value = twos_comp(unpkd.immediate, 32) & U64_MASK
+            elif unpkd.opcode == MOV and unpkd.src != dst:
+                value, copy = consts.get(unpkd.src), unpkd.src
+            elif unpkd.opcode == STR_TO_ALU_OP[">>="] | CLASS_ALU64 and copies.get(dst) is not None:
+                shift = (copies[dst], unpkd.immediate & 63)
+            # the facts on the previous value of dst are lost
+            for facts in (consts, copies, shifts):
+                facts.pop(dst, None)
+            copies = {reg: src for reg, src in copies.items() if src != dst}
+            shifts = {reg: sh for reg, sh in shifts.items() if sh[0] != dst}
+            for facts, fact in ((consts, value), (copies, copy), (shifts, shift)):
+                if fact is not None:
+                    facts[dst] = fact
+
+        bounds = {}
+        unpkd = blck.instructions[-1].unpkd
+        relation = JMP_OP_TO_STR.get(unpkd.opcode & OP_MASK) if unpkd.opcode & CLASS_MASK == CLASS_JMP else None
+        if not taken:
+            relation = NEGATED_RELATION.get(relation)
+        if relation not in NEGATED_RELATION:  # signed or bit test
+            return consts, bounds
+
+        reg = unpkd.dst
+        value = consts.get(unpkd.src) if unpkd.opcode & SOURCE_REG else twos_comp(unpkd.immediate, 32) & U64_MASK
+        if value is None and unpkd.opcode & SOURCE_REG and reg in consts:  # constant on the left: swap operands
+            reg, value, relation = unpkd.src, consts[reg], SWAPPED_RELATION[relation]
+        if value is None:
+            return consts, bounds
+
+        if relation == "==":
+            consts[reg] = value
+            if value == 0 and reg in shifts:
+                src, k = shifts[reg]
+                bounds[src] = min(bounds.get(src, 1 << 64), 1 << k)
+        elif relation == "<":
+            bounds[reg] = value
+        elif relation == "<=":
+            bounds[reg] = value + 1
+        return consts, bounds
 
-        return instr_str.replace("r" + str(old_reg), "r" + str(new_reg))
+    @staticmethod
+    def __is_identity(unpkd, consts, bounds):
+        # This method returns True if the ALU instruction leaves its destination register unchanged, given the known
+        # register values (consts) and exclusive unsigned upper bounds (bounds)
+
+        if is_nop(unpkd) or is_goto(unpkd):
+            return True
+        op_class = unpkd.opcode & CLASS_MASK
+        op = ALU_OP_TO_STR.get(unpkd.opcode & OP_MASK)
+        if op_class not in (CLASS_ALU, CLASS_ALU64) or op is None or unpkd.opcode in MOV_ALU:
+            return False
+
+        dst = unpkd.dst
+        value = consts.get(unpkd.src) if unpkd.opcode & SOURCE_REG else twos_comp(unpkd.immediate, 32) & U64_MASK
+        bound = consts[dst] + 1 if dst in consts else bounds.get(dst)
+        if op_class == CLASS_ALU:  # 32 bit operations zero the upper half
+            if bound is None or bound > 1 << 32:
+                return False
+            if value is not None:
+                value &= 0xffffffff
+
+        if op == "=":
+            if unpkd.opcode & SOURCE_REG and unpkd.src == dst:
+                return True
+            return value is not None and consts.get(dst) == value
+        if value is None:
+            return False
+        if op in ZERO_IDENTITY_OPS:
+            return value == 0
+        if op in ONE_IDENTITY_OPS:
+            return value == 1
+        if op == "&=":  # the mask keeps all the bits which can be set
+            return bound is not None and bound > 0 and ((1 << (bound - 1).bit_length()) - 1) & ~value == 0
+        return False
 
     def __local_schedule(self, b, last_t, last_i):
         # This function list schedule the instructions inside a single block, considering input dependencies
@@ -663,540 +982,747 @@ class Optimizer:
 
         # DEBUG: draw block DDG
         if self.debug_draw_ddg:
-            p = nx.drawing.nx_pydot.to_pydot(data_dep_g)
-            p.write_png(self.filename + '_B' + str(b) + '.png' if self.filename is not None else 'B' + str(b) + '.png')
-
-        # finding local scheduling
-        nodes = []
-        branch = None
-
-        # toposort dependency graph
-        for n in list(filter(lambda x: x >= 0, nx.lexicographical_topological_sort(data_dep_g))):
-            if n < len(blck[INSTRUCTIONS]) and blck[INSTRUCTIONS][n] is not None and not is_nop(
-                    unpack_instruction(blck[INSTRUCTIONS][n][INSTR_B])):
-                if is_branch(unpack_instruction(blck[INSTRUCTIONS][n][INSTR_B])):
-                    branch = n
-                else:
-                    nodes.append(n)
-        if branch is not None:
-            nodes.append(branch)
+            data_dep_g.draw(self.filename + '_B' + str(b) + '.png' if self.filename is not None else 'B' + str(b) + '.png',
+                            labels=lambda i: disassemble(blck.instructions[i].instr_b)
+                            if 0 <= i < len(blck.instructions) else None,
+                            edge_labels=lambda kind: "|".join(k.name for k in DepKind if kind & k))
+
+        # finding local scheduling: list scheduling, an instruction is ready when all its DDG predecessors are placed
+        n_instr = len(blck.instructions)
+        priorities = self.__schedule_priorities(data_dep_g, [self.machine.latency(instr.unpkd) if instr is not None
+                                                             else 1 for instr in blck.instructions])
+        pending = {n: sum(1 for p in data_dep_g.predecessors(n) if p >= 0) for n in range(n_instr)}
+        ready = [n for n in range(n_instr) if pending[n] == 0]
 
-        # schedule the instructions following the prioritized topological ordering of the instructions
         max_row, max_inst = last_t, last_i
-        for n in nodes:
-            # 1. find first row solving input dependencies
-            lane, row = self.find_avail_row_lane_input_deps(b, data_dep_g, last_t, max_row, n)
+        n_hoisted = 0
+        while ready:
+            n = self.__next_ready(b, data_dep_g, ready, priorities, last_t, max_row)
+            ready.remove(n)
+            for s in data_dep_g.successors(n):
+                if s < n_instr:
+                    pending[s] -= 1
+                    if pending[s] == 0:
+                        ready.append(s)
+            if blck.instructions[n] is None or is_nop(blck.instructions[n].unpkd):
+                continue
 
-            # 2. find first row solving output interference (if has output)
-            inst = blck[INSTRUCTIONS][n]
-            if inst[OUTPUT] is not None and inst[OUTPUT][NEXT_USE]:
-                orig_lu = self.__find_liveness(inst[OUTPUT][NEXT_USE], inst[OUTPUT][SYM_NAME])
-                row_lu = self.schedule[orig_lu][TIME] if self.schedule[orig_lu][LANE] is not None else None
+            # 1. find first row solving input dependencies (in the rows of the superblock, if it can be hoisted)
+            hoisted = self.__find_hoisting_row_lane(b, data_dep_g, last_t, n)
+            if hoisted is not None:
+                lane, row = hoisted
+                n_hoisted += 1
+                self.in_flight.pop(b, None)  # written in the rows of the previous blocks
+            else:
+                lane, row = self.find_avail_row_lane_input_deps(b, data_dep_g, last_t, max_row, n)
 
-                conflicting = self.reg_cache.get_conflicting(inst[OUTPUT][SYM_NAME], row)
-
-                if conflicting is not None and conflicting[REG] == inst[OUTPUT][SYM_NAME] and \
-                        inst[ORIG_POS] != conflicting[ORG_LIVE] and \
-                        conflicting[REG] != self.bound_check_cache["pkt_act_reg"]:
-
-                    # excludes subseuquent updates on global registers (used by many blocks)
-                    if not self.__conf_starts_before_blck(blck, conflicting) and \
-                            not self.__conf_ends_after_blck(blck, conflicting):
-                        # try to rename output register
-                        old_reg = inst[OUTPUT][SYM_NAME]
-                        unav = set(self.reg_cache.get_unavailable(row))
-                        try:
-                            deps = [n]
-                            deps.extend(list(filter(lambda x: x != len(blck[INSTRUCTIONS]) - 1,
-                                        list(list(data_dep_g.successors(n))))))
-                            self.__rename_registers(deps, blck, unav)
-                            self.reg_cache.ch_reg_name(old_reg, inst[OUTPUT][SYM_NAME], inst[ORIG_POS], row)
-                        except:
-                            # no register available, delaying instruction
-                            print(inst[INSTR_S])
-                            assert conflicting[ROW_LIVE] is not None, "Unexpected out of block conflict, this may be " \
-                                                                      "a bug "
-                            lane, row = self.find_avail_row_lane_input_deps(b, data_dep_g,
-                                                                            conflicting[ROW_LIVE], max_row, n)
-                # update used register cache (wr update)
-                self.reg_cache.put_reg_wr(inst[OUTPUT][SYM_NAME], inst[ORIG_POS], orig_lu, row, row_lu)
+            # 2. update used register cache (wr update), output conflicts are solved by the register allocation
+            inst = blck.instructions[n]
+            orig_lu = self.__last_use(inst.orig_pos, inst.output.sym_name) if inst.output is not None else None
+            if orig_lu is not None:
+                row_lu = self.schedule[orig_lu][TIME] if self.schedule[orig_lu][LANE] is not None else None
+                self.reg_cache.put_reg_wr(inst.output.sym_name, inst.orig_pos, orig_lu, row, row_lu)
 
             # update used register cache (rd update)
-            inst_impts = [inp[SYM_NAME] for inp in inst[INPUTS]]
-            self.reg_cache.put_reg_rd(inst_impts, row, inst[ORIG_POS])
+            inst_impts = [inp.sym_name for inp in inst.inputs]
+            self.reg_cache.put_reg_rd(inst_impts, row, inst.orig_pos)
 
             # actual scheduling
-            self.schedule[blck[INSTRUCTIONS][n][ORIG_POS]][TIME] = row
-            self.schedule[blck[INSTRUCTIONS][n][ORIG_POS]][LANE] = lane
-            self.resource_table[row][lane] = blck[INSTRUCTIONS][n]
+            self.schedule[blck.instructions[n].orig_pos][TIME] = row
+            self.schedule[blck.instructions[n].orig_pos][LANE] = lane
+            self.resource_table.place(row, lane, blck.instructions[n])
 
-            max_inst = max(max_inst, blck[INSTRUCTIONS][n][ORIG_POS])
+            max_inst = max(max_inst, blck.instructions[n].orig_pos)
             max_row = max(max_row, row)
 
+        self.hoisted += n_hoisted
+        if max_row == last_t and n_hoisted > 0:  # the whole block was hoisted
+            return last_t, max_inst, data_dep_g
         return max_row if max_row > last_t else max_row + 1, max_inst, data_dep_g
 
+    def __find_hoisting_row_lane(self, b, data_dep_g, last_t, n):
+        # This method finds the first (row, lane) in the rows of the previous blocks of the superblock (self.trace,
+        # up to the row self.trace_end) where the instruction with local id n can be hoisted, None if not possible.
+        # Only ALU instructions are hoisted (no memory accesses, no side effects), above the branches whose side exits
+        # do not use their output (no compensation code is required), written before their jumps. In-block predecessors
+        # must be already hoisted
+
+        blck = self.blocks[b]
+        instr = blck.instructions[n]
+        if not self.trace or instr.output is None or is_branch(instr.unpkd) or \
+                get_mem_access(instr.unpkd) is not None:
+            return None
+        out = instr.output.sym_name
+        inputs = [inp.sym_name for inp in instr.inputs]
+        latency = self.machine.latency(instr.unpkd)
+        first = self.trace[0][0]  # the rows of the superblock follow its first row without jumps
+
+        # first row: the output must be dead on all the side exits crossed
+        lo, exits = None, 0
+        for t, first_row, exit_mask in reversed(self.trace):
+            exits |= exit_mask
+            if exits >> out & 1:
+                break
+            lo = first_row
+        if lo is None:
+            return None
+
+        # rows constraints from the predecessors: RAW when their output can be read, WAW after them, WAR not before
+        fwd = set()  # (row, lane) of the values read, forwarded on the same lane in the first row they can be read
+        for p in data_dep_g.predecessors(n):
+            kind = data_dep_g.kind(p, n)
+            if p >= 0:
+                pos = blck.instructions[p].orig_pos
+                if self.schedule[pos][TIME] > last_t:  # not hoisted
+                    return None
+                lo = max(lo, self.schedule[pos][TIME])
+                if kind & DepKind.RAW:
+                    lo = max(lo, self.__ready_row(pos, first))
+                    fwd.add((self.__ready_row(pos, first), self.schedule[pos][LANE]))
+                if kind & DepKind.WAW:
+                    lo = max(lo, self.schedule[pos][TIME] + 1, self.__ready_row(pos, first) - latency + 1)
+        for reg in inputs:
+            for d in self.use_def.get((instr.orig_pos, reg), []):
+                if d >= 0 and self.schedule[d][LANE] is not None:
+                    lo = max(lo, self.__ready_row(d, first))
+                    fwd.add((self.__ready_row(d, first), self.schedule[d][LANE]))
+        for ready in self.__in_flight_writes(first, instr):
+            lo = max(lo, self.block_entry[first] + ready - latency + 1)
+        if not self.machine.lane_forward_constraint:
+            fwd = set()
+
+        # the inputs must not be redefined, the output neither read nor redefined after the hoisting row (nor written
+        # after it by the previous definitions)
+        for r in range(self.trace[0][1], self.trace_end + 1):
+            for other in self.resource_table[r]:
+                if other is None:
+                    continue
+                if other.output is not None and (other.output.sym_name in inputs or other.output.sym_name == out):
+                    lo = max(lo, r + 1)
+                if other.output is not None and other.output.sym_name == out:
+                    lo = max(lo, r + self.machine.latency(other.unpkd) - latency + 1)
+                if other.uses(out):
+                    lo = max(lo, r)
+
+        ends = [first_row - 1 for t, first_row, exit_mask in self.trace[1:]] + [self.trace_end]  # last rows
+        for row in range(lo, self.trace_end + 1):
+            if self.reg_cache.get_conflicting(out, row) is not None:
+                continue
+            if row + latency - 1 > min(end for end in ends if end >= row):  # still being written at the jump
+                continue
+            lanes = set(lane for (t, lane) in fwd if t == row)
+            if len(lanes) > 1:
+                continue
+            lane = lanes.pop() if lanes else self.resource_table.free_lane(row)
+            if lane is not None and self.resource_table.is_free(row, lane):
+                return lane, row
+        return None
+
+    def __block_count(self, b):
+        # This method returns the # of executions of the block b in the profile
+
+        return self.profile.count(self.blocks[b].start)
+
+    def __continues_trace(self, prev, b):
+        # This method returns True if block b extends the superblock ending with prev: b is the likely fall through
+        # of prev and prev is its only predecessor. Likely: taken at least as often as the jump in the profile, if prev
+        # was executed, otherwise not an exit path (if the jump target is not)
+
+        if prev is None or list(self.flow_graph.predecessors(b)) != [prev]:
+            return False
+        prev_blck, blck = self.blocks[prev], self.blocks[b]
+        if prev_blck.fnext != b or b in prev_blck.tnext or is_call(prev_blck.instructions[-1].unpkd):
+            return False
+        if self.profile is not None and self.__block_count(prev) > 0:
+            taken, not_taken = self.profile.branch(prev_blck.instructions[-1].orig_pos)
+            return not_taken > 0 and not_taken >= taken
+        if is_exit(blck.instructions[-1].unpkd):
+            return all(is_exit(self.blocks[t].instructions[-1].unpkd) for t in prev_blck.tnext
+                       if self.blocks[t].type == BlockType.BASIC)
+        return True
+
+    def __hot_jump_predecessor(self, b):
+        # This method returns the only predecessor of block b if b is the target of its conditional jump and the jump
+        # is taken more often than not in the profile (b extends its superblock), None otherwise
+
+        preds = list(self.flow_graph.predecessors(b))
+        if self.profile is None or len(preds) != 1 or self.blocks[preds[0]].type != BlockType.BASIC:
+            return None
+        p = preds[0]
+        p_blck = self.blocks[p]
+        if b not in p_blck.tnext or p_blck.fnext is None or p_blck.fnext == b or \
+                not is_if_branch(p_blck.instructions[-1].unpkd) or p not in self.traces:
+            return None
+        taken, not_taken = self.profile.branch(p_blck.instructions[-1].orig_pos)
+        return p if taken > not_taken else None
+
+    @staticmethod
+    def __schedule_priorities(data_dep_g, latencies):
+        # This method ranks the instructions of a block DDG for list scheduling (smallest first): critical path height
+        # (# of rows from the instruction to the block exit through RAW/MEM edges, latencies: local id -> latency),
+        # # of successors and register pressure (# of values whose last use is the instruction, which frees their
+        # registers)
+
+        n_instr = len(latencies)
+        height = {n_instr: 0}
+        for n in reversed(range(-1, n_instr)):  # DDG edges go forward, the reverse id order is a topological order
+            height[n] = (latencies[n] if n >= 0 else 1) + \
+                max([height[s] for s in data_dep_g.successors(n, DepKind.RAW | DepKind.MEM)], default=0)
+
+        last_use = {}  # instruction -> last RAW successor (inside the block) using its value
+        for n in range(n_instr):
+            uses = [s for s in data_dep_g.successors(n, DepKind.RAW) if s < n_instr]
+            if uses:
+                last_use[n] = max(uses)
+
+        priorities = {n_instr: (0, 0, 0)}
+        for n in range(-1, n_instr):
+            frees = sum(1 for p in data_dep_g.predecessors(n, DepKind.RAW) if last_use.get(p) == n)
+            priorities[n] = (-height[n], -len(data_dep_g.successors(n)), -frees)
+        return priorities
+
+    def __next_ready(self, b, data_dep_g, ready, priorities, last_t, max_row):
+        # This method picks among the ready instructions the one with the highest critical path, then the one which can
+        # be placed in the earliest row, then by priority. NOPs are picked first (nothing to place), the branch only
+        # when it is the last one left
+
+        instructions = self.blocks[b].instructions
+        cands = []
+        for n in ready:
+            if instructions[n] is None or is_nop(instructions[n].unpkd):
+                return n
+            if not is_branch(instructions[n].unpkd) or len(ready) == 1:
+                cands.append(n)
+        return min(cands, key=lambda n: (priorities[n][0],
+                                         self.find_avail_row_lane_input_deps(b, data_dep_g, last_t, max_row, n)[1],
+                                         priorities[n][1:]))
+
     def find_avail_row_lane_input_deps(self, b, data_dep_g, last_t, max_row, n):
         # This method find an available (row, lane) for the instruction with local id n, satisfying its input
         # dependencies on the Sephirot architecture
 
-        pred = -1
+        pred = None
         row = last_t
         blck = self.blocks[b]
 
-        # find instruction predecessor p and where it was scheduled (row, lane)
-        for p in data_dep_g.predecessors(n):
+        # find instruction predecessor p and the last row before its output can be read (its row, if latency is 1)
+        for p in data_dep_g.predecessors(n, DepKind.RAW):
             # predecessor scheduled in previuous blocks
             if p == -1:
-                pred = self.__find_definition(blck[INSTRUCTIONS][n][INPUTS], b)
-                row = last_t
+                pred = self.__reaching_definition(blck.instructions[n], b)
+                row = last_t if pred is None else max(last_t, self.__ready_row(pred, b) - 1)
+                continue
+            t = self.__ready_row(blck.instructions[p].orig_pos, b) - 1
+            # predecessor hoisted in the rows of the trace (superblock scheduling)
+            if t <= last_t:
+                if t == last_t and row == last_t:
+                    orig = blck.instructions[p].orig_pos
+                    if self.machine.lane_forward_constraint and pred is not None and \
+                            self.__ready_row(pred, b) - 1 == last_t and \
+                            self.schedule[pred][LANE] != self.schedule[orig][LANE]:
+                        row = last_t + 1  # values forwarded from different lanes: not back to back
+                    pred = orig
             # predecessor scheduled later in this block
-            elif self.schedule[blck[INSTRUCTIONS][p][ORIG_POS]][TIME] >= row:
-                row = self.schedule[blck[INSTRUCTIONS][p][ORIG_POS]][TIME] \
-                      + (1 if self.schedule[blck[INSTRUCTIONS][p][ORIG_POS]][TIME] == row else 0)
-                pred = blck[INSTRUCTIONS][p][ORIG_POS]
+            elif t >= row:
+                row = t + (1 if t == row else 0)
+                pred = blck.instructions[p].orig_pos
+
+        # memory ordering: after the loads/stores it depends on (no lane constraint, values are not forwarded)
+        for p in data_dep_g.predecessors(n, DepKind.MEM):
+            row = max(row, self.schedule[blck.instructions[p].orig_pos][TIME])
+
+        # output dependencies: not before the readers of the old value (WAR), after its previous definition (WAW)
+        for p in data_dep_g.predecessors(n, DepKind.WAR | DepKind.WAW):
+            if p >= 0:
+                t = self.schedule[blck.instructions[p].orig_pos][TIME]
+                if data_dep_g.kind(p, n) & DepKind.WAW:
+                    t = max(t, self.__ready_row(blck.instructions[p].orig_pos, b) -
+                            self.machine.latency(blck.instructions[n].unpkd))
+                    row = max(row, t)
+                else:
+                    row = max(row, t - 1)
+
+        # the outputs of the previous blocks still being written at the entry of the block are written before (WAW)
+        for ready in self.__in_flight_writes(b, blck.instructions[n]):
+            row = max(row, self.block_entry[b] + ready - self.machine.latency(blck.instructions[n].unpkd))
 
         # if the instruction is a branch must be on the last row of the block
-        if is_branch(unpack_instruction(blck[INSTRUCTIONS][n][INSTR_B])):
+        if is_branch(blck.instructions[n].unpkd):
             row = max(row, max_row - 1)
 
         row += 1  # delay = 1 clock cycle (at least 1 clock cycle from its predecessor)
 
         # find first clock cycle available (non full row)
-        while sum(x is not None for x in self.resource_table[row]) == NUM_LANES:
-            row += 1
+        row = self.resource_table.first_free_row(row)
 
-        # branches can only live on lane 0 (if BRANCH_ALL_LANES is disabled)
-        if not BRANCH_ALL_LANES and is_branch(unpack_instruction(blck[INSTRUCTIONS][n][INSTR_B])):
-            if row > 0 and pred is not None and row == self.schedule[pred][TIME] + 1 \
-                    and self.schedule[pred][BLOCK] <= b and self.schedule[pred][LANE] != 0:
-                row += 1
-            while self.resource_table[row][0] is not None:
+        # branches can only live on the branch lanes of the machine
+        if not self.machine.branch_all_lanes and is_branch(blck.instructions[n].unpkd):
+            fwd_lane = self.__forwarding_lane(b, pred, row)
+            if fwd_lane is not None and fwd_lane not in self.machine.branch_lanes:
                 row += 1
-            lane = 0
+                fwd_lane = None
+            cands = []
+            for lane in self.machine.branch_lanes:
+                r = self.resource_table.first_free_row_on_lane(row, lane)
+                if r == row and fwd_lane is not None and lane != fwd_lane:
+                    r = self.resource_table.first_free_row_on_lane(row + 1, lane)
+                cands.append((r, lane))
+            row, lane = min(cands)
 
         # DATA-HAZARD: back to back depending instructions must be on the same lane!
-        elif row > 0 and pred is not None and row == self.schedule[pred][TIME] + 1 and self.schedule[pred][
-            BLOCK] <= b:
-            lane = self.schedule[pred][LANE]
-            while self.resource_table[row][lane] is not None:  # if enters no more back to back
-                row += 1
-                for lane in range(NUM_LANES):
-                    if self.resource_table[row][lane] is None:
-                        break
+        elif self.__forwarding_lane(b, pred, row) is not None:
+            lane = self.__forwarding_lane(b, pred, row)
+            if not self.resource_table.is_free(row, lane):  # no more back to back
+                row = self.resource_table.first_free_row(row + 1)
+                lane = self.resource_table.free_lane(row)
 
         else:  # first available (no hw constraint applicable)
-            lane = 0
-            found = False
-            while self.resource_table[row][lane] is not None:
-                for lane in range(NUM_LANES):
-                    if self.resource_table[row][lane] is None:
-                        found = True
-                        break
-                if not found:
-                    row += 1
+            lane = self.resource_table.free_lane(row)
         return lane, row
 
+    def __forwarding_lane(self, b, pred, row):
+        # This method returns the lane an instruction of the block b reading the output of the global id pred must be
+        # placed on if scheduled in row (the first row where the output can be read, if the machine forwards values
+        # only on the same lane), None if any lane can be used
+
+        if self.machine.lane_forward_constraint and row > 0 and pred is not None and row == self.__ready_row(pred, b) \
+                and self.schedule[pred][BLOCK] <= b:
+            return self.schedule[pred][LANE]
+        return None
+
+    def __ready_row(self, pos, b=None):
+        # This method returns the first row where the output of the scheduled instruction with global id pos can be
+        # read (its row + its latency on the machine). With b, by the rows reached from the first row of the block b
+        # without jumps: the outputs still being written at the entry of b are counted on the paths reaching it
+
+        row = self.schedule[pos][TIME]
+        if b is not None and row < self.block_entry[b] and pos in self.__in_flight(b):
+            return self.block_entry[b] + self.__in_flight(b)[pos]
+        return row + self.__latency(pos)
+
+    def __in_flight_writes(self, b, instr):
+        # This method returns the rows of the block b (from 0) where the outputs of the previous blocks writing the
+        # output register of instr, still being written at the entry of b, can be read
+
+        if instr.output is None:
+            return []
+        return [ready for pos, ready in self.__in_flight(b).items()
+                if self.blocks[self.pos_index[pos][0]].instructions[self.pos_index[pos][1]].defines(
+                    instr.output.sym_name)]
+
+    def __latency(self, pos):
+        # This method returns the latency of the instruction with global id pos on the machine
+
+        b, local = self.pos_index[pos]
+        return self.machine.latency(self.blocks[b].instructions[local].unpkd)
+
+    def __in_flight(self, b):
+        # This method returns the outputs of the previous blocks still being written when the block b is entered:
+        # global id -> first row of b (from 0) where they can be read, on the slowest path. A taken jump reaches the
+        # first row of its target right after the jump, so each path is counted from the last row of its predecessor
+        # of b, not by the rows of the resource table in between
+
+        if b not in self.in_flight:
+            in_flight = {}
+            for p in self.flow_graph.predecessors(b):
+                if p not in self.block_rows:  # not a scheduled block
+                    continue
+                first, last = self.block_entry[p], self.block_entry[p] + self.block_rows[p] - 1
+                ready = {pos: row - self.block_rows[p] for pos, row in self.__in_flight(p).items()}
+                for row in range(first, last + 1):
+                    for instr in self.resource_table[row]:
+                        if instr is not None and instr.output is not None:
+                            ready[instr.orig_pos] = row + self.__latency(instr.orig_pos) - last - 1
+                for pos, row in ready.items():
+                    if row >= 0:
+                        in_flight[pos] = max(in_flight.get(pos, row), row)
+            self.in_flight[b] = in_flight
+        return self.in_flight[b]
+
     def __compute_local_dependency_graph(self, blck):
-        # This method computes the DDG for the instructions inside the block blck
+        # This method computes the DDG for the instructions inside the block blck in a single forward pass, using
+        # tables with the last definition (and the uses since then) of each register and the last stores (and the
+        # loads since then) of each memory location. Edges are labeled with their DepKind, node -1 is the block
+        # entry (live in registers) and node len(instructions) the block exit (live out registers and branch)
 
-        data_dep_g = nx.DiGraph()
-        edges = []
+        n_instr = len(blck.instructions)
+        data_dep_g = Graph()
 
         data_dep_g.add_node(-1, shape="circle", style="filled", fillcolor="black")
-        for reg in blck[IN_OPERANDS]:
-            for i in range(len(blck[INSTRUCTIONS])):
-                if self.is_in_inputs(blck[INSTRUCTIONS][i][INPUTS], reg):
-                    edges.append((-1, i))
-                if blck[INSTRUCTIONS][i][OUTPUT] is not None and blck[INSTRUCTIONS][i][OUTPUT][SYM_NAME] == reg:
-                    break
-
-        data_dep_g.add_node(len(blck[INSTRUCTIONS]), shape="circle", style="filled", fillcolor="black")
-        for reg in blck[OUT_OPERANDS]:
-            for i in range(len(blck[INSTRUCTIONS]) - 1, -1, -1):
-                if blck[INSTRUCTIONS][i][OUTPUT] is not None and blck[INSTRUCTIONS][i][OUTPUT][SYM_NAME] == reg:
-                    edges.append((i, len(blck[INSTRUCTIONS])))
-                    break
-        if is_branch(unpack_instruction(blck[INSTRUCTIONS][-1][INSTR_B])):
-            edges.append((len(blck[INSTRUCTIONS]) - 1, len(blck[INSTRUCTIONS])))
-
-        for i in range(len(blck[INSTRUCTIONS])):
-            if not is_nop(unpack_instruction(blck[INSTRUCTIONS][i][INSTR_B])):
-                data_dep_g.add_node(i, shape="square", label=blck[INSTRUCTIONS][i][INSTR_S])
-            else:
-                data_dep_g.add_node(i, shape="square", label="NOP")
+        data_dep_g.add_node(n_instr, shape="circle", style="filled", fillcolor="black")
+        for reg in blck.out_operands:
+            last = blck.last_def(reg)
+            if last is not None:
+                data_dep_g.add_edge(last, n_instr, DepKind.RAW)
+        if is_branch(blck.instructions[-1].unpkd):
+            data_dep_g.add_edge(n_instr - 1, n_instr, DepKind.RAW)
+
+        last_def = {}  # reg (virtual) -> last instruction defining it
+        uses_since_def = {}  # reg (virtual) -> instructions using it since its last definition
+        last_def_abi = {}  # reg -> last instruction defining it (ABI order, see below)
+        uses_since_def_abi = {}  # reg -> instructions using it since its last definition
+        mem = MemoryDependencies(STACK_REG, blck.stack_in)
+
+        for j in range(n_instr):
+            instr = blck.instructions[j]
+            data_dep_g.add_node(j, shape="square")  # labeled with the instruction only when drawn
+
+            deps = {}  # predecessor -> DepKind
+            regs_in, regs_out = self.__reg_accesses(instr)  # helper calls: ABI arguments and clobbered registers
+            uses = [self.__virtual_reg(instr.orig_pos, reg, True) for reg in regs_in]
+            outs = [self.__virtual_reg(instr.orig_pos, reg, False) for reg in regs_out]
+            for reg, vreg in zip(regs_in, uses):
+                if vreg in last_def:
+                    deps[last_def[vreg]] = deps.get(last_def[vreg], 0) | DepKind.RAW
+                elif reg in blck.in_operands:
+                    deps[-1] = DepKind.RAW
+            for out in outs:
+                for u in uses_since_def.get(out, []):
+                    if u != j:
+                        deps[u] = deps.get(u, 0) | DepKind.WAR
+                if out in last_def:
+                    deps[last_def[out]] = deps.get(last_def[out], 0) | DepKind.WAW
+            for reg, out in zip(regs_out, outs) if self.abi_order else []:
+                # values bound by the ABI keep their order with the other values of their register
+                for u in uses_since_def_abi.get(reg, []):
+                    if out < NUM_REGS or self.__virtual_reg(blck.instructions[u].orig_pos, reg, True) < NUM_REGS:
+                        deps[u] = deps.get(u, 0) | DepKind.WAR
+                d = last_def_abi.get(reg)
+                if d is not None and (out < NUM_REGS or
+                                      self.__virtual_reg(blck.instructions[d].orig_pos, reg, False) < NUM_REGS):
+                    deps[d] = deps.get(d, 0) | DepKind.WAW
+            for p in mem.access(j, instr.unpkd):
+                deps[p] = deps.get(p, 0) | DepKind.MEM
+
+            for p in sorted(deps):
+                data_dep_g.add_edge(p, j, deps[p])
+
+            for vreg in uses:
+                uses_since_def.setdefault(vreg, []).append(j)
+            for out in outs:
+                last_def[out] = j
+                uses_since_def[out] = []
+            for reg in regs_in:
+                uses_since_def_abi.setdefault(reg, []).append(j)
+            for reg in regs_out:
+                last_def_abi[reg] = j
+                uses_since_def_abi[reg] = []
+            mem.track_pointers(j, instr.unpkd)
 
-            if blck[INSTRUCTIONS][i][OUTPUT] is not None:
-                reg = blck[INSTRUCTIONS][i][OUTPUT][SYM_NAME]
-                for j in range(i + 1, len(blck[INSTRUCTIONS])):
-                    if self.is_in_inputs(blck[INSTRUCTIONS][j][INPUTS], reg):
-                        edges.append((i, j))
-                    if blck[INSTRUCTIONS][j][OUTPUT] is not None and blck[INSTRUCTIONS][j][OUTPUT][SYM_NAME] == reg:
-                        break
+        return data_dep_g
 
-        data_dep_g.add_edges_from(edges)
+    def __virtual_reg(self, pos, reg, use):
+        # This method returns the virtual register of the value of reg read (use) or written by the instruction with
+        # global id pos, reg itself when scheduling on the original registers
 
-        return data_dep_g
+        if not self.virtual_registers:
+            return reg
+        return self.virtual_regs[self.__use_web(pos, reg) if use else self.__def_web(pos, reg)]
 
     def __print_resource_table(self):
         # This method prints the resource table showing the allocated instructions in their string representation
 
         tab = []
         for row in self.resource_table:
-            tab.append([lane[INSTR_S] if lane is not None else "NOP" for lane in row])
+            tab.append([disassemble(lane.instr_b) if lane is not None else "NOP" for lane in row])
         TableIt.printTable(tab)
 
     def __global_schedule(self):
         # This method schedules each block using __local_schedule
 
-        blocks = list(filter(lambda x: self.blocks[x][TYPE] == BlockType.BASIC,
-                             list(nx.lexicographical_topological_sort(self.flow_graph))))
+        blocks = list(filter(lambda x: self.blocks[x].type == BlockType.BASIC,
+                             self.flow_graph.lexicographical_topological_sort()))
 
         last_t = -1  # last used row in resource table
         last_i = -1  # last scheduled instruction (global id)
+        prev = None
+        self.trace = []  # previous blocks of the superblock: (block, first row, live in regs mask of its side exits)
+        self.trace_end = last_t  # last row of the superblock
+        self.traces = {}  # block -> superblock ending with the block, last row of the block
+        self.block_entry = {}  # block -> first row of the block (target of its jumps)
+        self.in_flight = {}  # block -> outputs being written at its entry, see __in_flight
         for b in blocks:
             initial_t = last_t + 1
             blck = self.blocks[b]
-
-            last_t, last_i, ddg = self.__local_schedule(b, last_t, last_i)  # schedule block
-            self.reg_cache.change_block(blck[START] + blck[LEN])
-
-        self.resource_table = self.resource_table[:last_t + 1]
+            self.block_entry[b] = initial_t
+            hot_pred = self.__hot_jump_predecessor(b) if self.superblock_scheduling else None
+            if not self.superblock_scheduling:
+                self.trace = []
+            elif self.__continues_trace(prev, b):
+                self.trace_end = last_t
+            elif hot_pred is not None:  # superblock on the taken side: the fall through is the side exit
+                trace, self.trace_end = self.traces[hot_pred]
+                self.trace = trace[:-1] + [(hot_pred, trace[-1][1], self.blocks[self.blocks[hot_pred].fnext].in_mask)]
+            else:
+                self.trace = []
+
+            # small blocks: the greedy schedule is the upper bound of the branch-and-bound search (cold blocks are not
+            # searched)
+            snapshot = self.__snapshot_block(blck) if self.__is_small_block(blck) and (
+                    self.profile is None or self.profile.packets == 0 or self.__block_count(b) > 0) else None
+
+            hoisted = self.hoisted
+            end_t, end_i, ddg = self.__local_schedule(b, last_t, last_i)  # schedule block
+            if snapshot is not None and self.hoisted == hoisted:  # the search does not hoist in the superblock rows
+                end_t, end_i = self.__optimal_local_schedule(b, ddg, last_t, last_i, end_t, end_i, snapshot)
+            self.block_rows[b] = end_t - last_t
+            last_t, last_i = end_t, end_i
+            self.reg_cache.change_block(blck.start + blck.len)
+
+            side_exits = 0
+            for t in blck.tnext:
+                side_exits |= self.blocks[t].in_mask
+            self.trace = self.trace + [(b, initial_t, side_exits)]
+            self.traces[b] = (self.trace, last_t)
+            prev = b
+
+        self.resource_table.trim(last_t + 1)
 
         if self.debug_print_resource_table:
             self.__print_resource_table()
 
-    def global_to_local(self, blck, index):
-        # This method resolves from global instruction index to local block index
-
-        for i in range(len(blck[INSTRUCTIONS])):
-            if blck[INSTRUCTIONS][i][ORIG_POS] == index:
-                return i
-        print("\033[91mInstruction with index " + str(index) + " not found in block B" + str(self.blocks.index(blck)))
-        exit(-1)
+    def __reset_schedule(self):
+        # This method clears the global schedule, in order to schedule the program again
 
-    def __compute_dominators(self, flow_graph):
-        # This method compute dominators nodes (for each node) of the flow_graph
-
-        dominators = [{b for b in range(len(self.blocks))} for b in range(len(self.blocks))]
-
-        reverse_postorder = list(nx.lexicographical_topological_sort(flow_graph))
-        dominators[reverse_postorder[0]] = {reverse_postorder[0]}
-        changed = True
-        while changed:
-            changed = False
-            for b in reverse_postorder[1:-1]:
-                all_dom_preds = [dominators[p] for p in flow_graph.predecessors(b)]
-                if len(all_dom_preds) == 0:
-                    return set()
-                new_set = set.intersection(*all_dom_preds).union({b})
-
-                if new_set != dominators[b]:
-                    dominators[b] = new_set
-                    changed = True
-
-        return dominators
-
-    def __find_definition(self, inputs, start_block):
-        # This method forward scans starting from start_block, finding the first instruction defining one of the
-        # input operands in inputs. Returns the instruction global id
-
-        for b in range(start_block - 1, 0, -1):
-            for inp in inputs:
-                if inp[SYM_NAME] in self.blocks[b][DEFS] and self.blocks[b][TYPE] == BlockType.BASIC:
-                    for instr in reversed(self.blocks[b][INSTRUCTIONS]):
-                        if instr[OUTPUT] is not None and instr[OUTPUT][SYM_NAME] == inp[SYM_NAME]:
-                            return instr[ORIG_POS]
-        return None
+        for pos in range(len(self.schedule)):
+            self.schedule[pos][TIME], self.schedule[pos][LANE] = pos, None
+        self.resource_table = ResourceTable(self.machine.n_lanes, len(self.program_bin))
+        self.reg_cache = RegisterCache()
+        self.hoisted = 0
+        self.optimal_sched_report = []
+        self.block_rows = {}
 
-    @staticmethod
-    def __call_to_regs(call_id):
-        # This method returns for each helper function call its number of arguments (r1-r5)
+    def __is_small_block(self, blck):
+        # This method returns True if the block is scheduled by branch-and-bound
 
-        CALLS_TO_REG = {1: 4, 5: 0, 6: 5, 8: 0, 23: 2, 25: 3, 28: 4, 44: 2, 51: 3, 54: 2, 65: 2, 69: 4}
+        n = sum(1 for instr in blck.instructions if instr is not None and not is_nop(instr.unpkd))
+        return 1 < n <= self.optimal_sched_max_block
 
-        if call_id not in CALLS_TO_REG:
-            n_args = 5
-        else:
-            n_args = CALLS_TO_REG[call_id]
-        return [i for i in range(1, n_args + 1)]
+    def __snapshot_block(self, blck):
+        # This method saves the register cache, in order to undo the greedy schedule of the block
 
-    def __fix_branch_offsets(self):
-        # This method fixes the offset of branches after the scheduling
-
-        for r in range(len(self.resource_table)):
-            row = self.resource_table[r]
-            if row[0] is not None and is_jump(unpack_instruction(row[0][INSTR_B])):
-                target_b = row[0][JMP_BLOCK]
-
-                leader = self.blocks[target_b][INSTRUCTIONS][0][ORIG_POS]
-                for i in self.blocks[target_b][INSTRUCTIONS]:
-                    if i is not None and i[INSTR_S] != "NOP":
-                        leader = i[ORIG_POS]
-
-                old_offset = unpack_instruction(row[0][INSTR_B])[OFFSET]
-                row[0][INSTR_B] = modify_offset(row[0][INSTR_B], self.schedule[leader][TIME] - r - 1)
-
-                row[0][INSTR_S] = row[0][INSTR_S].replace(str(old_offset), str(self.schedule[leader][TIME] - r - 1))
-
-    def __remove_memory_boundaries_checks(self):
-        # This method accelerates the program removing the instructions performing memory boundary checks
-
-        # searching exit block
-        end_block = list(nx.lexicographical_topological_sort(self.flow_graph))[-1]
-        assert self.blocks[end_block][TYPE] == BlockType.EXIT and len(list(self.flow_graph.predecessors(
-            end_block))) == 1, "Ending block must be a BlockType.EXIT, with one father, seems a bug..."
-
-        exit_block = list(self.flow_graph.predecessors(end_block))[0]
-
-        tbrmvd = dict()  # instructions candidate to be removed
-        offsets = set()  # offsets to be checked
-
-        # searching packet action register or a default packet action
-        blck = self.blocks[exit_block]
-        assert (blck[INSTRUCTIONS][-1] is not None and is_exit(unpack_instruction(blck[INSTRUCTIONS][-1][INSTR_B]))) \
-               or (blck[INSTRUCTIONS][-2] is not None and is_exit(unpack_instruction(blck[INSTRUCTIONS][-2][INSTR_B]))), \
-            "Last block must contain an [mov]exit, seems a bug..."
-        if len(blck[INSTRUCTIONS]) >= 2:
-            if is_mov_exit(
-                    unpack_instruction(blck[INSTRUCTIONS][-2][INSTR_B])):  # programs ends with mov-exit: default action
-                self.bound_check_cache["pkt_act"] = unpack_instruction(blck[INSTRUCTIONS][-1][INSTR_B])["immediate"]
-            else:  # program ends with r0 = pkt_act_reg, exit
-                for inst in reversed(blck[INSTRUCTIONS][-2:]):
-                    unpkd = unpack_instruction(inst[INSTR_B])
-                    if is_mov(unpkd) and get_output(unpkd) == 0:  # searching r0 = rx
-                        self.bound_check_cache["pkt_act_reg"] = get_inputs(unpkd)[0]
-                        break
-        else:
-            self.bound_check_cache["pkt_act_reg"] = 0
-
-        blocks = list(nx.lexicographical_topological_sort(self.flow_graph))
-        assert self.blocks[blocks[0]][TYPE] == BlockType.START and len(
-            list(self.flow_graph.successors(blocks[0]))) == 1, \
-            "Starting block must be a BlockType.START, with one successor, seems a bug..."
-
-        # searching ctx register definition
-        blck = self.blocks[1]  # if renamed it is done in first block
-        for inst in blck[INSTRUCTIONS]:
-            unpkd = unpack_instruction(inst[INSTR_B])
-            if is_mov(unpkd) and inst[INPUTS][0][SYM_NAME] == 1:  # ctx is passed to the eBPF program with r1
-                next = self.__find_liveness(inst[OUTPUT][NEXT_USE], inst[OUTPUT][SYM_NAME])
-                if next is not None:
-                    self.bound_check_cache["ctx"] = (inst[OUTPUT][SYM_NAME], next)
-                    tbrmvd[inst[ORIG_POS]] = (NOP, "NOP")
-                    break
-        if self.bound_check_cache["ctx"][0] is None:  # if not defined is the default r1
-            if 1 not in blck[IN_OPERANDS]:
-                return None  # no accesses to ctx
-            next = self.__find_liveness(blck[IN_OPERANDS][1], 1)
-            if next is not None:
-                self.bound_check_cache["ctx"] = (1, next)
-
-        for b in list(nx.lexicographical_topological_sort(self.flow_graph))[1:-1]:
-            blck = self.blocks[b]
-            if blck[TYPE] != BlockType.BASIC:
-                continue
-
-            # memory boundary check
-            # verifying assumption: if rx > ry goto EXIT block
-            local_if_idx = len(blck[INSTRUCTIONS]) - 1
-            if not is_if_greater_eq(unpack_instruction(blck[INSTRUCTIONS][-1][INSTR_B])) or exit_block not in blck[
-                TNEXT]:
-                continue
-            ry, rx = get_inputs(unpack_instruction(blck[INSTRUCTIONS][-1][INSTR_B]))
-
-            # building dependency graph
-            data_dep_g = self.__compute_local_dependency_graph(blck)
-
-            # verifying assumption: ry is the packet length ctx->data_end
-            # not (is in cache && is valid)
-            if not (self.bound_check_cache["ctx_data_end"][0] == ry and self.bound_check_cache["ctx_data_end"][
-                1] >= blck[INSTRUCTIONS][local_if_idx][ORIG_POS]):
-                inst = self.__is_data_len(ry, local_if_idx, data_dep_g, b)
-                if not (inst is not None and
-                        blck[INSTRUCTIONS][inst][INPUTS][0][SYM_NAME] == self.bound_check_cache["ctx"][0] and
-                        blck[INSTRUCTIONS][inst][ORIG_POS] <= self.bound_check_cache["ctx"][1]):
-                    continue
-                tbrmvd[blck[INSTRUCTIONS][inst][ORIG_POS]] = (NOP, "NOP")
-
-                # update cache for ctx->data_len
-                next = self.__find_liveness(blck[INSTRUCTIONS][-1][INPUTS][0][NEXT_USE], ry)
-                if next is not None:
-                    self.bound_check_cache["ctx_data_end"] = (ry, next)
-
-            # verifying assumption: rx is an address in the packet, ctx->data + OFFSET
-            # not (is in cache && is valid)
-            if not (rx == self.bound_check_cache["ctx_data_+_offset"][0] and
-                    self.bound_check_cache["ctx_data_+_offset"][1] >= blck[INSTRUCTIONS][local_if_idx][ORIG_POS]):
-                offset, tbr = self.__is_packet_offset(rx, local_if_idx, data_dep_g, b)
-                if offset is None:
-                    continue
-                if blck[INSTRUCTIONS][local_if_idx][INPUTS][1][NEXT_USE] is not None:
-                    next = self.__find_liveness(blck[INSTRUCTIONS][local_if_idx][INPUTS][1][NEXT_USE], rx)
-                    if next is not None:
-                        self.bound_check_cache["ctx_data_+_offset"] = (rx, next, offset)
-
-                for k in tbr:
-                    tbrmvd[k] = (NOP, "NOP")
-                offsets.add(offset)
-            else:
-                offsets.add(self.bound_check_cache["ctx_data_+_offset"][2])
+        return self.reg_cache.snapshot()
 
-            # remove 'if rx > ry'
-            tbrmvd[blck[INSTRUCTIONS][local_if_idx][ORIG_POS]] = (NOP, "NOP")
+    def __optimal_local_schedule(self, b, data_dep_g, last_t, last_i, end_t, end_i, snapshot):
+        # This method searches a schedule of the block b with less rows than the greedy one (rows last_t + 1..end_t)
+        # with the DDG constraints: RAW/MEM/WAW at least one row later (RAW on the same lane if back to back), WAR
+        # not earlier. If found, it replaces the greedy schedule (undoing its register cache updates)
 
-            # remove setting pkt_act_reg = DROP
-            if self.bound_check_cache["pkt_act"] is None:  # default action not set
-                for inst in blck[INSTRUCTIONS]:
-                    unpkd = unpack_instruction(inst[INSTR_B])
-                    if is_mov_imm(unpkd) and inst[OUTPUT][SYM_NAME] == self.bound_check_cache["pkt_act_reg"] and \
-                            unpkd["immediate"] == XDPAction.DROP:
-                        tbrmvd[inst[ORIG_POS]] = (NOP, "NOP")
-
-        self.__remove_independents(tbrmvd)
-
-        return offsets
-
-    def __is_packet_offset(self, rx, inst_idx, data_dep_g, b_idx):
-        # This method checks if in register is contained the computation of a packet offset
-
-        preds = list(data_dep_g.predecessors(inst_idx))
-        blck = self.blocks[b_idx]
-
-        tbrmvd = set()
-
-        for p in preds:
-            if p >= 0 and blck[INSTRUCTIONS][p][OUTPUT][SYM_NAME] == rx:
-                unpkd = unpack_instruction(blck[INSTRUCTIONS][p][INSTR_B])
-
-                # searching a sequence ALU_ADD(MEM(r1 + 0), offset)
-                if is_alu_add_imm(unpkd):
-                    offset = unpkd["immediate"]
-                    tbrmvd.add(blck[INSTRUCTIONS][p][ORIG_POS])
-
-                    # MEM(r1 + 0) in cache && valid
-                    if blck[INSTRUCTIONS][p][INPUTS][0][SYM_NAME] == self.bound_check_cache["ctx_data"][0] and \
-                            blck[INSTRUCTIONS][p][ORIG_POS] <= self.bound_check_cache["ctx_data"][1]:
-                        return offset, tbrmvd
-                    else:
-                        # searching MEM(r1 + 0)
-                        pred = list(data_dep_g.predecessors(p))[0]
-                        if self.__is_mem_load(blck[INSTRUCTIONS][pred][INSTR_B], 32, 0) and \
-                                blck[INSTRUCTIONS][pred][INPUTS][0][SYM_NAME] == self.bound_check_cache["ctx"][0] and \
-                                blck[INSTRUCTIONS][pred][ORIG_POS] <= self.bound_check_cache["ctx"][1]:
-                            tbrmvd.add(blck[INSTRUCTIONS][pred][ORIG_POS])
-
-                            # update cache for ctx->data
-                            next = self.__find_liveness(blck[INSTRUCTIONS][p][INPUTS][0][NEXT_USE],
-                                                        blck[INSTRUCTIONS][pred][OUTPUT][SYM_NAME])
-                            if next is not None:
-                                self.bound_check_cache["ctx_data"] = (blck[INSTRUCTIONS][pred][OUTPUT][SYM_NAME], next)
-
-                            return offset, tbrmvd
-
-        return None, None
-
-    def __is_data_len(self, ry, inst_idx, data_dep_g, b_idx):
-        # This method checks if the register contains the data_len value
-
-        preds = list(data_dep_g.predecessors(inst_idx))
-        blck = self.blocks[b_idx]
-
-        for p in preds:
-            if p >= 0 and blck[INSTRUCTIONS][p][OUTPUT][SYM_NAME] == ry:
-                if self.__is_mem_load(blck[INSTRUCTIONS][p][INSTR_B], 32, 4):
-                    return p
-        return None
+        blck = self.blocks[b]
+        nodes = [n for n in range(len(blck.instructions)) if not is_nop(blck.instructions[n].unpkd)]
+        ids = {nodes[i]: i for i in range(len(nodes))}
 
-    def __find_liveness(self, next, reg):
-        # This method returns the last instruction using a given value
+        edges, release, entry_lanes, branch = [], {}, {}, None
+        for n in nodes:
+            instr = blck.instructions[n]
+            latency = self.machine.latency(instr.unpkd)
+            if is_branch(instr.unpkd):
+                branch = ids[n]
+            for ready in self.__in_flight_writes(b, instr):  # written after the outputs still being written
+                if ready - latency + 1 > 0:
+                    release[ids[n]] = max(release.get(ids[n], 0), ready - latency + 1)
+            for p in data_dep_g.predecessors(n):
+                kind = data_dep_g.kind(p, n)
+                if p >= 0:
+                    p_latency = self.machine.latency(blck.instructions[p].unpkd)
+                    delay = 1 if kind & DepKind.MEM else 0
+                    if kind & DepKind.RAW:
+                        delay = max(delay, p_latency)
+                    if kind & DepKind.WAW:
+                        delay = max(delay, 1, p_latency - latency + 1)
+                    edges.append((ids[p], ids[n], delay, bool(kind & DepKind.RAW) and
+                                  self.machine.lane_forward_constraint))
+                elif kind & DepKind.RAW:  # definitions of the previous blocks, readable from their ready row
+                    for inp in instr.inputs:
+                        for d in self.use_def.get((instr.orig_pos, inp.sym_name), []):
+                            if 0 <= d < blck.start and self.schedule[d][LANE] is not None:
+                                ready = self.__ready_row(d, b) - last_t - 1  # row of the block
+                                if ready > 0:
+                                    release[ids[n]] = max(release.get(ids[n], 0), ready)
+                                if ready >= 0 and self.machine.lane_forward_constraint:
+                                    entry_lanes.setdefault(ids[n], {}).setdefault(
+                                        ready, set(range(self.machine.n_lanes))).intersection_update(
+                                        {self.schedule[d][LANE]})
+
+        greedy_rows = end_t - last_t
+        scheduler = OptimalBlockScheduler(self.machine.n_lanes, self.machine.branch_lanes, self.optimal_sched_budget)
+        rows, placement, bound = scheduler.schedule(len(nodes), edges, branch, entry_lanes, greedy_rows, release)
+        self.optimal_sched_report.append((b, greedy_rows, rows if rows is not None else greedy_rows,
+                                          min(bound, greedy_rows)))
+        if placement is None:
+            return end_t, end_i
+
+        # undo the greedy schedule
+        for row in range(last_t + 1, end_t + 1):
+            self.resource_table.clear_row(row)
+        self.reg_cache.restore(snapshot)
 
-        n_next = next
-        while n_next is not None:
-            t_block = self.blocks[self.schedule[n_next][BLOCK]]
-            t_inst = t_block[INSTRUCTIONS][self.global_to_local(t_block, n_next)]
+        for n in nodes:
+            row, lane = placement[ids[n]]
+            self.schedule[blck.instructions[n].orig_pos][TIME] = last_t + 1 + row
+            self.schedule[blck.instructions[n].orig_pos][LANE] = lane
+            self.resource_table.place(last_t + 1 + row, lane, blck.instructions[n])
 
-            if t_inst[OUTPUT] is not None and t_inst[OUTPUT][SYM_NAME] == reg or is_call(
-                    unpack_instruction(t_inst[INSTR_B])):
-                return t_inst[ORIG_POS]
+        # update used register cache as the greedy scheduler (placing instructions in topological order)
+        for n in nodes:
+            inst = blck.instructions[n]
+            row = self.schedule[inst.orig_pos][TIME]
+            orig_lu = self.__last_use(inst.orig_pos, inst.output.sym_name) if inst.output is not None else None
+            if orig_lu is not None:
+                row_lu = self.schedule[orig_lu][TIME] if self.schedule[orig_lu][LANE] is not None else None
+                self.reg_cache.put_reg_wr(inst.output.sym_name, inst.orig_pos, orig_lu, row, row_lu)
+            self.reg_cache.put_reg_rd([inp.sym_name for inp in inst.inputs], row, inst.orig_pos)
 
-            for inp in t_inst[INPUTS]:
-                if inp[SYM_NAME] == reg:
-                    if inp[NEXT_USE] is None:
-                        return n_next
-                    n_next = inp[NEXT_USE]
+        return last_t + rows, max([end_i] + [blck.instructions[n].orig_pos for n in nodes])
 
-    def __is_mem_load(self, instruct, size, offset):
-        # This method checks if an instruction is a load from memory suitable to be promoted to a 48 bit read
+    def global_to_local(self, blck, index):
+        # This method resolves from global instruction index to local block index
 
-        unpkd = unpack_instruction(instruct)
+        if index in self.pos_index and self.blocks[self.pos_index[index][0]] is blck:
+            return self.pos_index[index][1]
+        print("\033[91mInstruction with index " + str(index) + " not found in block B" + str(self.blocks.index(blck)))
+        exit(-1)
 
-        return load_to_size(unpkd) is not None and load_to_size(unpkd) == size and unpkd[OFFSET] == offset
+    def __reaching_definition(self, instr, b):
+        # This method returns the global id of the definition reaching the inputs of instr (in the block b) from the
+        # previous blocks which can be read last (None if they are defined only by the program entry)
 
-    def __remove_independents(self, tbrmvd):
-        # This method removes instructions in tbrmvd and instructions depending on them
+        pred = None
+        for inp in instr.inputs:
+            for d in self.use_def.get((instr.orig_pos, inp.sym_name), []):
+                if 0 <= d < self.blocks[b].start and (pred is None or
+                                                      self.__ready_row(d, b) > self.__ready_row(pred, b)):
+                    pred = d
+        return pred
 
-        for orig_pos in reversed(sorted(list(tbrmvd.keys()))):
-            if self.program_bin[orig_pos] is None or self.program_bin[orig_pos] == 0:
-                continue
-            elif is_branch(unpack_instruction(self.program_bin[orig_pos])):
-                self.program_bin[orig_pos] = tbrmvd[orig_pos][0]
-                self.program_str[orig_pos] = tbrmvd[orig_pos][1]
-            else:
-                t_block = self.blocks[self.schedule[orig_pos][BLOCK]]
-                t_inst = t_block[INSTRUCTIONS][self.global_to_local(t_block, orig_pos)]
-
-                self.program_bin[orig_pos] = tbrmvd[orig_pos][0]
-                self.program_str[orig_pos] = tbrmvd[orig_pos][1]
-
-                # eliminating depending instructions
-                if t_inst[OUTPUT] is not None and tbrmvd[orig_pos][1] == "NOP":
-                    next = t_inst[OUTPUT][NEXT_USE]
-                    out_reg = t_inst[OUTPUT][SYM_NAME]
-
-                    pending = [orig_pos]
-                    while next is not None:
-                        t_block = self.blocks[self.schedule[next][BLOCK]]
-                        t_inst = t_block[INSTRUCTIONS][self.global_to_local(t_block, next)]
-
-                        if t_inst[ORIG_POS] not in tbrmvd:
-                            break
-
-                        for inp in t_inst[INPUTS]:
-                            if inp[SYM_NAME] == out_reg:
-                                pending.append(next)
-                                next = inp[NEXT_USE]
-                                if next is None:
-                                    for i in pending:
-                                        self.program_bin[i] = NOP
-                                        self.program_str[i] = "NOP"
-
-                        if t_inst[OUTPUT] is not None and t_inst[OUTPUT][SYM_NAME] == out_reg or is_call(
-                                unpack_instruction(t_inst[INSTR_B])):
-                            for i in pending:
-                                self.program_bin[i] = NOP
-                                self.program_str[i] = "NOP"
-                            break
+    def __fix_branch_offsets(self):
+        # This method fixes the offset of branches (on the branch lanes of the machine) after the scheduling: they
+        # jump to the first row of their target block
 
-    def __advanced_optimizations(self):
-        # This method performs some advanced optimizations, such as promoting load/store at 48 bit
-        # and eliminating memory zeroing
+        for r in range(len(self.resource_table)):
+            row = self.resource_table[r]
+            for lane in self.machine.branch_lanes:
+                if row[lane] is not None and is_jump(row[lane].unpkd):
+                    row[lane].set_instr_b(modify_offset(row[lane].instr_b,
+                                                        self.__entry_row(row[lane].jmp_block) - r - 1))
 
-        optimizations = [LoadStore48(), Load48Store48(), MemsetToZero()]
+    def __entry_row(self, b):
+        # This method returns the first row of the block b (of the next scheduled block, if b is empty)
 
+        while b not in self.block_entry and b < len(self.blocks):
+            b += 1
+        return self.block_entry.get(b, len(self.resource_table))
+
+    def __remove_bounds_checks(self):
+        # This method removes the packet bounds checks proved redundant by the packet bounds analysis (with
+        # remove_mem_boundary_checks, also the ones the hardware bounds protection makes redundant, see PacketBounds):
+        # the if branch always goes to its in bounds side, the code reachable only through the out of bounds side and
+        # the instructions computing only the operands of the removed code are removed too. Returns True if the
+        # program has been modified
+
+        self.__compute_reaching_definitions()
+        analysis = PacketBounds(self.blocks, self.flow_graph, hardware_protection=self.remove_mem_boundary_checks)
+        checks = analysis.analyze()
+
+        removed = set()
+        for check in checks:
+            unpkd = unpack_instruction(self.program_bin[check.pos])
+            self.program_bin[check.pos] = pack_instruction(GOTO_OPCODE, offset=unpkd.offset) if check.taken else NOP
+            removed.add(check.pos)
+        for b in analysis.unreachable:
+            for instr in self.blocks[b].instructions:
+                self.program_bin[instr.orig_pos] = NOP
+                removed.add(instr.orig_pos)
+
+        # operands of the removed instructions defined by instructions without other uses and side effects
+        removed |= self.__remove_unused_definitions(removed, kept=analysis.packet_accesses)
+
+        self.bounds_redundant += sum(1 for check in checks if check.redundant)
+        self.bounds_protected += sum(1 for check in checks if not check.redundant)
+        self.bounds_removed += len(removed) - sum(1 for check in checks if check.taken)
+        return len(removed) > 0
+
+    def __propagate_constants(self):
+        # This method folds the constants found by the constant propagation into the instructions (see
+        # ConstantPropagation.fold): the ALU operations left with an identity immediate, the code never executed and
+        # the definitions whose uses have all been folded are removed. Returns True if the program has been modified
+
+        self.__compute_reaching_definitions()
+        analysis = ConstantPropagation(self.blocks, self.flow_graph)
+        analysis.analyze()
+
+        changed = set()
+        identities = {}  # global id -> register of the ALU operations removed as identities (their output is the input)
+        for b in analysis.unreachable:
+            for instr in self.blocks[b].instructions:
+                self.program_bin[instr.orig_pos] = NOP
+                changed.add(instr.orig_pos)
         for blck in self.blocks:
-            if blck[TYPE] != BlockType.BASIC:
+            for instr in blck.instructions:
+                if instr.orig_pos in changed:
+                    continue
+                folded = analysis.fold(instr)
+                if folded is None or folded == instr.instr_b:
+                    continue
+                unpkd = unpack_instruction(folded)
+                if is_alu(unpkd) and self.__is_identity(unpkd, {}, {}):
+                    folded = NOP
+                    identities[instr.orig_pos] = unpkd.dst
+                self.program_bin[instr.orig_pos] = folded
+                changed.add(instr.orig_pos)
+        removed = self.__remove_unused_definitions(changed, identities=identities)
+
+        self.branches_folded += sum(1 for pos in analysis.branches if pos in changed)
+        self.constants_folded += sum(1 for pos in changed if self.program_bin[pos] != NOP and pos not in analysis.branches)
+        self.constants_removed += sum(1 for pos in changed | removed if self.program_bin[pos] == NOP)
+        return len(changed) > 0
+
+    def __remove_unused_definitions(self, changed, kept=(), identities=None):
+        # This method removes the definitions read only by the instructions removed or rewritten (changed: their
+        # global ids) which no longer read them, then the ones read only by the removed definitions. Helper calls,
+        # branches, stores and the definitions in kept are never removed. The identities (global id -> register) are
+        # removed instructions whose output is their input register: they still read it. Returns the global ids of the
+        # removed ones
+
+        identities = identities or {}
+
+        removed = set()
+        pending = sorted(changed)
+        while pending:
+            pos = pending.pop()
+            if pos in self.calls_indexes:
                 continue
-            for instr in blck[INSTRUCTIONS]:
-                if instr is not None:
-                    for opt in optimizations:
-                        opt.parse_instruction(instr[INSTR_B], instr[ORIG_POS])
-
-        res = dict()
-        for opt in optimizations:
-            for r in opt.get_optimized_instructions():
-                res.update(r)
+            for inp in self.blocks[self.pos_index[pos][0]].instructions[self.pos_index[pos][1]].inputs:
+                if identities.get(pos) == inp.sym_name:
+                    continue
+                for d in self.use_def.get((pos, inp.sym_name), []):
+                    if d < 0 or d in removed or d in kept or d in self.calls_indexes:
+                        continue
+                    unpkd = unpack_instruction(self.program_bin[d])
+                    if is_nop(unpkd) or is_branch(unpkd) or get_mem_access(unpkd) is not None and not is_load(unpkd):
+                        continue
+                    if any(identities.get(u) == inp.sym_name or
+                           inp.sym_name in self.__reg_accesses(Instruction(self.program_bin[u], u))[0]
+                           for u in self.def_use.get((d, inp.sym_name), [])):
+                        continue
+                    self.program_bin[d] = NOP
+                    removed.add(d)
+                    pending.append(d)
+        return removed
 
-        self.__remove_independents(res)
+    def __advanced_optimizations(self):
+        # This method applies the peephole patterns (see Peephole): load/store promotion at 48 bit and memory zeroing
+        # removal. Returns True if the program has been modified
+
+        self.__compute_reaching_definitions()
+        self.__compute_stack_pointers()
+        peephole = Peephole(self.blocks, self.def_use)
+        rewrites = peephole.run()
+        for pos, instr_b in rewrites.items():
+            self.program_bin[pos] = instr_b
+        for name, n in peephole.matched.items():
+            self.peephole_matched[name] = self.peephole_matched.get(name, 0) + n
+        return len(rewrites) > 0
 
     def __move_branches(self, b, last_t):
         # This method moves a branch from a single instruction block following the current block, when they
@@ -1204,109 +1730,33 @@ class Optimizer:
 
         blck = self.blocks[b]
 
-        unpkd = unpack_instruction(blck[INSTRUCTIONS][-1][INSTR_B])
+        unpkd = blck.instructions[-1].unpkd
         if not is_if_branch(unpkd):
             return
         inputs = set(get_inputs(unpkd))
 
-        avail = sum(i is None or i[INSTR_B] == NOP for i in self.resource_table[last_t])
+        avail = self.resource_table.n_free(last_t)
         found = True
-        curr_b = blck[FNEXT]
+        curr_b = blck.fnext
         while curr_b is not None and avail > 0 and found == True:
             found = False
 
             cand_blck = self.blocks[curr_b]
-            if len(cand_blck[INSTRUCTIONS]) == 1:
-                unpkd = unpack_instruction(cand_blck[INSTRUCTIONS][0][INSTR_B])
+            if len(cand_blck.instructions) == 1:
+                unpkd = cand_blck.instructions[0].unpkd
 
                 if is_if_branch(unpkd) and len(inputs.difference(set(get_inputs(unpkd)))) == 0:
-                    for lane in range(NUM_LANES):
-                        if self.resource_table[last_t][lane] is None:
-                            self.resource_table[last_t][lane] = cand_blck[INSTRUCTIONS][0]
-
-                            self.schedule[cand_blck[INSTRUCTIONS][0][ORIG_POS]][TIME] = last_t
-                            self.schedule[cand_blck[INSTRUCTIONS][0][ORIG_POS]][LANE] = lane
-                            self.schedule[cand_blck[INSTRUCTIONS][0][ORIG_POS]][BLOCK] = b
-
-                            cand_blck[INSTRUCTIONS][0] = {INSTR_B: NOP,
-                                                          INSTR_S: "NOP",
-                                                          INPUTS: [],
-                                                          OUTPUT: None,
-                                                          ORIG_POS: None,
-                                                          JMP_BLOCK: None,
-                                                          PENDING_DEPS: 0
-                                                          }
-                            cand_blck[TYPE] = BlockType.DISABLED # block can be eliminated
-
-                            avail -= 1
-                            found = True
-                            curr_b = cand_blck[FNEXT]
-                            break
-
-    def __rename_registers(self, tbmd, blck, used):
-        # This method modifies output registers of the instructions in tbmd, choosing a register which is not already
-        # used in the current row (list of used regs in used) and it is not used in subsequent blocks (it may be a reg
-        # for a helper function call, or simply a reg used later which requires to modify further instructions).
-        # Returns the new register used
-
-        assert len(tbmd) != 0, "Call to __rename_register for 0 instructions"
-
-        new_reg = STACK_REG
-        for i in range(0, 16):  # valid to use regs in r0-r15
-            if i != STACK_REG and i not in blck[OUT_OPERANDS] and i not in used:
-                new_reg = i
-                break
+                    lane = self.resource_table.free_lane(last_t)
+                    self.resource_table.place(last_t, lane, cand_blck.instructions[0])
 
-        # No free reg was found
-        if new_reg == STACK_REG:
-            raise Exception("No registers available")
-
-        instr = blck[INSTRUCTIONS][tbmd[0]]
-        instr_id = instr[ORIG_POS]
-        old_reg = instr[OUTPUT][SYM_NAME]
-
-        # instructions in tbmd are ordered (in the dependency chain), first instruction needs to modify only dst
-        # register
-        instr[INSTR_B] = modify_register(instr[INSTR_B], new_reg, DST_SHIFT_MOD)
-        instr[INSTR_S] = self.modify_reg_str(instr[INSTR_S], old_reg, new_reg, only_out=True)
-        instr[OUTPUT][SYM_NAME] = new_reg
-
-        # instr was already scheduled
-        if self.schedule[instr_id][LANE] is not None:
-            rt_inst = self.resource_table[self.schedule[instr_id][TIME]][self.schedule[instr_id][LANE]]
-            if rt_inst[ORIG_POS] == instr[ORIG_POS]:
-                self.resource_table[self.schedule[instr_id][TIME]][self.schedule[instr_id][LANE]] = instr
-
-        for i in tbmd[1:]:
-            instr = blck[INSTRUCTIONS][i]
-            instr_id = instr[ORIG_POS]
-
-            # subsequent instructions in tbmd needs to modify only src registers
-            for inp in instr[INPUTS]:
-                if inp[SYM_NAME] == old_reg:
-                    instr[INSTR_S] = self.modify_reg_str(instr[INSTR_S], old_reg, new_reg, only_in=True)
-                    instr[INSTR_B] = modify_register(instr[INSTR_B], new_reg, SRC_SHIFT_MOD)
-                    inp[SYM_NAME] = new_reg
-
-                    if self.schedule[instr_id][LANE] is not None:
-                        rt_inst = self.resource_table[self.schedule[instr_id][TIME]][self.schedule[instr_id][LANE]]
-                        if rt_inst[ORIG_POS] == instr[ORIG_POS]:
-                            self.resource_table[self.schedule[instr_id][TIME]][self.schedule[instr_id][LANE]] = instr
-
-            # the instruction is a branch, closing the block and therefore the dependency chain tbmd
-            if is_branch(unpack_instruction(instr[INSTR_B])):
-                break
+                    self.schedule[cand_blck.instructions[0].orig_pos][TIME] = last_t
+                    self.schedule[cand_blck.instructions[0].orig_pos][LANE] = lane
+                    self.schedule[cand_blck.instructions[0].orig_pos][BLOCK] = b
 
-            # the instruction redefines the output operand, no need to continue in the chain
-            if instr[OUTPUT] is not None and instr[OUTPUT][SYM_NAME] == old_reg:
-                break
+                    cand_blck.instructions[0] = Instruction(NOP, None)
+                    cand_blck.index_registers()
+                    cand_blck.type = BlockType.DISABLED # block can be eliminated
 
-        return new_reg
-
-    @staticmethod
-    def __conf_ends_after_blck(blck, conflicting):
-        return conflicting[ORG_LIVE] > blck[START] + blck[LEN]
-
-    @staticmethod
-    def __conf_starts_before_blck(blck, conflicting):
-        return conflicting[ORIG_DEF] < blck[START]
+                    avail -= 1
+                    found = True
+                    curr_b = cand_blck.fnext
@@ -0,0 +1,428 @@
+from collections import namedtuple
+
+from ebpf_parser import CLASS_MASK, CLASS_STX, CLASS_ALU, CLASS_ALU64, CLASS_JMP, OP_MASK, SOURCE_REG, ALU_END, LDDW, MOV_ALU, \
+    MOV_ALU_TO_ALU, ALU_OP_TO_STR, JMP_OP_TO_STR, XDPAction, twos_comp, is_branch, is_goto, is_call, is_exit, \
+    is_mov_exit, is_load, is_store, get_mem_access
+from helpers import MemKind, helper
+from ir import BlockType, NUM_REGS, mask_regs
+
+U32_MAX = (1 << 32) - 1
+U63_MAX = (1 << 63) - 1
+U64_MASK = (1 << 64) - 1
+MAX_PACKET_OFFSET = 0xffff  # packet pointers with a larger variable offset are not tracked (as in the kernel verifier)
+XDP_MD_DATA = 0  # offsets of data and data_end in the context (struct xdp_md)
+XDP_MD_DATA_END = 4
+WALK_LIMIT = 256  # instructions followed from a bounds check looking for its packet access (or its drop)
+
+# abstract values: the context pointer, the end of the packet, any value which is not a pointer to the context, the
+# stack or the packet (e.g. map values), stack pointers (STACK, off) = r10 + off (off None if variable), packet
+# pointers (PKT, id, off, lo, hi) = data + V(id) + off and scalars (SCALAR, id, off, lo, hi) = V(id) + off, with the
+# range [lo, hi] of V(id) + off (None if unknown). V(id) is the value written by the instruction id (or joined at a
+# block entry), V(None) = 0: scalars with id None are constants. None is any value
+CTX = ("ctx",)
+PKT_END = ("pkt_end",)
+OTHER = ("other",)
+STACK = "stack"
+PKT = "pkt"
+SCALAR = "scalar"
+STACK_REG = 10
+SPILL_BYTES = 8  # registers spilled to the stack are tracked in the 8 bytes slots written by a register store
+
+# relation tested by a bounds check (pointer relation end) -> (in bounds if taken, in bounds if pointer < end)
+CHECK_RELATIONS = {">": (False, False), ">=": (False, True), "<=": (True, False), "<": (True, True)}
+SWAPPED_RELATION = {">": "<", "<": ">", ">=": "<=", "<=": ">="}
+
+# bounds check removed: the if branch at pos (ending block) goes to in_bounds, taken: in_bounds is its jump target,
+# redundant: proved by the previous checks (otherwise the hardware drops the packet on its out of bounds path)
+BoundsCheck = namedtuple("BoundsCheck", ["pos", "block", "in_bounds", "taken", "redundant"])
+
+
+def signed(value):
+    return value - (1 << 64) if value > U63_MAX else value
+
+
+def constant(value):
+    value &= U64_MASK
+    return SCALAR, None, value, value, value
+
+
+def scalar(id, off=0, lo=None, hi=None):
+    if id is None:
+        return constant(off)
+    if lo is None or hi is None or lo < 0 or hi > U63_MAX:
+        lo, hi = None, None
+    return SCALAR, id, off, lo, hi
+
+
+def packet(id, off, lo, hi):
+    if lo is None or hi is None or lo < -MAX_PACKET_OFFSET or hi > MAX_PACKET_OFFSET:
+        return None
+    return PKT, id, off, lo, hi
+
+
+def is_kind(value, kind):
+    return value is not None and value[0] == kind
+
+
+def is_constant(value):
+    return is_kind(value, SCALAR) and value[1] is None
+
+
+def has_range(value, hi_max=U63_MAX):
+    return is_kind(value, SCALAR) and value[3] is not None and value[4] <= hi_max
+
+
+class BoundsState:
+    # Abstract state at a program point: the values of the registers, of the registers spilled to the stack
+    # (offset from r10 -> value) and the bounds proved by the checks, proven: id -> the largest k such that
+    # data + V(id) + k <= data_end
+
+    __slots__ = ("regs", "stack", "proven")
+
+    def __init__(self, regs, stack, proven):
+        self.regs = regs
+        self.stack = stack
+        self.proven = proven
+
+    def copy(self):
+        return BoundsState(list(self.regs), dict(self.stack), dict(self.proven))
+
+    def store(self, off, size, value=None):
+        # This method writes size bytes of the stack at r10 + off (off None: anywhere), the slot keeps the value of a
+        # spilled register
+
+        if off is None:
+            self.stack = {}
+            return
+        for slot in [slot for slot in self.stack if slot < off + size and off < slot + SPILL_BYTES]:
+            del self.stack[slot]
+        if value is not None:
+            self.stack[off] = value
+
+    def is_proven(self, ptr, k):
+        # This method returns True if data + V(id) + off + k <= data_end for the packet pointer ptr
+
+        _, id, off, lo, hi = ptr
+        return self.proven.get(id, -MAX_PACKET_OFFSET - 1) >= off + k or \
+            self.proven.get(None, -MAX_PACKET_OFFSET - 1) >= hi + k
+
+    def prove(self, ptr, k):
+        # This method adds the fact data + V(id) + off + k <= data_end for the packet pointer ptr
+
+        _, id, off, lo, hi = ptr
+        self.proven[id] = max(self.proven.get(id, off + k), off + k)
+        self.proven[None] = max(self.proven.get(None, lo + k), lo + k)
+
+
+class PacketBounds:
+    # Packet bounds analysis of an XDP program, similar to the packet pointer tracking of the kernel verifier: a
+    # forward abstract interpretation of the acyclic CFG (in topological order, the state at a block entry is the meet
+    # of the states on its incoming edges) tracking the packet pointers with constant and variable offsets, the scalar
+    # ranges and the bounds proved by the checks (pointer compared with data_end) on each path. A check is removed if
+    # it is redundant (already proved on every path reaching it: its out of bounds side is never taken) or, with the
+    # hardware bounds protection of hXDP (an out of bounds packet access drops the packet), if its out of bounds side
+    # drops the packet without side effects and its in bounds side accesses the last byte it checks before any
+    # branch, helper call or store out of the stack and packet. Blocks reachable only through the out of bounds side
+    # of the removed checks are unreachable
+
+    def __init__(self, blocks, flow_graph, hardware_protection=False):
+        self.blocks = blocks
+        self.flow_graph = flow_graph
+        self.hardware_protection = hardware_protection
+        self.states = {}  # block -> state at its entry, None if unreachable once the checks are removed
+        self.checks = []  # BoundsCheck of the checks removed
+        self.unreachable = []  # basic blocks unreachable once the checks are removed
+        self.packet_accesses = set()  # global ids of the packet loads and stores
+
+    def analyze(self):
+        # This method returns the bounds checks which can be removed
+
+        order = self.flow_graph.topological_sort()
+        edges = {}  # (block, successor) -> state on the edge, None if never taken
+        for b in order:
+            if b == order[0]:
+                regs = [None] * NUM_REGS
+                regs[1], regs[STACK_REG] = CTX, (STACK, 0)
+                state = BoundsState(regs, {}, {})
+            else:
+                state = self.__meet(b, [edges[p, b] for p in self.flow_graph.predecessors(b)
+                                        if edges.get((p, b)) is not None])
+            self.states[b] = state
+            blck = self.blocks[b]
+            succs = list(self.flow_graph.successors(b))
+            if state is None:
+                if blck.type == BlockType.BASIC:
+                    self.unreachable.append(b)
+                for s in succs:
+                    edges[b, s] = None
+                continue
+
+            state = state.copy()
+            for instr in blck.instructions:
+                self.__transfer(state, instr)
+            for s in succs:
+                edges[b, s] = state
+
+            check = self.__bounds_check(blck, state) if blck.type == BlockType.BASIC and blck.instructions else None
+            if check is None:
+                continue
+            ptr, k, taken = check
+            in_bounds, out_bounds = (blck.tnext[0], blck.fnext) if taken else (blck.fnext, blck.tnext[0])
+            proved = state.copy()
+            proved.prove(ptr, k)
+            edges[b, in_bounds] = proved
+
+            redundant = state.is_proven(ptr, k)
+            if redundant or self.hardware_protection and self.__drops(out_bounds, state) and \
+                    self.__drops(in_bounds, proved, ptr, k):
+                self.checks.append(BoundsCheck(blck.instructions[-1].orig_pos, b, in_bounds, taken, redundant))
+                edges[b, out_bounds] = None
+        return self.checks
+
+    def __meet(self, b, states):
+        # This method returns the state at the entry of the block b from the states on its incoming edges: the values
+        # differing on some edge are joined into a value of the block (its range is the union of their ranges), the
+        # bounds are the ones proved on every edge
+
+        if not states:
+            return None
+        if len(states) == 1:
+            return states[0]
+
+        proven = {id: min(s.proven[id] for s in states) for id in states[0].proven
+                  if all(id in s.proven for s in states)}
+        regs = [self.__join(b, reg, [s.regs[reg] for s in states], states, proven) for reg in range(NUM_REGS)]
+        stack = {}
+        for slot in states[0].stack:
+            if all(slot in s.stack for s in states):
+                value = self.__join(b, (STACK, slot), [s.stack[slot] for s in states], states, proven)
+                if value is not None:
+                    stack[slot] = value
+        return BoundsState(regs, stack, proven)
+
+    @staticmethod
+    def __join(b, loc, values, states, proven):
+        # This method returns the value at the entry of the block b of the location loc (register or stack slot) from
+        # its values on the incoming edges, adding to proven the bounds of the packet pointers joined
+
+        if all(v == values[0] for v in values):
+            return values[0]
+        if all(v == OTHER or is_kind(v, SCALAR) for v in values) and OTHER in values:
+            return OTHER
+        kind = values[0][0] if values[0] is not None else None
+        if kind not in (PKT, SCALAR, STACK) or not all(is_kind(v, kind) for v in values):
+            return None
+        if kind == STACK:
+            return STACK, None
+        lo = None if any(v[3] is None for v in values) else min(v[3] for v in values)
+        hi = None if any(v[4] is None for v in values) else max(v[4] for v in values)
+        id = ("join", b, loc)
+        if kind == SCALAR:
+            return scalar(id, 0, lo, hi)
+
+        # data + V(id) = data + V(id_e) + off_e on the edge e
+        k = min(max(s.proven.get(v[1], -MAX_PACKET_OFFSET - 1) - v[2],
+                    s.proven.get(None, -MAX_PACKET_OFFSET - 1) - v[4]) for s, v in zip(states, values))
+        if k >= -MAX_PACKET_OFFSET:
+            proven[id] = k
+        return packet(id, 0, lo, hi)
+
+    @staticmethod
+    def __bounds_check(blck, state):
+        # This method returns (pointer, k, taken) if the block ends with a bounds check: it is in bounds if
+        # data + V(id) + off + k <= data_end, on its taken side if taken
+
+        unpkd = blck.instructions[-1].unpkd
+        if unpkd.opcode & CLASS_MASK != CLASS_JMP or not unpkd.opcode & SOURCE_REG or not blck.tnext or \
+                blck.tnext[0] == blck.fnext:
+            return None
+        relation = JMP_OP_TO_STR.get(unpkd.opcode & OP_MASK)
+        ptr, end = state.regs[unpkd.dst], state.regs[unpkd.src]
+        if ptr == PKT_END and relation in SWAPPED_RELATION:
+            ptr, end, relation = end, ptr, SWAPPED_RELATION[relation]
+        if end != PKT_END or not is_kind(ptr, PKT) or relation not in CHECK_RELATIONS:
+            return None
+        taken, strict = CHECK_RELATIONS[relation]
+        return ptr, 1 if strict else 0, taken
+
+    def __drops(self, b, state, ptr=None, k=0, budget=None):
+        # This method returns True if every path from the block b drops the packet before any side effect (helper
+        # call, store out of the stack and the packet, exit): it exits with XDP_DROP or, if ptr, it accesses the byte
+        # data + V(id) + off + k - 1 (or a later one) of the packet pointer ptr, out of bounds whenever the check fails
+
+        budget = budget if budget is not None else [WALK_LIMIT]
+        state = state.copy()
+        while b is not None and self.blocks[b].type == BlockType.BASIC:
+            blck = self.blocks[b]
+            for instr in blck.instructions:
+                unpkd = instr.unpkd
+                budget[0] -= 1
+                if budget[0] < 0:
+                    return False
+                if is_exit(unpkd):
+                    action = unpkd.immediate if is_mov_exit(unpkd) else state.regs[0]
+                    return action == XDPAction.DROP or action == constant(XDPAction.DROP)
+                if is_call(unpkd) or not self.__is_harmless(unpkd, state):
+                    return False
+                access = get_mem_access(unpkd)
+                base = state.regs[access[0]] if access is not None else None
+                if ptr is not None and is_kind(base, PKT) and (
+                        base[1] == ptr[1] and base[2] + access[1] + access[2] >= ptr[2] + k or
+                        base[3] + access[1] + access[2] >= ptr[4] + k):
+                    return True
+                self.__transfer(state, instr)
+            last = blck.instructions[-1].unpkd
+            if is_branch(last) and not is_goto(last):
+                return self.__drops(blck.tnext[0], state, ptr, k, budget) and \
+                    self.__drops(blck.fnext, state, ptr, k, budget)
+            b = blck.tnext[0] if is_goto(last) else blck.fnext
+        return False
+
+    @staticmethod
+    def __is_harmless(unpkd, state):
+        # This method returns True if the instruction has no side effect once the packet is dropped: stores to the
+        # stack and to the packet, packet accesses through an explicit pointer and the instructions not accessing memory
+
+        access = get_mem_access(unpkd)
+        if access is None:
+            return True
+        if access[0] is None:  # ld_abs/ld_ind: the program is aborted if out of bounds
+            return False
+        return not access[4] or is_kind(state.regs[access[0]], STACK) or is_kind(state.regs[access[0]], PKT)
+
+    def __transfer(self, state, instr):
+        # This method updates the state with the effects of the instruction
+
+        unpkd = instr.unpkd
+        regs = state.regs
+        if is_call(unpkd):
+            desc = helper(unpkd.immediate)
+            if desc.writes & MemKind.PACKET:  # the packet may be resized: its pointers and bounds are invalidated
+                regs[:] = [None if v == PKT_END or is_kind(v, PKT) else v for v in regs]
+                state.stack = {slot: v for slot, v in state.stack.items() if v != PKT_END and not is_kind(v, PKT)}
+                state.proven = {}
+            if desc.writes & MemKind.STACK:
+                state.store(None, 0)
+            for reg in mask_regs(desc.clobbers):
+                regs[reg] = None
+            regs[0] = OTHER
+            return
+
+        access = get_mem_access(unpkd)
+        if access is not None:
+            base_reg, off, size, _, writes = access
+            base = regs[base_reg] if base_reg is not None else None
+            if is_kind(base, PKT):
+                self.packet_accesses.add(instr.orig_pos)
+            slot = base[1] + off if is_kind(base, STACK) and base[1] is not None else None
+            if writes and is_kind(base, STACK):
+                spill = size == SPILL_BYTES and is_store(unpkd) and unpkd.opcode & CLASS_MASK == CLASS_STX
+                state.store(slot, size, regs[unpkd.src] if spill and slot is not None else None)
+            elif writes and (base is None or base == CTX):  # unknown memory, it may be the stack
+                state.store(None, size)
+            if not is_load(unpkd) or instr.output is None:
+                return
+            out = instr.output.sym_name
+            if base == CTX and size == 4 and off == XDP_MD_DATA:
+                regs[out] = packet(None, 0, 0, 0)
+            elif base == CTX and size == 4 and off == XDP_MD_DATA_END:
+                regs[out] = PKT_END
+            elif slot is not None and size == SPILL_BYTES:
+                regs[out] = state.stack.get(slot)
+            elif base is not None and size < 8:
+                regs[out] = scalar(instr.orig_pos, 0, 0, (1 << 8 * size) - 1)
+            else:
+                regs[out] = None if base is None or is_kind(base, STACK) else OTHER
+            return
+
+        if instr.output is None:
+            return
+        out = instr.output.sym_name
+        opcode, a = unpkd.opcode, regs[out]
+        if opcode in MOV_ALU:  # Sephirot mov-alu: dst = src op imm
+            opcode, a = MOV_ALU_TO_ALU[opcode], regs[unpkd.src]
+        op_class = opcode & CLASS_MASK
+        if opcode == LDDW or op_class not in (CLASS_ALU, CLASS_ALU64):
+            regs[out] = OTHER if opcode == LDDW else None
+            return
+
+        if opcode & SOURCE_REG:
+            b = regs[unpkd.src]
+        else:
+            b = constant(twos_comp(unpkd.immediate, 32) if op_class == CLASS_ALU64 else unpkd.immediate)
+        op = ALU_OP_TO_STR.get(opcode & OP_MASK)
+        if opcode & OP_MASK == ALU_END:
+            regs[out] = scalar(instr.orig_pos, 0, 0, (1 << unpkd.immediate) - 1)
+        elif op_class == CLASS_ALU64:
+            regs[out] = self.__alu(op, a, b, instr.orig_pos)
+        elif not has_range(b, U32_MAX) or op != "=" and not has_range(a, U32_MAX):  # 32 bit: the lower halves
+            regs[out] = scalar(instr.orig_pos, 0, 0, U32_MAX)
+        else:
+            value = self.__alu(op, a, b, instr.orig_pos)
+            regs[out] = value if has_range(value, U32_MAX) else scalar(instr.orig_pos, 0, 0, U32_MAX)
+
+    @staticmethod
+    def __add(a, b, pos):
+        # This method returns the value of a + b (pos: the instruction computing it)
+
+        if is_kind(b, PKT) or is_kind(b, STACK) or b == OTHER:
+            a, b = b, a
+        if not is_kind(b, SCALAR):
+            return None
+        if is_kind(a, STACK):
+            return (STACK, a[1] + signed(b[2])) if a[1] is not None and is_constant(b) else (STACK, None)
+        if a == OTHER:
+            return OTHER
+        if not is_kind(a, PKT) and not is_kind(a, SCALAR):
+            return None
+
+        kind, a_id, a_off, a_lo, a_hi = a
+        _, b_id, b_off, b_lo, b_hi = b
+        make = packet if kind == PKT else scalar
+        if b_id is None:  # V(a_id) + a_off + constant
+            a_id, a_off, a_lo, a_hi, delta = a_id, a_off, a_lo, a_hi, signed(b_off)
+        elif a_id is None:  # constant (or data) + V(b_id) + b_off
+            a_id, a_off, a_lo, a_hi, delta = b_id, b_off, b_lo, b_hi, signed(a_off) if kind == SCALAR else a_off
+        elif a_lo is None or b_lo is None:
+            return make(pos, 0, None, None)
+        else:
+            return make(pos, 0, a_lo + b_lo, a_hi + b_hi)
+        return make(a_id, a_off + delta, a_lo + delta if a_lo is not None else None,
+                    a_hi + delta if a_hi is not None else None)
+
+    def __alu(self, op, a, b, pos):
+        # This method returns the value of the 64 bit ALU operation a op b (pos: the instruction computing it)
+
+        if op == "=":
+            return b
+        if op == "+=":
+            return self.__add(a, b, pos)
+        if op == "-=" and is_constant(b):
+            return self.__add(a, constant(-signed(b[2])), pos)
+
+        if is_constant(b) and op in ("&=", "<<=", ">>=", "/=", "%="):
+            c = b[2]
+            if op == "&=":
+                if has_range(a) and a[4] <= c and c & (c + 1) == 0:  # the mask keeps all the bits
+                    return a
+                return scalar(pos, 0, 0, min(a[4], c) if has_range(a) else c)
+            if op == "<<=" and has_range(a) and c < 64:
+                return scalar(pos, 0, a[3] << c, a[4] << c)
+            if op == ">>=" and c < 64:
+                return scalar(pos, 0, a[3] >> c, a[4] >> c) if has_range(a) else scalar(pos, 0, 0, U64_MASK >> c)
+            if op == "/=" and has_range(a) and c > 0:
+                return scalar(pos, 0, a[3] // c, a[4] // c)
+            if op == "%=" and c > 0:
+                return scalar(pos, 0, 0, c - 1)
+            return scalar(pos)
+
+        if has_range(a) and has_range(b):
+            if op == "-=":
+                return scalar(pos, 0, a[3] - b[4], a[4] - b[3])
+            if op == "|=":
+                return scalar(pos, 0, max(a[3], b[3]), (1 << max(a[4].bit_length(), b[4].bit_length())) - 1)
+            if op == "&=":
+                return scalar(pos, 0, 0, min(a[4], b[4]))
+            if op == "*=":
+                return scalar(pos, 0, a[3] * b[3], a[4] * b[4])
+        return scalar(pos)
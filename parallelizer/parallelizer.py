@@ -1,21 +1,36 @@
 import argparse, os
+from elf_reader import is_elf_file, read_elf_file
 from file_reader import read_file
 from file_writer import write_program_to_file
+from block_profile import read_profile
 from optimizer_core import Optimizer
+from machine import Machine, NUM_LANES, DEFAULT_BRANCH_LANE
 
 parser = argparse.ArgumentParser(description='Parallelize eBPF program')
-parser.add_argument('-i', '--input', type=str, required=True, help='eBPF dump input file name')
+parser.add_argument('-i', '--input', type=str, required=True, help='eBPF dump (llvm-objdump -d) or BPF object input file name')
+parser.add_argument('-s', '--section', type=str, help='program section, for BPF object inputs')
 parser.add_argument('-o', '--output', type=str, help='parallelized bin file name')
+parser.add_argument('-l', '--lanes', type=int, default=NUM_LANES, help='# of lanes of the Sephirot core')
+parser.add_argument('-p', '--profile', type=str, help='block profile of the program (profiler.py output), to schedule its hot paths')
+parser.add_argument('-m', '--mem-protection', action='store_true', help='also remove the packet bounds checks made redundant by the hardware bounds protection')
 
 args = parser.parse_args()
 in_file = args.input
 
 out_file = os.path.splitext(args.input)[0]+".bin" if args.output is None else args.output
 
-program_bin, program_str = read_file(in_file)
+if is_elf_file(in_file):
+    program_bin, _ = read_elf_file(in_file, args.section)
+else:
+    program_bin, _ = read_file(in_file)
 
-parallelizer = Optimizer(program_bin, program_str, filename=os.path.splitext(args.input)[0], branch_all_lanes=False, lane_forward_constraint=True)
+profile = read_profile(args.profile) if args.profile is not None else None
+
+machine = Machine(n_lanes=args.lanes, branch_lanes=[DEFAULT_BRANCH_LANE], lane_forward_constraint=True)
+
+parallelizer = Optimizer(program_bin, filename=os.path.splitext(args.input)[0], machine=machine, profile=profile,
+                         remove_mem_boundary_checks=args.mem_protection)
 
 parallelizer.optimize()
 
-write_program_to_file(filename=out_file + ".out", parallel_program=parallelizer.resource_table)
\ No newline at end of file
+write_program_to_file(filename=out_file + ".out", parallel_program=parallelizer.resource_table, machine=machine)
\ No newline at end of file
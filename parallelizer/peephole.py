@@ -0,0 +1,287 @@
+from collections import namedtuple
+from ebpf_parser import CLASS_ST, CLASS_STX, MODE_MEM, SIZE_TO_BYTES, MOV_IMM, LOAD48, STORE48, \
+    LOAD_TO_SIZE48, STORE_TO_SIZE48, NOP, pack_instruction, get_mem_access, is_call, is_load, is_store
+from constant_propagation import MOV32_IMM
+from dead_code import STACK_REG, ALL_STACK, stack_bytes
+from helpers import MemKind, helper
+from ir import BlockType, stack_transfer
+
+MEMCPY_BYTES = 6  # bytes copied by a LOAD48/STORE48 pair
+STX_MEM = {CLASS_STX | MODE_MEM | size for size in SIZE_TO_BYTES}  # stores of a register
+ST_MEM = {CLASS_ST | MODE_MEM | size for size in SIZE_TO_BYTES}  # stores of an immediate
+
+Step = namedtuple("Step", ["opcodes",  # opcodes of the instruction (of the first step: the pattern prefilter)
+                           "guard"])  # guard(peephole, instr, matched) -> True if the instruction matches, or None
+
+Group = namedtuple("Group", ["steps",  # Steps matched by consecutive instructions, repeated
+                             "count",  # repetitions: int, count(matched) after each one, None as many as match
+                             "gap"])  # gap(peephole, instr, matched) -> True if instr can precede the group, or None
+
+Pattern = namedtuple("Pattern", ["name",
+                                 "groups",  # Groups matched in sequence
+                                 "rewrite"])  # rewrite(peephole, matched) -> {global id: new instruction}, or None
+
+
+def step(opcodes, guard=None):
+    return Step(frozenset(opcodes), guard)
+
+
+def group(*steps, count=1, gap=None):
+    return Group(steps, count, gap)
+
+
+def pattern(name, *groups, rewrite):
+    return Pattern(name, groups, rewrite)
+
+
+def copy_count(matched):
+    # This method returns the # of loads (stores) copying MEMCPY_BYTES with the size of the first load
+
+    return MEMCPY_BYTES * 8 // LOAD_TO_SIZE48[matched[0].unpkd.opcode]
+
+
+def copy_load(peephole, instr, matched):
+    # This method returns True if instr loads with the size and the base register of the first load
+
+    first = matched[0].unpkd if matched else instr.unpkd
+    return instr.unpkd.opcode == first.opcode and instr.unpkd.src == first.src
+
+
+def copy_store(peephole, instr, matched):
+    # This method returns True if instr stores a loaded register with the size of the loads and the base register of
+    # the first store
+
+    first = matched[0].unpkd
+    stores = [i.unpkd for i in matched if is_store(i.unpkd)]
+    return STORE_TO_SIZE48[instr.unpkd.opcode] == LOAD_TO_SIZE48[first.opcode] and \
+        any(i.unpkd.dst == instr.unpkd.src for i in matched if is_load(i.unpkd)) and \
+        (not stores or instr.unpkd.dst == stores[0].dst)
+
+
+def copy_gap(peephole, instr, matched):
+    # This method returns True if instr neither reads nor writes the loaded registers (helper calls clobber them)
+
+    loaded = {i.unpkd.dst for i in matched}
+    regs = {inp.sym_name for inp in instr.inputs} | ({instr.output.sym_name} if instr.output is not None else set())
+    return not is_call(instr.unpkd) and not regs & loaded
+
+
+def memcpy48(peephole, matched):
+    # This method rewrites the loads and stores copying MEMCPY_BYTES contiguous bytes (in any order) in a LOAD48 at
+    # the first load and a STORE48 at the store of its value, the others become NOPs. The loaded registers must not
+    # be read out of the copy (the first one holds all the bytes), nor be the base of the next accesses, and the
+    # source and destination must not overlap if they have the same base register. If a store precedes a load, the
+    # source must not be written by the copy: same base register, or the stack and memory out of it
+
+    loads = [i for i in matched if is_load(i.unpkd)]
+    stores = [i for i in matched if is_store(i.unpkd)]
+    size = LOAD_TO_SIZE48[loads[0].unpkd.opcode] // 8
+    offsets, sources = {}, {}  # loaded register -> offset of its last load, store global id -> offset of its value
+    for i in matched:
+        if is_load(i.unpkd):
+            offsets[i.unpkd.dst] = i.unpkd.offset
+        else:
+            sources[i.orig_pos] = offsets[i.unpkd.src]
+    lower = min(i.unpkd.offset for i in loads)
+    window = list(range(lower, lower + MEMCPY_BYTES, size))
+    if sorted(i.unpkd.offset for i in loads) != window or sorted(sources.values()) != window:
+        return None
+
+    delta = stores[0].unpkd.offset - sources[stores[0].orig_pos]
+    same_base = loads[0].unpkd.src == stores[0].unpkd.dst
+    if any(i.unpkd.offset - sources[i.orig_pos] != delta for i in stores) or \
+            same_base and 0 < abs(delta) < MEMCPY_BYTES:
+        return None
+    if stores[0].orig_pos < loads[-1].orig_pos and not same_base and not peephole.disjoint(loads[0], stores[0]):
+        return None
+    for k, load in enumerate(matched):
+        if is_load(load.unpkd) and any(load.unpkd.dst == (i.unpkd.src if is_load(i.unpkd) else i.unpkd.dst)
+                                       for i in matched[k + 1:]):
+            return None
+    copy = {i.orig_pos for i in stores}
+    if any(not set(peephole.def_use.get((i.orig_pos, i.unpkd.dst), [])) <= copy for i in loads):
+        return None
+
+    reg = loads[0].unpkd.dst
+    store = next(i for i in stores if sources[i.orig_pos] == loads[0].unpkd.offset)
+    rewrite = {i.orig_pos: NOP for i in matched}
+    rewrite[loads[0].orig_pos] = pack_instruction(LOAD48, reg, loads[0].unpkd.src, lower)
+    rewrite[store.orig_pos] = pack_instruction(STORE48, store.unpkd.dst, reg, lower + delta)
+    return rewrite
+
+
+def zero_mov(peephole, instr, matched):
+    return instr.unpkd.immediate == 0
+
+
+def zero_store(peephole, instr, matched):
+    # This method returns True if instr stores the zeroed register (the immediate 0) to stack bytes still zero
+
+    unpkd = instr.unpkd
+    zero = unpkd.src == matched[0].unpkd.dst if matched else unpkd.immediate == 0
+    return zero and unpkd.dst == STACK_REG and peephole.zeroed(instr)
+
+
+def zero_gap(peephole, instr, matched):
+    # This method returns True if instr does not write the zeroed register (helper calls clobber it)
+
+    return not is_call(instr.unpkd) and not instr.defines(matched[0].unpkd.dst)
+
+
+def memset_zero(peephole, matched):
+    # This method removes the stores of zero to the stack bytes still zero, and the zeroing of the register if it is
+    # read only by them
+
+    rewrite = {i.orig_pos: NOP for i in matched[1:]}
+    mov = matched[0]
+    if set(peephole.def_use.get((mov.orig_pos, mov.unpkd.dst), [])) <= set(rewrite):
+        rewrite[mov.orig_pos] = NOP
+    return rewrite
+
+
+def zero_imm_store(peephole, matched):
+    return {matched[0].orig_pos: NOP}
+
+
+# Sephirot fusions and memory zeroing removal, tried in order on each instruction
+PATTERNS = [
+    # rX = *(u16 *)(rA + o); *(u16 *)(rB + o + d) = rX; ... (3 pairs of u16, 6 of u8)
+    pattern("load-store48",
+            group(step(LOAD_TO_SIZE48, copy_load), step(STORE_TO_SIZE48, copy_store), count=copy_count),
+            rewrite=memcpy48),
+    # rX = *(u16 *)(rA + o); ...; (instructions not accessing the loaded registers); *(u16 *)(rB + o + d) = rX; ...
+    pattern("load48-store48",
+            group(step(LOAD_TO_SIZE48, copy_load), count=copy_count),
+            group(step(STORE_TO_SIZE48, copy_store), count=copy_count, gap=copy_gap),
+            rewrite=memcpy48),
+    # rX = 0; ...; *(u64 *)(r10 - o) = rX; ... (stack bytes never written)
+    pattern("memset-zero",
+            group(step({MOV_IMM, MOV32_IMM}, zero_mov)),
+            group(step(STX_MEM, zero_store), count=None, gap=zero_gap),
+            rewrite=memset_zero),
+    # *(u64 *)(r10 - o) = 0 (stack bytes never written)
+    pattern("zero-store",
+            group(step(ST_MEM, zero_store)),
+            rewrite=zero_imm_store),
+]
+
+
+class Peephole:
+    # Table-driven peephole optimizer: each pattern (see Pattern) is a sequence of groups of instruction steps, with
+    # opcodes and guards, and a rewrite of the matched instructions. The patterns are indexed by the opcodes of their
+    # first instruction, and matched in a single pass over each basic block: at each instruction only the patterns
+    # starting with its opcode are tried, an instruction is rewritten by one pattern at most. The stack is zeroed for
+    # each packet by Sephirot: the stack bytes never written by the instructions before (in program order, which
+    # includes all the paths since the CFG is acyclic) are zero. The def-use chains and the stack pointers at the
+    # entry of the blocks (stack_in) must be up to date
+
+    def __init__(self, blocks, def_use, patterns=PATTERNS):
+        self.blocks = blocks
+        self.def_use = def_use
+        self.table = {}  # opcode -> patterns starting with it
+        for p in patterns:
+            for opcode in p.groups[0].steps[0].opcodes:
+                self.table.setdefault(opcode, []).append(p)
+        self.written = {}  # global id -> stack bytes which may be written before the instruction
+        self.stack = {}  # global id -> bitmask of the registers which may hold a stack pointer before the instruction
+        self.matched = {p.name: 0 for p in patterns}  # pattern -> # of rewrites
+
+    def run(self):
+        # This method returns the rewritten instructions (global id -> new instruction)
+
+        self.__compute_stack_writes()
+        rewrites = {}
+        for blck in self.blocks:
+            if blck.type != BlockType.BASIC:
+                continue
+            for i, instr in enumerate(blck.instructions):
+                if instr.orig_pos in rewrites:
+                    continue
+                for p in self.table.get(instr.unpkd.opcode, ()):
+                    matched = self.__match(p, blck.instructions, i, rewrites)
+                    rewrite = p.rewrite(self, matched) if matched is not None else None
+                    if rewrite:
+                        rewrites.update(rewrite)
+                        self.matched[p.name] += 1
+                        break
+        return rewrites
+
+    def zeroed(self, instr):
+        # This method returns True if the stack bytes written by instr are zero before it
+
+        base, off, size, reads, writes = get_mem_access(instr.unpkd)
+        accessed = stack_bytes(off, size)
+        return accessed is not None and not self.written[instr.orig_pos] & accessed
+
+    def disjoint(self, load, store):
+        # This method returns True if the memory read by load and the memory written by store are disjoint: one is
+        # addressed by r10, the other by a register which does not point to the stack
+
+        return load.unpkd.src == STACK_REG and not self.stack[store.orig_pos] >> store.unpkd.dst & 1 or \
+            store.unpkd.dst == STACK_REG and not self.stack[load.orig_pos] >> load.unpkd.src & 1
+
+    def __match(self, p, instrs, start, rewrites):
+        # This method returns the instructions matched by the pattern p from instrs[start] (without the gaps), None if
+        # it does not match. The instructions already rewritten match nothing
+
+        matched = []
+        i = start
+        for g in p.groups:
+            n = 0
+            while True:
+                found = self.__match_steps(g.steps, instrs, i, matched, rewrites)
+                if found is None:
+                    if n == 0 and g.gap is not None and matched and i < len(instrs) and \
+                            instrs[i].orig_pos not in rewrites and g.gap(self, instrs[i], matched):
+                        i += 1
+                        continue
+                    if n == 0 or g.count is not None:
+                        return None
+                    break
+                matched.extend(found)
+                i += len(found)
+                n += 1
+                count = g.count(matched) if callable(g.count) else g.count
+                if n == count:
+                    break
+        return matched
+
+    def __match_steps(self, steps, instrs, i, matched, rewrites):
+        # This method returns the instructions from instrs[i] matching the steps, None if they do not match
+
+        found = []
+        for s in steps:
+            if i + len(found) >= len(instrs):
+                return None
+            instr = instrs[i + len(found)]
+            if instr.orig_pos in rewrites or instr.unpkd.opcode not in s.opcodes or \
+                    s.guard is not None and not s.guard(self, instr, matched + found):
+                return None
+            found.append(instr)
+        return found
+
+    def __compute_stack_writes(self):
+        # This method computes the stack bytes which may be written before each instruction, in program order:
+        # helper calls writing the stack and the stores through a stack pointer out of r10 may write all of it. The
+        # registers which may hold a stack pointer before each instruction are recorded too
+
+        written = 0
+        for blck in sorted((b for b in self.blocks if b.type == BlockType.BASIC and b.instructions),
+                           key=lambda b: b.instructions[0].orig_pos):
+            mask = blck.stack_in
+            for instr in blck.instructions:
+                self.written[instr.orig_pos] = written
+                self.stack[instr.orig_pos] = mask
+                unpkd = instr.unpkd
+                access = get_mem_access(unpkd)
+                if is_call(unpkd):
+                    if helper(unpkd.immediate).writes & MemKind.STACK:
+                        written = ALL_STACK
+                elif access is not None and access[4]:
+                    base, off, size = access[:3]
+                    accessed = stack_bytes(off, size) if base == STACK_REG else None
+                    if accessed is not None:
+                        written |= accessed
+                    elif base == STACK_REG or base is not None and mask >> base & 1:
+                        written = ALL_STACK
+                mask = stack_transfer(mask, unpkd)
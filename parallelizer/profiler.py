@@ -0,0 +1,26 @@
+import argparse, os
+from elf_reader import is_elf_file, read_elf_file
+from file_reader import read_file
+from block_profile import profile_traces, write_profile
+
+parser = argparse.ArgumentParser(description='Profile eBPF program blocks on packet traces')
+parser.add_argument('-i', '--input', type=str, required=True, help='eBPF dump (llvm-objdump -d) or BPF object input file name')
+parser.add_argument('-s', '--section', type=str, help='program section, for BPF object inputs')
+parser.add_argument('-t', '--traces', type=str, nargs='+', required=True, help='pcap files replayed through the program')
+parser.add_argument('-n', '--packets', type=int, help='max # of packets replayed')
+parser.add_argument('-o', '--output', type=str, help='profile file name')
+
+args = parser.parse_args()
+in_file = args.input
+
+out_file = os.path.splitext(args.input)[0]+".prof" if args.output is None else args.output
+
+if is_elf_file(in_file):
+    program_bin, _ = read_elf_file(in_file, args.section)
+else:
+    program_bin, _ = read_file(in_file)
+
+profile = profile_traces(os.path.basename(os.path.splitext(args.input)[0]), program_bin, args.traces,
+                         max_packets=args.packets)
+
+write_profile(out_file, profile)
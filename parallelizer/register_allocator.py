@@ -0,0 +1,142 @@
+class Webs:
+    # Values of a program: the definitions (global id, reg) reaching a common use are merged (union-find), each value
+    # is then a web of definitions and uses which must live in a single register
+
+    def __init__(self):
+        self.parent = {}  # definition -> parent definition
+
+    def add(self, d):
+        self.parent.setdefault(d, d)
+
+    def find(self, d):
+        root = d
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[d] != root:  # path compression
+            self.parent[d], d = root, self.parent[d]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)  # the earliest definition names the web
+        return min(ra, rb)
+
+    def roots(self):
+        return sorted(set(self.find(d) for d in self.parent))
+
+
+class RegisterAllocator:
+    # Graph coloring register allocation of a scheduled program. Nodes are the values (webs) of the program, their
+    # live ranges are computed by a backward liveness over the rows of the resource table (following its jumps, rows
+    # read their inputs before writing their outputs): a value defined in a row interferes with the values live out of
+    # the row and with the other values written until its output is written (latency). Values constrained by the ABI
+    # are precolored, the others are colored Chaitin-Briggs style (simplify, then select), preferring their
+    # original register. There is no spilling: allocate returns None if the values do not fit the registers
+
+    def __init__(self, n_rows, colors):
+        self.n_rows = n_rows
+        self.colors = colors  # registers available to the values not precolored
+        self.succ = [[] for _ in range(n_rows)]  # row -> rows executed next
+        self.defs = [0] * n_rows  # row -> bitmask of the values written
+        self.uses = [0] * n_rows  # row -> bitmask of the values read
+        self.latency = {}  # (value, row) -> rows to write the value
+        self.values = {}  # web -> value id (bit)
+        self.webs = []  # value id -> web
+        self.fixed = {}  # value id -> register (precolored)
+        self.prefer = {}  # value id -> original register
+
+    def value(self, web, reg):
+        # This method returns the id of the value of a web (reg: its original register)
+
+        if web not in self.values:
+            self.values[web] = len(self.webs)
+            self.webs.append(web)
+            self.prefer[self.values[web]] = reg
+        return self.values[web]
+
+    def fix(self, web, reg):
+        self.fixed[self.value(web, reg)] = reg
+
+    def add_flow(self, row, succ):
+        if 0 <= succ < self.n_rows and succ not in self.succ[row]:
+            self.succ[row].append(succ)
+
+    def add_use(self, row, web, reg):
+        self.uses[row] |= 1 << self.value(web, reg)
+
+    def add_def(self, row, web, reg, latency=1):
+        v = self.value(web, reg)
+        self.defs[row] |= 1 << v
+        self.latency[v, row] = max(latency, self.latency.get((v, row), 1))
+
+    def allocate(self):
+        # This method returns the register of each web, None if no coloring was found
+
+        # precolored values keep their order in the schedule (no renaming between them): only the others are colored
+        adj = self.__interference()
+
+        # simplify: remove the nodes with less neighbors than colors, if none the one with most neighbors (optimistic)
+        k = len(self.colors)
+        degree = {v: bin(adj[v]).count("1") for v in range(len(self.webs)) if v not in self.fixed}
+        removed, stack = 0, []
+        while degree:
+            v = min(degree, key=lambda x: (degree[x] >= k, -degree[x] if degree[x] >= k else 0, x))
+            stack.append(v)
+            removed |= 1 << v
+            del degree[v]
+            for u in self.__bits(adj[v] & ~removed):
+                if u in degree:
+                    degree[u] -= 1
+
+        # select: the original register if free, otherwise the first free
+        color = dict(self.fixed)
+        while stack:
+            v = stack.pop()
+            busy = set(color[u] for u in self.__bits(adj[v]) if u in color)
+            free = [reg for reg in self.colors if reg not in busy]
+            if not free:
+                return None
+            color[v] = self.prefer[v] if self.prefer[v] in free else free[0]
+        return {self.webs[v]: color[v] for v in color}
+
+    def __interference(self):
+        # This method returns the interference graph (value -> bitmask of the interfering values)
+
+        live_out = [0] * self.n_rows
+        live_in = [0] * self.n_rows
+        for row in reversed(range(self.n_rows)):  # jumps go forward: a single pass is enough
+            out = 0
+            for s in self.succ[row]:
+                out |= live_in[s]
+            live_out[row] = out
+            live_in[row] = self.uses[row] | out & ~self.defs[row]
+
+        # values being written (latency > 1): busy in the rows reached before their write
+        writing = [0] * self.n_rows
+        for (v, row), latency in self.latency.items():
+            frontier = [row]
+            for _ in range(latency - 1):
+                frontier = [s for r in frontier for s in self.succ[r]]
+                for r in frontier:
+                    writing[r] |= 1 << v
+
+        adj = [0] * len(self.webs)
+        for row in range(self.n_rows):
+            busy = live_out[row] | writing[row] | self.defs[row]
+            for v in self.__bits(self.defs[row]):
+                adj[v] |= busy
+            for v in self.__bits(writing[row]):
+                adj[v] |= self.defs[row]
+        for v in range(len(self.webs)):
+            adj[v] &= ~(1 << v)
+            for u in self.__bits(adj[v]):
+                adj[u] |= 1 << v
+        return adj
+
+    @staticmethod
+    def __bits(mask):
+        while mask:
+            low = mask & -mask
+            yield low.bit_length() - 1
+            mask ^= low
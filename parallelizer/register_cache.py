@@ -1,3 +1,6 @@
+import heapq
+from bisect import bisect_left, insort
+
 REG = "reg"
 ORIG_DEF = "orig_def"
 ORG_LIVE = "orig_live"
@@ -6,59 +9,117 @@ ROW_LIVE = "row_live"
 
 
 class RegisterCache:
+    # Live ranges of the registers written by the scheduled instructions: {reg, orig_def, orig_live, row_def,
+    # row_live}, row_live is None until the last use is scheduled (open range). The ranges are indexed by register: the
+    # open ones in a set, the closed ones in a list sorted by row_live, so that the queries on a register are
+    # logarithmic in its ranges. Ranges are dropped when the block of their last use is done (orig_live heap)
+
     def __init__(self):
-        self.reg_cache = []  # [{reg, orig_def, orig_live, row_def, row_live}]
+        self.ranges = {}  # id -> range
+        self.next_id = 0
+        self.by_def = {}  # (reg, orig_def, row_def) -> id
+        self.open = {}  # reg -> ids of the open ranges
+        self.closed = {}  # reg -> [(row_live, id)] sorted
+        self.pending = {}  # (reg, orig_live) -> ids of the open ranges ending at the use orig_live
+        self.by_last_use = []  # heap of (orig_live, id)
 
     def get_conflicting(self, reg, from_row):
+        # This method returns a range of reg live after from_row (an open one, otherwise the one ending last), None if
+        # reg is free from from_row
 
-        for i in reversed(self.reg_cache):
-            if i[REG] == reg and (i[ROW_LIVE] is None or i[ROW_LIVE] > from_row):
-                return i
+        if self.open.get(reg):
+            return self.ranges[max(self.open[reg])]
+        closed = self.closed.get(reg)
+        if closed and closed[-1][0] > from_row:
+            return self.ranges[closed[-1][1]]
         return None
 
     def get_reg_pending(self, reg, from_row):
+        # This method returns a range of reg live at from_row (an open one, otherwise the one ending first), None if
+        # reg is free at from_row
 
-        for i in self.reg_cache:
-            if i[REG] == reg and (i[ROW_LIVE] is None or i[ROW_LIVE] >= from_row):
-                return i
-        return None
+        if self.open.get(reg):
+            return self.ranges[min(self.open[reg])]
+        closed = self.closed.get(reg, [])
+        i = bisect_left(closed, (from_row, -1))
+        return self.ranges[closed[i][1]] if i < len(closed) else None
 
     def put_reg_wr(self, reg, orig_def, orig_live, row_def, row_live):
-        for i in self.reg_cache:
-            if i[REG] == reg and row_def == i[ROW_DEF] and orig_def == i[ORIG_DEF]:
-                i[ROW_LIVE] = row_live
-                return
-        self.reg_cache.append({REG: reg,
-                               ORIG_DEF: orig_def,
-                               ORG_LIVE: orig_live,
-                               ROW_DEF: row_def,
-                               ROW_LIVE: row_live})
+        key = (reg, orig_def, row_def)
+        if key in self.by_def:
+            self.__set_row_live(self.by_def[key], row_live)
+            return
+
+        i = self.next_id
+        self.next_id += 1
+        self.ranges[i] = {REG: reg, ORIG_DEF: orig_def, ORG_LIVE: orig_live, ROW_DEF: row_def, ROW_LIVE: None}
+        self.by_def[key] = i
+        heapq.heappush(self.by_last_use, (orig_live, i))
+        self.__index(i)
+        self.__set_row_live(i, row_live)
 
     def ch_reg_name(self, old_reg, new_reg, orig_def, row_def):
-        for i in self.reg_cache:
-            if i[REG] == old_reg and row_def == i[ROW_DEF] and orig_def == i[ORIG_DEF]:
-                i[REG] = new_reg
-                return
+        i = self.by_def.get((old_reg, orig_def, row_def))
+        if i is None:
+            return
+        self.__unindex(i)
+        del self.by_def[old_reg, orig_def, row_def]
+        self.ranges[i][REG] = new_reg
+        self.by_def[new_reg, orig_def, row_def] = i
+        self.__index(i)
 
     def put_reg_rd(self, regs, row, orig_pos):
         for reg in regs:
-            confl = self.get_reg_pending(reg, row)
-
-            if confl is not None and confl[ORG_LIVE] == orig_pos:
-                if confl[ROW_LIVE] is None:
-                    confl[ROW_LIVE] = row
+            for i in list(self.pending.get((reg, orig_pos), ())):  # a use at a join may end the values of more paths
+                self.__set_row_live(i, row)
 
     def change_block(self, blck_end):
-        new_cache = []
-        for i in self.reg_cache:
-            if i[ORG_LIVE] > blck_end:
-                new_cache.append(i)
-
-        self.reg_cache = new_cache
+        while self.by_last_use and self.by_last_use[0][0] <= blck_end:
+            i = heapq.heappop(self.by_last_use)[1]
+            self.__unindex(i)
+            r = self.ranges.pop(i)
+            del self.by_def[r[REG], r[ORIG_DEF], r[ROW_DEF]]
 
     def get_unavailable(self, from_row):
-        unav = []
-        for i in self.reg_cache:
-            if (i[ROW_LIVE] is None or i[ROW_LIVE] > from_row) and i[REG] not in unav:
-                unav.append(i["reg"])
-        return unav
+        return [reg for reg in sorted(set(self.open) | set(self.closed))
+                if self.get_conflicting(reg, from_row) is not None]
+
+    def snapshot(self):
+        # This method returns a copy of the ranges, see restore
+
+        return [dict(self.ranges[i]) for i in sorted(self.ranges)]
+
+    def restore(self, snapshot):
+        # This method replaces the ranges with a snapshot
+
+        self.__init__()
+        for r in snapshot:
+            self.put_reg_wr(r[REG], r[ORIG_DEF], r[ORG_LIVE], r[ROW_DEF], r[ROW_LIVE])
+
+    def __set_row_live(self, i, row_live):
+        self.__unindex(i)
+        self.ranges[i][ROW_LIVE] = row_live
+        self.__index(i)
+
+    def __index(self, i):
+        r = self.ranges[i]
+        if r[ROW_LIVE] is None:
+            self.open.setdefault(r[REG], set()).add(i)
+            self.pending.setdefault((r[REG], r[ORG_LIVE]), set()).add(i)
+        else:
+            insort(self.closed.setdefault(r[REG], []), (r[ROW_LIVE], i))
+
+    def __unindex(self, i):
+        r = self.ranges[i]
+        if r[ROW_LIVE] is None:
+            self.open[r[REG]].discard(i)
+            if not self.open[r[REG]]:
+                del self.open[r[REG]]
+            self.pending[r[REG], r[ORG_LIVE]].discard(i)
+            if not self.pending[r[REG], r[ORG_LIVE]]:
+                del self.pending[r[REG], r[ORG_LIVE]]
+        else:
+            closed = self.closed[r[REG]]
+            del closed[bisect_left(closed, (r[ROW_LIVE], i))]
+            if not closed:
+                del self.closed[r[REG]]
@@ -0,0 +1,100 @@
+class ResourceTable:
+    # VLIW resource table of the scheduler: each row (clock cycle) has a slot for each lane. Occupancy is kept as
+    # bitmasks, per row over the lanes (free lane of a row in O(1)) and per lane over the rows, together with the
+    # bitmask of the full rows (first free row from a row with a single big integer scan). Rows are allocated on
+    # demand, rows not allocated yet are empty. Rows are read as lists (row[lane] is the instruction or None) and
+    # must be modified only by place/remove/clear_row
+
+    __slots__ = ("n_lanes", "rows", "masks", "lane_rows", "full_rows", "full_mask")
+
+    def __init__(self, n_lanes, n_rows=0):
+        self.n_lanes = n_lanes
+        self.rows = []  # row -> [instruction or None for each lane]
+        self.masks = []  # row -> bitmask of the busy lanes
+        self.lane_rows = [0] * n_lanes  # lane -> bitmask of the rows where it is busy
+        self.full_rows = 0  # bitmask of the rows with all the lanes busy
+        self.full_mask = (1 << n_lanes) - 1
+        self.grow(n_rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, row):
+        return self.rows[row]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def grow(self, n_rows):
+        # This method allocates the rows up to n_rows (excluded)
+
+        while len(self.rows) < n_rows:
+            self.rows.append([None] * self.n_lanes)
+            self.masks.append(0)
+
+    def trim(self, n_rows):
+        # This method drops the rows from n_rows on
+
+        del self.rows[n_rows:]
+        del self.masks[n_rows:]
+        keep = (1 << n_rows) - 1
+        self.lane_rows = [busy & keep for busy in self.lane_rows]
+        self.full_rows &= keep
+
+    def place(self, row, lane, instr):
+        # This method puts instr in the slot (row, lane), replacing its instruction if any
+
+        if row >= len(self.rows):
+            self.grow(max(row + 1, 2 * len(self.rows)))
+        self.rows[row][lane] = instr
+        if not self.masks[row] >> lane & 1:
+            self.masks[row] |= 1 << lane
+            self.lane_rows[lane] |= 1 << row
+            if self.masks[row] == self.full_mask:
+                self.full_rows |= 1 << row
+
+    def remove(self, row, lane):
+        # This method frees the slot (row, lane)
+
+        if row < len(self.rows) and self.masks[row] >> lane & 1:
+            self.rows[row][lane] = None
+            self.masks[row] &= ~(1 << lane)
+            self.lane_rows[lane] &= ~(1 << row)
+            self.full_rows &= ~(1 << row)
+
+    def clear_row(self, row):
+        # This method frees all the slots of the row
+
+        for lane in range(self.n_lanes):
+            self.remove(row, lane)
+
+    def is_free(self, row, lane):
+        return row >= len(self.rows) or not self.masks[row] >> lane & 1
+
+    def n_free(self, row):
+        # This method returns the # of free lanes of the row
+
+        return self.n_lanes - bin(self.masks[row]).count("1") if row < len(self.rows) else self.n_lanes
+
+    def free_lane(self, row):
+        # This method returns the first free lane of the row, None if the row is full
+
+        free = ~self.masks[row] & self.full_mask if row < len(self.rows) else self.full_mask
+        return (free & -free).bit_length() - 1 if free else None
+
+    def first_free_row(self, row):
+        # This method returns the first row, from row on, with a free lane
+
+        return row + self.__lowest_zero(self.full_rows >> row)
+
+    def first_free_row_on_lane(self, row, lane):
+        # This method returns the first row, from row on, where lane is free
+
+        return row + self.__lowest_zero(self.lane_rows[lane] >> row)
+
+    @staticmethod
+    def __lowest_zero(bits):
+        # This method returns the position of the lowest bit not set
+
+        free = ~bits
+        return (free & -free).bit_length() - 1
@@ -0,0 +1,100 @@
+import argparse, contextlib, io, itertools, os
+from concurrent.futures import ProcessPoolExecutor
+from elf_reader import is_elf_file, read_elf_file
+from file_reader import read_file
+from machine import Machine, OpClass, DEFAULT_BRANCH_LANE
+from optimizer_core import Optimizer
+import TableIt
+
+# bounds checks removed: none, the redundant ones (packet bounds analysis), also the ones protected by the hardware
+BOUNDS_CHECKS = {'keep': dict(bounds_analysis=False, remove_mem_boundary_checks=False),
+                 'redundant': dict(bounds_analysis=True, remove_mem_boundary_checks=False),
+                 'protected': dict(bounds_analysis=True, remove_mem_boundary_checks=True)}
+
+
+def compile_program(path, machine, checks='redundant'):
+    # This method compiles the program in path for machine (in a worker process), removing the bounds checks
+    # BOUNDS_CHECKS[checks], and returns the # of rows of its schedule, None if the compilation failed
+
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            program_bin = read_elf_file(path, None)[0] if is_elf_file(path) else read_file(path)[0]
+            parallelizer = Optimizer(program_bin, filename=os.path.splitext(path)[0], machine=machine,
+                                     debug_print_resource_table=False, **BOUNDS_CHECKS[checks])
+            parallelizer.optimize()
+        return len(parallelizer.resource_table)
+    except (Exception, SystemExit):
+        return None
+
+
+def machine_grid(args):
+    # This method returns the machines of the grid (without duplicates, e.g. a single lane is also the branch lane),
+    # lanes varying fastest
+
+    machines = []
+    for branch, forwarding, load_latency, lanes in itertools.product(args.branch_lanes, args.forwarding,
+                                                                     args.load_latency, args.lanes):
+        machine = Machine(n_lanes=lanes, branch_lanes=None if branch == 'all' else [DEFAULT_BRANCH_LANE],
+                          lane_forward_constraint=forwarding == 'lane', imem_rows=args.imem_rows,
+                          latencies={OpClass.LOAD: load_latency})
+        if machine not in machines:
+            machines.append(machine)
+    return machines
+
+
+def column_label(machine, checks, args):
+    # This method returns the label of the column of machine with the bounds checks removed checks
+
+    return machine.label() + (" " + checks if len(args.bounds_checks) > 1 else "")
+
+
+def write_table(filename, programs, machines, labels, rows):
+    # This method writes the rows of each program on each machine (csv, a column for each machine and bounds checks
+    # removed) with the total and the # of programs fitting the instruction memory
+
+    with open(filename, 'w') as file:
+        file.write(",".join(["program"] + labels) + "\n")
+        for program in programs:
+            file.write(",".join([program] + [str(rows[program, m]) if rows[program, m] is not None else "ERR"
+                                             for m in range(len(machines))]) + "\n")
+        file.write(",".join(["total"] + [str(sum(rows[p, m] for p in programs if rows[p, m] is not None))
+                                         for m in range(len(machines))]) + "\n")
+        file.write(",".join(["fits"] + [str(sum(1 for p in programs if rows[p, m] is not None and
+                                                rows[p, m] <= machines[m].imem_rows)) for m in range(len(machines))]))
+
+
+parser = argparse.ArgumentParser(description='Compile a corpus of eBPF programs for a grid of Sephirot machines')
+parser.add_argument('-d', '--dir', type=str, default=os.path.join(os.path.dirname(__file__), 'xdp_prog_dump'),
+                    help='directory of the eBPF dumps (llvm-objdump -d) or BPF objects')
+parser.add_argument('-l', '--lanes', type=int, nargs='+', default=[1, 2, 3, 4, 6, 8], help='# of lanes')
+parser.add_argument('-b', '--branch-lanes', type=str, nargs='+', choices=['first', 'all'], default=['first'],
+                    help='lanes executing branches: the first lane only or all the lanes')
+parser.add_argument('-f', '--forwarding', type=str, nargs='+', choices=['lane', 'any'], default=['lane'],
+                    help='back to back depending instructions on the same lane only or on any lane')
+parser.add_argument('-L', '--load-latency', type=int, nargs='+', default=[1], help='latency (rows) of memory loads')
+parser.add_argument('-r', '--imem-rows', type=int, default=Machine().imem_rows, help='rows of the instruction memory')
+parser.add_argument('-c', '--bounds-checks', type=str, nargs='+', choices=list(BOUNDS_CHECKS), default=['redundant'],
+                    help='bounds checks removed: none, the redundant ones or also the ones protected by the hardware')
+parser.add_argument('-j', '--jobs', type=int, help='# of worker processes (default: # of cpus)')
+parser.add_argument('-o', '--output', type=str, default='sweep.csv', help='rows table (csv) file name')
+
+if __name__ == '__main__':
+    args = parser.parse_args()
+
+    programs = sorted(f for f in os.listdir(args.dir) if os.path.isfile(os.path.join(args.dir, f)))
+    grid = [(machine, checks) for machine in machine_grid(args) for checks in args.bounds_checks]
+    machines = [machine for machine, _ in grid]
+    labels = [column_label(machine, checks, args) for machine, checks in grid]
+
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        jobs = {(program, m): pool.submit(compile_program, os.path.join(args.dir, program), *grid[m])
+                for program in programs for m in range(len(grid))}
+        rows = {key: job.result() for key, job in jobs.items()}
+
+    write_table(args.output, programs, machines, labels, rows)
+
+    tab = [["program"] + labels]
+    for program in programs:
+        tab.append([program] + [rows[program, m] if rows[program, m] is not None else "ERR"
+                                for m in range(len(machines))])
+    TableIt.printTable(tab, useFieldNames=True)
@@ -1,6 +1,7 @@
 from file_reader import read_file
 from file_writer import write_program_to_file
 from optimizer_core import Optimizer
+from machine import Machine
 from os import listdir
 from os.path import isfile, join
 from ebpf_parser import *
@@ -56,13 +57,13 @@ def print_program(program):
 
 for file in files:
     print("====================================================")
-    program_bin, program_str = read_file("xdp_prog_dump/" + file)
+    program_bin, _ = read_file("xdp_prog_dump/" + file)
 
     print("File: " + file)
     print(" ~ with constraints")
 
-    parallelizer = Optimizer(program_bin, program_str, filename=file, branch_all_lanes=True,
-                             lane_forward_constraint=True, debug_print_blocks_pre_sched=True,
+    parallelizer = Optimizer(program_bin, filename=file, machine=Machine(lane_forward_constraint=True),
+                             debug_print_blocks_pre_sched=True,
                              debug_print_blocks_pre_opt=False, debug_draw_cfg=True)
 
     parallelizer.optimize()
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+from ebpf_interpreter import EBPFInterpreter
+from ebpf_parser import XDPAction
+from block_profile import profile_from_interpreter, write_profile, read_profile
+
+# r2 = *(u32 *)(r1 + 0), r3 = *(u32 *)(r1 + 4), r2 += 14, r0 = 1, if r2 > r3 goto +1, r0 = 2, exit
+PROGRAM = [0x6112000000000000, 0x6113040000000000, 0x070200000e000000, 0xb700000001000000, 0x2d32010000000000,
+           0xb700000002000000, 0x9500000000000000]
+
+
+class BlockProfileTestCases(unittest.TestCase):
+    def setUp(self):
+        self.interpreter = EBPFInterpreter(PROGRAM)
+        self.assertEqual(self.interpreter.run(bytes(64)), XDPAction.PASS)
+        self.assertEqual(self.interpreter.run(bytes(10)), XDPAction.DROP)  # shorter than the ethernet header
+        self.assertEqual(self.interpreter.run(bytes(60)), XDPAction.PASS)
+
+    def test_interpreter_counts(self):
+        self.assertEqual(self.interpreter.packets, 3)
+        self.assertEqual(self.interpreter.counts[0], 3)
+        self.assertEqual(self.interpreter.counts[5], 2)
+        self.assertEqual(self.interpreter.taken[4], 1)
+
+    def test_profile_roundtrip(self):
+        fd, filename = tempfile.mkstemp(suffix=".prof")
+        os.close(fd)
+        try:
+            write_profile(filename, profile_from_interpreter("test", PROGRAM, self.interpreter))
+            profile = read_profile(filename)
+        finally:
+            os.remove(filename)
+
+        profile.check(PROGRAM)
+        self.assertEqual(profile.packets, 3)
+        self.assertEqual(profile.actions, {XDPAction.PASS: 2, XDPAction.DROP: 1})
+        self.assertEqual(profile.leaders, [0, 5, 6])
+        self.assertEqual([profile.count(pos) for pos in range(len(PROGRAM))], [3, 3, 3, 3, 3, 2, 3])
+        self.assertEqual(profile.branch(4), (1, 2))
+
+        # captured on another program
+        with self.assertRaises(SystemExit):
+            profile.check(PROGRAM[:-1] + [0x9500000000000000, 0x9500000000000000])
+
+
+if __name__ == '__main__':
+    unittest.main()
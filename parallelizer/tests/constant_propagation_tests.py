@@ -0,0 +1,53 @@
+import unittest
+from ebpf_parser import NOP
+from ebpf_interpreter import EBPFInterpreter
+from programs import optimize, assemble_program
+
+# the constant operand of r3 += r2 becomes an immediate, r2 = 14 is removed
+FOLD_OPERAND = ["r2 = 14", "r3 = r1", "r3 += r2", "r0 = r3", "exit"]
+
+# the branch is never taken: removed with the code it jumps to and the definition of r2
+NEVER_TAKEN = ["r2 = 1", "if r2 == 0 goto +2", "r0 = 1", "exit", "r0 = 2", "exit"]
+
+# r2 is 5 when the branch is not taken
+EQUALITY = ["r2 = *(u32 *)(r1 + 0)", "if r2 != 5 goto +2", "r0 = r2", "exit", "r0 = 2", "exit"]
+
+# r0 *= r6 becomes r0 *= 1, removed as an identity: the load it reads still defines r0 for r0 &= 3
+IDENTITY = ["r6 = 1", "r2 = *(u32 *)(r1 + 0)", "r0 = *(u32 *)(r2 + 17)", "r0 *= r6", "r0 &= 3", "exit"]
+
+PACKET = bytes(range(64))
+
+
+class ConstantPropagationTestCases(unittest.TestCase):
+    def test_fold_operand(self):
+        optimizer = optimize(FOLD_OPERAND)
+        self.assertEqual(optimizer.constants_folded, 1)
+        self.assertEqual(optimizer.constants_removed, 1)
+        self.assertEqual(optimizer.program_bin[0], NOP)
+
+        optimizer = optimize(FOLD_OPERAND, constant_propagation=False)
+        self.assertEqual(optimizer.constants_folded, 0)
+        self.assertNotEqual(optimizer.program_bin[0], NOP)
+
+    def test_never_taken_branch(self):
+        optimizer = optimize(NEVER_TAKEN)
+        self.assertEqual(optimizer.branches_folded, 1)
+        self.assertEqual(optimizer.constants_removed, 4)  # the branch, r2 = 1 and the unreachable block
+        self.assertEqual(optimizer.program_bin[4:], [NOP, NOP])
+        self.assertNotIn(5, optimizer.exits_indexes)
+
+    def test_equality(self):
+        optimizer = optimize(EQUALITY)
+        self.assertEqual(optimizer.constants_folded, 1)
+        self.assertEqual(optimizer.constants_removed, 0)
+
+    def test_identity(self):
+        program = assemble_program(IDENTITY)
+        optimizer = optimize(IDENTITY)
+        self.assertEqual(optimizer.program_bin[3], NOP)
+        self.assertNotEqual(optimizer.program_bin[2], NOP)
+        self.assertEqual(EBPFInterpreter(optimizer.program_bin).run(PACKET), EBPFInterpreter(program).run(PACKET))
+
+
+if __name__ == '__main__':
+    unittest.main()
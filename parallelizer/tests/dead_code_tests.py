@@ -0,0 +1,41 @@
+import unittest
+from programs import optimize
+
+# r3 is never read: its definitions and the load they read are dead
+DEAD_CHAIN = ["r2 = *(u32 *)(r1 + 0)", "r3 = r2", "r3 |= r1", "r0 = 2", "exit"]
+
+# the first store is overwritten before being read
+OVERWRITTEN = ["*(u64 *)(r10 - 8) = r1", "*(u64 *)(r10 - 8) = r2", "r0 = *(u64 *)(r10 - 8)", "exit"]
+
+# the map lookup reads its key at r10 - 4 (the bytes above the pointer), r10 - 8 is never read
+HELPER_KEY = ["r6 = r1", "*(u32 *)(r10 - 4) = r6", "*(u32 *)(r10 - 8) = r6", "r2 = r10", "r2 += -4", "r1 = 0",
+              "call 1", "r0 = 2", "exit"]
+
+
+class DeadCodeTestCases(unittest.TestCase):
+    def test_dead_chain(self):
+        optimizer = optimize(DEAD_CHAIN)
+        self.assertEqual(optimizer.dead_removed, 3)
+        self.assertEqual(optimizer.program_bin[:3], [0, 0, 0])
+
+        # the load may be a packet access protecting a removed bounds check
+        optimizer = optimize(DEAD_CHAIN, remove_mem_boundary_checks=True)
+        self.assertEqual(optimizer.dead_removed, 2)
+
+        optimizer = optimize(DEAD_CHAIN, dead_code_elimination=False)
+        self.assertEqual(optimizer.dead_removed, 0)
+
+    def test_overwritten_store(self):
+        optimizer = optimize(OVERWRITTEN)
+        self.assertEqual(optimizer.dead_stores_removed, 1)
+        self.assertEqual(optimizer.program_bin[0], 0)
+
+    def test_helper_stack_arguments(self):
+        optimizer = optimize(HELPER_KEY, advanced_optimizations=False)
+        self.assertEqual(optimizer.dead_stores_removed, 1)
+        self.assertEqual(optimizer.program_bin[2], 0)
+        self.assertNotEqual(optimizer.program_bin[1], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
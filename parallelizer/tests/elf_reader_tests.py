@@ -0,0 +1,69 @@
+import os
+import tempfile
+import unittest
+from elf_reader import *
+
+# xdp section: r1 = map ll, call 1, r0 = 2, exit
+XDP_CODE = bytes.fromhex("1801000000000000" "0000000000000000" "8500000001000000" "b700000002000000"
+                         "9500000000000000")
+
+
+def build_bpf_object():
+    # minimal relocatable BPF object: xdp program section, its relocation section, maps and symbol table
+
+    shstrtab = b"\0.shstrtab\0.strtab\0xdp\0.relxdp\0maps\0.symtab\0"
+    strtab = b"\0xdp_prog\0counters\0"
+    symtab = SYMBOL.pack(0, 0, 0, 0, 0, 0) + \
+             SYMBOL.pack(1, 0x10 | STT_FUNC, 0, 3, 0, len(XDP_CODE)) + \
+             SYMBOL.pack(10, 0x10 | STT_OBJECT, 0, 5, 0, 16)
+    rel = RELOCATION.pack(0, 2 << 32 | R_BPF_64_64)
+
+    # (name offset, type, flags, content, link, info, entsize)
+    sections = [(0, 0, 0, b"", 0, 0, 0),
+                (1, 3, 0, shstrtab, 0, 0, 0),
+                (11, 3, 0, strtab, 0, 0, 0),
+                (19, SHT_PROGBITS, SHF_EXECINSTR | 0x2, XDP_CODE, 0, 0, 0),
+                (23, SHT_REL, 0, rel, 6, 3, RELOCATION.size),
+                (31, SHT_PROGBITS, 0x3, bytes(16), 0, 0, 0),
+                (36, SHT_SYMTAB, 0, symtab, 2, 1, SYMBOL.size)]
+
+    data, offsets = b"", []
+    for sec in sections:
+        offsets.append(ELF_HEADER.size + len(data))
+        data += sec[3]
+    shoff = ELF_HEADER.size + len(data)
+
+    ident = ELF_MAGIC + bytes([ELFCLASS64, ELFDATA2LSB, 1]) + bytes(9)
+    elf = ELF_HEADER.pack(ident, 1, EM_BPF, 1, 0, 0, shoff, 0, ELF_HEADER.size, 0, 0, SECTION_HEADER.size,
+                          len(sections), 1) + data
+    for sec, offset in zip(sections, offsets):
+        elf += SECTION_HEADER.pack(sec[0], sec[1], sec[2], 0, offset, len(sec[3]), sec[4], sec[5], 8, sec[6])
+    return elf
+
+
+class ElfReaderTestCases(unittest.TestCase):
+    def setUp(self):
+        fd, self.filename = tempfile.mkstemp(suffix=".o")
+        with os.fdopen(fd, 'wb') as file:
+            file.write(build_bpf_object())
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def test_read_program_section(self):
+        self.assertTrue(is_elf_file(self.filename))
+        program_bin, program_str = read_elf_file(self.filename)
+        self.assertEqual(program_bin, [0x1801000000000000, 0, 0x8500000001000000, 0xb700000002000000,
+                                       0x9500000000000000])
+        self.assertEqual(program_str, ["r1 = 0 ll", "NOP", "call 1", "r0 = 2", "exit"])
+
+    def test_symbols_and_relocations(self):
+        elf = ElfObject(self.filename)
+        self.assertEqual(list(elf.programs), ["xdp"])
+        self.assertEqual(elf.programs["xdp"].functions, {0: "xdp_prog"})
+        self.assertEqual(elf.programs["xdp"].relocations, {0: ("counters", R_BPF_64_64)})
+        self.assertEqual(elf.maps, {"counters": 0})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+from graph import Graph
+
+
+def diamond():
+    # 0 -> 1 -> {2, 3} -> 4
+    g = Graph()
+    g.add_edges_from([(0, 1), (1, 3), (1, 2), (2, 4), (3, 4), (1, 3)])
+    return g
+
+
+class GraphTestCases(unittest.TestCase):
+    def test_adjacency_insertion_order(self):
+        g = diamond()
+        self.assertEqual(len(g), 5)
+        self.assertEqual(g.successors(1), [3, 2])
+        self.assertEqual(g.predecessors(4), [2, 3])
+        self.assertEqual(g.reverse().successors(4), [2, 3])
+
+    def test_topological_sorts(self):
+        g = diamond()
+        self.assertEqual(g.topological_sort(), [0, 1, 3, 2, 4])
+        self.assertEqual(g.lexicographical_topological_sort(), [0, 1, 2, 3, 4])
+
+        g.add_edge(-1, 3)  # cached orders are invalidated
+        self.assertEqual(g.lexicographical_topological_sort(), [-1, 0, 1, 2, 3, 4])
+
+    def test_dominators(self):
+        dominators = diamond().dominators()
+        self.assertEqual(dominators[3], {0, 1, 3})
+        self.assertEqual(dominators[4], {0, 1, 4})
+        self.assertEqual(diamond().reverse().dominators(4)[1], {1, 4})
+
+
+if __name__ == '__main__':
+    unittest.main()
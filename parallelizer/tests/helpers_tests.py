@@ -0,0 +1,25 @@
+import unittest
+from helpers import helper, helper_args, MemKind, HelperClass, CALL_CLOBBERED_MASK, BPF_MAP_LOOKUP_ELEM, \
+    BPF_CSUM_DIFF, BPF_KTIME_GET_NS, BPF_XDP_ADJUST_HEAD
+
+
+class HelpersTestCases(unittest.TestCase):
+    def test_descriptors(self):
+        self.assertEqual(helper_args(BPF_MAP_LOOKUP_ELEM), [1, 2])
+        self.assertEqual(helper_args(BPF_CSUM_DIFF), [1, 2, 3, 4, 5])
+        self.assertEqual(helper_args(BPF_KTIME_GET_NS), [])
+
+        lookup = helper(BPF_MAP_LOOKUP_ELEM)
+        self.assertEqual((lookup.reads, lookup.writes, lookup.mem_args), (MemKind.STACK, MemKind.NONE, (2,)))
+        self.assertEqual(lookup.latency, HelperClass.MAP)
+        self.assertTrue(helper(BPF_XDP_ADJUST_HEAD).writes & MemKind.PACKET)
+        self.assertEqual(helper(BPF_KTIME_GET_NS).clobbers, CALL_CLOBBERED_MASK)
+
+        # unknown helpers: all the arguments, any memory
+        unknown = helper(999)
+        self.assertEqual(helper_args(999), [1, 2, 3, 4, 5])
+        self.assertEqual((unknown.reads, unknown.writes, unknown.mem_args), (MemKind.ANY, MemKind.ANY, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
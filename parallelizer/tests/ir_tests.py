@@ -0,0 +1,65 @@
+import unittest
+from ir import *
+
+# r2 = r1, r2 += 14, r3 = r2, r2 = 0, exit
+PROGRAM = [0xbf12000000000000, 0x07020000e0000000, 0xbf23000000000000, 0xb702000000000000, 0x9500000000000000]
+
+
+class IRTestCases(unittest.TestCase):
+    def test_instruction_operands(self):
+        instr = Instruction(PROGRAM[1], 1)
+        self.assertEqual([inp.sym_name for inp in instr.inputs], [2])
+        self.assertEqual(instr.output.sym_name, 2)
+        self.assertEqual(instr.pending_deps, 1)
+        self.assertTrue(instr.uses(2) and instr.defines(2))
+
+        instr.set_instr_b(PROGRAM[2])
+        self.assertEqual(instr.unpkd.dst, 3)
+
+    def test_block_register_indexes(self):
+        blck = Block(BlockType.BASIC, 0, len(PROGRAM))
+        blck.instructions = [Instruction(PROGRAM[i], i) for i in range(len(PROGRAM))]
+        blck.index_registers()
+
+        self.assertEqual(blck.reg_defs[2], [0, 1, 3])
+        self.assertEqual(blck.reg_uses[2], [1, 2])
+        self.assertEqual(blck.first_def(2), 0)
+        self.assertEqual(blck.last_def(2), 3)
+        self.assertIsNone(blck.last_def(1))
+
+    def test_register_masks(self):
+        self.assertEqual(reg_mask([0, 3, 10]), 0b10000001001)
+        self.assertEqual(mask_regs(0b10000001001), [0, 3, 10])
+        self.assertEqual(mask_regs(reg_mask(range(NUM_REGS))), list(range(NUM_REGS)))
+
+    def test_memory_dependencies(self):
+        # *(u32 *)(r10 - 4) = r1, r2 = *(u32 *)(r10 - 8), r3 = *(u32 *)(r10 - 4), r4 = *(u32 *)(r6 + 0), call 2
+        # (map_update_elem writes the map: barrier), *(u32 *)(r6 + 0) = r1
+        program = [0x631afcff00000000, 0x61a2f8ff00000000, 0x61a3fcff00000000, 0x6164000000000000,
+                   0x8500000002000000, 0x6361000000000000]
+        self.assertEqual(self.__memory_dependencies(program), [set(), set(), {0}, set(), {0, 1, 2, 3}, {4}])
+
+        # call 1 (map_lookup_elem) only reads the key pointed by r2 = r10 - 8: after the store on the stack, the load
+        # from r6 can not point to the stack, the store through r6 is after the call
+        program[1], program[4] = 0xbfa2000000000000, 0x8500000001000000
+        program.insert(2, 0x0702000000f8ffff)
+        self.assertEqual(self.__memory_dependencies(program), [set(), set(), set(), {0}, set(), {0}, {4, 5}])
+
+        # call 5 (ktime_get_ns) does not access memory
+        program[5] = 0x8500000005000000
+        self.assertEqual(self.__memory_dependencies(program)[5:], [set(), {4}])
+        self.assertEqual(stack_transfer(1 << 10, unpack_instruction(0xbfa2000000000000)), 1 << 10 | 1 << 2)
+
+    @staticmethod
+    def __memory_dependencies(program):
+        mem = MemoryDependencies(10, 1 << 10)
+        deps = []
+        for i in range(len(program)):
+            instr = Instruction(program[i], i)
+            deps.append(mem.access(i, instr.unpkd))
+            mem.track_pointers(i, instr.unpkd)
+        return deps
+
+
+if __name__ == '__main__':
+    unittest.main()
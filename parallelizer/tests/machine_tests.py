@@ -0,0 +1,35 @@
+import unittest
+from ebpf_parser import unpack_instruction
+from helpers import HelperClass
+from machine import Machine, OpClass, op_class, SEPHIROT
+
+
+class MachineTestCases(unittest.TestCase):
+    def test_op_class(self):
+        self.assertEqual(op_class(unpack_instruction(0x6112000000000000)), OpClass.LOAD)  # r2 = *(u32 *)(r1 + 0)
+        self.assertEqual(op_class(unpack_instruction(0x2702000003000000)), OpClass.MUL)  # r2 *= 3
+        self.assertEqual(op_class(unpack_instruction(0x8500000001000000)), OpClass.CALL)  # call 1
+        self.assertEqual(op_class(unpack_instruction(0x0702000003000000)), OpClass.ALU)  # r2 += 3
+        self.assertEqual(op_class(unpack_instruction(0x6321000000000000)), OpClass.ALU)  # *(u32 *)(r1 + 0) = r2
+
+    def test_default_and_label(self):
+        self.assertEqual(SEPHIROT, Machine(branch_lanes=[3, 2, 1, 0]))
+        self.assertTrue(SEPHIROT.branch_all_lanes)
+        self.assertEqual(SEPHIROT.label(), "4L")
+        self.assertEqual(SEPHIROT.latency(unpack_instruction(0x6112000000000000)), 1)
+
+        machine = Machine(n_lanes=2, branch_lanes=[0], lane_forward_constraint=False, latencies={OpClass.LOAD: 2})
+        self.assertEqual(machine.label(), "2L br0 nofwd load2")
+        self.assertEqual(machine.latency(unpack_instruction(0x6112000000000000)), 2)
+        self.assertNotEqual(machine, SEPHIROT)
+
+    def test_helper_latencies(self):
+        machine = Machine(latencies={OpClass.CALL: 2}, helper_latencies={HelperClass.SLOW: 8})
+        self.assertEqual(machine.latency(unpack_instruction(0x8500000001000000)), 2)  # call 1 (map_lookup_elem)
+        self.assertEqual(machine.latency(unpack_instruction(0x8500000045000000)), 8)  # call 69 (fib_lookup)
+        self.assertEqual(machine.latency(unpack_instruction(0x85000000e7030000)), 8)  # unknown helper
+        self.assertEqual(machine.label(), "4L call2 slow8")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+from optimal_scheduler import OptimalBlockScheduler
+
+
+class OptimalSchedulerTestCases(unittest.TestCase):
+    def test_minimal_rows_with_lane_forwarding(self):
+        # 0 -> 2, 1 -> 2 back to back (forwarded), 3 branch closing the block after 2
+        edges = [(0, 2, 1, True), (1, 2, 1, True), (2, 3, 1, True)]
+        scheduler = OptimalBlockScheduler(2, [0], 1.0)
+        rows, placement, bound = scheduler.schedule(4, edges, branch=3, upper_bound=5)
+
+        # 0 and 1 can not both forward to 2 from different lanes: 4 rows
+        self.assertEqual((rows, bound), (4, 4))
+        self.assertEqual(placement[3], (3, 0))
+        self.assertEqual(placement[3][1], placement[2][1])
+
+    def test_greedy_already_optimal(self):
+        scheduler = OptimalBlockScheduler(4, range(4), 1.0)
+        rows, placement, bound = scheduler.schedule(2, [(0, 1, 1, True)], upper_bound=2)
+
+        self.assertIsNone(placement)
+        self.assertEqual(bound, 2)
+
+    def test_latencies_and_release(self):
+        # 0 -> 1 with 2 rows of latency (forwarded on the same lane in row 2), 1 released in row 3 by a value of the
+        # previous block, forwarded on lane 1
+        scheduler = OptimalBlockScheduler(2, range(2), 1.0)
+        rows, placement, bound = scheduler.schedule(2, [(0, 1, 2, True)], upper_bound=5)
+        self.assertEqual(rows, 3)
+        self.assertEqual(placement[1], (2, placement[0][1]))
+
+        rows, placement, bound = scheduler.schedule(2, [(0, 1, 2, True)], entry_lanes={1: {3: {1}}}, upper_bound=6,
+                                                    release={1: 3})
+        self.assertEqual((rows, placement[1]), (4, (3, 1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
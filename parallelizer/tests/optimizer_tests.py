@@ -0,0 +1,154 @@
+import unittest
+from optimizer_core import Optimizer
+from machine import Machine, OpClass
+
+# r2 = 1, if r1 == 0 goto +1, r2 = 2, r0 = r2, exit
+PROGRAM = [0xb702000001000000, 0x1501010000000000, 0xb702000002000000, 0xbf20000000000000, 0x9500000000000000]
+
+# r3 = 1, if r1 == 0 goto +3, r2 = 5, r0 = r2, exit, r0 = 0, exit
+TRACE_PROGRAM = [0xb703000001000000, 0x1501030000000000, 0xb702000005000000, 0xbf20000000000000, 0x9500000000000000,
+                 0xb700000000000000, 0x9500000000000000]
+
+# if r1 == 0 goto +0, r2 = 98, r2 -= r1, r1 = 7, r0 = r1, r0 += r2, exit
+WAR_PROGRAM = [0x1501000000000000, 0xb702000062000000, 0x1f12000000000000, 0xb701000007000000, 0xbf10000000000000,
+               0x0f20000000000000, 0x9500000000000000]
+
+# r3 = r2, r3 >>= 16, if r3 == 0 goto +2, r2 &= 65535, r2 += r3, r0 = r2, exit
+FOLD_PROGRAM = [0xbf23000000000000, 0x7703000010000000, 0x1503020000000000, 0x57020000ffff0000, 0x0f32000000000000,
+                0xbf20000000000000, 0x9500000000000000]
+
+# r5 = 0, if r1 == 0 goto +2, r3 += r1, goto +1, r2 |= r5, r0 = r2, r0 += r3, exit
+DIAMOND_PROGRAM = [0xb705000000000000, 0x1501020000000000, 0x0f13000000000000, 0x0500010000000000,
+                   0x4f52000000000000, 0xbf20000000000000, 0x0f30000000000000, 0x9500000000000000]
+
+# r2 = *(u32 *)(r1 + 0), if r2 == 0 goto +1, r2 = 1, r0 = r2, exit
+LOAD_PROGRAM = [0x6112000000000000, 0x1502010000000000, 0xb702000001000000, 0xbf20000000000000, 0x9500000000000000]
+
+# r2 = *(u32 *)(r1 + 0), r3 = r2, r3 *= r2, r2 = *(u32 *)(r1 + 4), r2 += 1, r3 += r2, r0 = r3, exit
+REUSE_PROGRAM = [0x6112000000000000, 0xbf23000000000000, 0x2f23000000000000, 0x6112040000000000, 0x0702000001000000,
+                 0x0f23000000000000, 0xbf30000000000000, 0x9500000000000000]
+
+# r4 = r1, r5 = r1, r2 = *(u32 *)(r1 + 0), r2 += 1, r2 *= 3, r2 += r4, r0 = r2, r0 += r5, exit
+CRITICAL_PROGRAM = [0xbf14000000000000, 0xbf15000000000000, 0x6112000000000000, 0x0702000001000000,
+                    0x2702000003000000, 0x0f42000000000000, 0xbf20000000000000, 0x0f50000000000000, 0x9500000000000000]
+
+# r0 = *(u8 *)(r1 + 9), if r2 == 0 goto +2, r0 = 1, exit, r0 += 1, exit
+JUMP_LOAD_PROGRAM = [0x7110090000000000, 0x1502020000000000, 0xb700000001000000, 0x9500000000000000,
+                     0x0700000001000000, 0x9500000000000000]
+
+
+class OptimizerTestCases(unittest.TestCase):
+    def test_def_use_chains_across_join(self):
+        optimizer = Optimizer(list(PROGRAM))
+        optimizer.optimize()
+
+        self.assertEqual(optimizer.use_def[(3, 2)], [0, 2])
+        self.assertEqual(optimizer.use_def[(1, 1)], [-1])
+        self.assertEqual(optimizer.def_use[(0, 2)], [3])
+        self.assertEqual(optimizer.def_use[(2, 2)], [3])
+        self.assertEqual(optimizer.def_use[(3, 0)], [4])
+
+    def test_superblock_hoisting(self):
+        optimizer = Optimizer(list(TRACE_PROGRAM), constant_propagation=False)
+        optimizer.optimize()
+
+        # r2 = 5 is dead on the side exit: hoisted in the row of the branch
+        self.assertEqual(optimizer.hoisted, 1)
+        self.assertEqual(optimizer.schedule[2]['time'], optimizer.schedule[1]['time'])
+        self.assertEqual(optimizer.schedule[3]['time'], optimizer.schedule[1]['time'] + 1)
+
+        optimizer = Optimizer(list(TRACE_PROGRAM), constant_propagation=False, superblock_scheduling=False)
+        optimizer.optimize()
+        self.assertEqual(optimizer.hoisted, 0)
+        self.assertGreater(optimizer.schedule[2]['time'], optimizer.schedule[1]['time'])
+
+    def test_write_after_read_order(self):
+        optimizer = Optimizer(list(WAR_PROGRAM), constant_propagation=False, optimal_sched_max_block=0,
+                              register_allocation=False)
+        optimizer.optimize()
+
+        # r1 = 7 can not be scheduled before the row reading the live in r1
+        self.assertGreaterEqual(optimizer.schedule[3]['time'], optimizer.schedule[2]['time'])
+
+        # unless it is renamed: its value is moved to r0, the move is removed
+        optimizer = Optimizer(list(WAR_PROGRAM), constant_propagation=False, optimal_sched_max_block=0)
+        optimizer.optimize()
+        self.assertLess(optimizer.schedule[3]['time'], optimizer.schedule[2]['time'])
+        self.assertEqual(optimizer.coalesced_moves, 1)
+        self.assertIsNone(optimizer.schedule[4]['lane'])
+
+    def test_if_conversion(self):
+        # r2 &= 65535, r2 += r3 do not change r2 when r3 = r2 >> 16 is 0: the branch is removed
+        optimizer = Optimizer(list(FOLD_PROGRAM))
+        optimizer.optimize()
+        self.assertEqual(optimizer.if_converted, 1)
+        self.assertEqual(optimizer.program_bin[2], 0)
+
+        # r2 &= 255 does
+        optimizer = Optimizer(FOLD_PROGRAM[:3] + [0x57020000ff000000] + FOLD_PROGRAM[4:])
+        optimizer.optimize()
+        self.assertEqual(optimizer.if_converted, 0)
+
+        # both sides of the diamond are no-ops on the other path: the branch and the goto are removed
+        optimizer = Optimizer(list(DIAMOND_PROGRAM))
+        optimizer.optimize()
+        self.assertEqual(optimizer.if_converted, 1)
+        self.assertEqual((optimizer.program_bin[1], optimizer.program_bin[3]), (0, 0))
+
+    def test_machine_description(self):
+        machine = Machine(n_lanes=2, branch_lanes=[1], latencies={OpClass.LOAD: 3})
+        optimizer = Optimizer(list(LOAD_PROGRAM), machine=machine, optimal_sched_max_block=0)
+        optimizer.optimize()
+
+        self.assertEqual(len(optimizer.resource_table[0]), 2)
+        self.assertEqual((optimizer.schedule[1]['lane'], optimizer.schedule[4]['lane']), (1, 1))
+        # the loaded value can be read 3 rows after the load
+        self.assertGreaterEqual(optimizer.schedule[1]['time'], optimizer.schedule[0]['time'] + 3)
+
+        optimizer = Optimizer(list(LOAD_PROGRAM), optimal_sched_max_block=0)
+        optimizer.optimize()
+        self.assertEqual(optimizer.schedule[1]['time'], optimizer.schedule[0]['time'] + 1)
+
+    def test_latency_across_jump(self):
+        machine = Machine(latencies={OpClass.LOAD: 2})
+        optimizer = Optimizer(list(JUMP_LOAD_PROGRAM), machine=machine, constant_propagation=False)
+        optimizer.optimize()
+
+        # the load is still being written when the jump in its row is taken: the target reads it one row later
+        self.assertEqual(optimizer.schedule[0]['time'], optimizer.schedule[1]['time'])
+        target = optimizer.block_entry[optimizer.pos_index[4][0]]
+        self.assertEqual(optimizer.schedule[4]['time'], target + 1)
+        # and on the fall through, it is not overwritten by the load
+        self.assertGreaterEqual(optimizer.schedule[2]['time'], optimizer.schedule[0]['time'] + 2)
+
+    def test_critical_path_priority(self):
+        optimizer = Optimizer(list(CRITICAL_PROGRAM), machine=Machine(n_lanes=2), constant_propagation=False,
+                              optimal_sched_max_block=0)
+        optimizer.optimize()
+
+        # the load heads the longest chain: it takes the first row before r5 = r1, ready since the start
+        self.assertEqual(optimizer.schedule[2]['time'], 0)
+        self.assertEqual(optimizer.schedule[0]['time'], 0)
+        self.assertGreater(optimizer.schedule[1]['time'], optimizer.schedule[2]['time'])
+        self.assertEqual([optimizer.schedule[pos]['time'] for pos in range(3, 9)], list(range(1, 7)))
+        self.assertEqual(len(optimizer.resource_table), 7)
+
+    def test_register_allocation(self):
+        optimizer = Optimizer(list(REUSE_PROGRAM), register_allocation=False)
+        optimizer.optimize()
+        strict_rows = len(optimizer.resource_table)
+
+        # the second load of r2 does not wait for the reads of the first one: one of them is renamed
+        optimizer = Optimizer(list(REUSE_PROGRAM))
+        optimizer.optimize()
+        self.assertFalse(optimizer.allocation_fallback)
+        self.assertEqual(optimizer.renamed_values, 1)
+        self.assertLess(len(optimizer.resource_table), strict_rows)
+        self.assertEqual(optimizer.schedule[3]['time'], optimizer.schedule[0]['time'])
+        first, second = (optimizer.resource_table[optimizer.schedule[pos]['time']][optimizer.schedule[pos]['lane']]
+                         for pos in (0, 3))
+        self.assertNotEqual(first.output.sym_name, second.output.sym_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import unittest
+from programs import optimize
+
+# the ethernet header is checked twice: the second check is proved by the first one
+REPEATED_CHECK = ["r2 = *(u32 *)(r1 + 0)", "r3 = *(u32 *)(r1 + 4)", "r4 = r2", "r4 += 14", "if r4 > r3 goto +6",
+                  "r5 = *(u8 *)(r2 + 12)", "r4 = r2", "r4 += 14", "if r4 > r3 goto +2", "r0 = *(u8 *)(r2 + 13)",
+                  "exit", "r0 = 2", "exit"]
+
+# variable offset (header length read from the packet), the check of the same pointer is repeated in another block
+VARIABLE_CHECK = ["r2 = *(u32 *)(r1 + 0)", "r3 = *(u32 *)(r1 + 4)", "r4 = r2", "r4 += 1", "if r4 > r3 goto +12",
+                  "r5 = *(u8 *)(r2 + 0)", "r5 &= 15", "r5 <<= 2", "r4 = r2", "r4 += r5", "r6 = r4", "r6 += 8",
+                  "if r6 > r3 goto +4", "if r5 == 0 goto +1", "r0 = 3", "if r6 > r3 goto +1", "r0 = *(u8 *)(r4 + 7)",
+                  "exit", "r0 = 2", "exit"]
+
+# the out of bounds path drops the packet (XDP_DROP), the in bounds one reads the checked bytes
+DROP_CHECK = ["r2 = *(u32 *)(r1 + 0)", "r3 = *(u32 *)(r1 + 4)", "r4 = r2", "r4 += 14", "if r4 > r3 goto +3",
+              "r0 = *(u16 *)(r2 + 12)", "r0 &= 1", "exit", "r0 = 1", "exit"]
+
+
+class PacketBoundsTestCases(unittest.TestCase):
+    def test_repeated_check(self):
+        optimizer = optimize(REPEATED_CHECK)
+        self.assertEqual(optimizer.bounds_redundant, 1)
+        self.assertEqual(optimizer.bounds_protected, 0)
+        self.assertEqual(optimizer.bounds_removed, 3)  # the check and its operands
+
+        optimizer = optimize(REPEATED_CHECK, bounds_analysis=False)
+        self.assertEqual(optimizer.bounds_redundant, 0)
+        self.assertEqual(optimizer.bounds_removed, 0)
+
+    def test_variable_offset_check(self):
+        optimizer = optimize(VARIABLE_CHECK)
+        self.assertEqual(optimizer.bounds_redundant, 1)
+
+    def test_hardware_protected_check(self):
+        # the check is needed without the hardware bounds protection
+        self.assertEqual(optimize(DROP_CHECK).bounds_removed, 0)
+
+        optimizer = optimize(DROP_CHECK, remove_mem_boundary_checks=True)
+        self.assertEqual(optimizer.bounds_protected, 1)
+        self.assertEqual(optimizer.bounds_removed, 6)  # the check, its operands (data_end too) and the drop path
+
+        # the checked bytes are not all read: the access may not fault
+        program = list(DROP_CHECK)
+        program[5] = "r0 = *(u8 *)(r2 + 12)"
+        self.assertEqual(optimize(program, remove_mem_boundary_checks=True).bounds_protected, 0)
+
+        # the out of bounds path does not drop the packet
+        program = list(DROP_CHECK)
+        program[8] = "r0 = 2"
+        self.assertEqual(optimize(program, remove_mem_boundary_checks=True).bounds_protected, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,44 @@ class ParserTestCases(unittest.TestCase):
     def test_branch_opcode_coverage(self):
         self.assertCountEqual(BRANCH_OPCODE, BRANCH_OPCODE)
 
+    def test_opcode_table_consistency(self):
+        self.assertEqual(len(OPCODES), 256)
+        self.assertEqual(check_opcode_table(), [])
+
+    def test_unpack_instruction_fields(self):
+        # if r3 > r2 goto +54
+        unpkd = unpack_instruction(0x2d23360000000000)
+        self.assertEqual((unpkd.opcode, unpkd.dst, unpkd.src, unpkd.offset, unpkd.immediate), (0x2d, 3, 2, 54, 0))
+        # r10 - 64 offset and negative immediate
+        self.assertEqual(unpack_instruction(0x633ac0ff00000000).offset, -64)
+        self.assertEqual(unpack_instruction(0xa7030000ffffffff).immediate, 0xffffffff)
+
+    def test_unpack_instruction_memoized(self):
+        self.assertIs(unpack_instruction(0x0703000e0e000000), unpack_instruction(0x0703000e0e000000))
+
+    def test_unpack_program_matches_unpack_instruction(self):
+        program_bin = [0x2d23360000000000, 0x633ac0ff00000000, 0xa7030000ffffffff, 0x8500000001000000, 0x9500000000000000]
+        program = unpack_program(program_bin)
+        for i in range(len(program_bin)):
+            self.assertEqual(tuple(int(x) for x in program[i]), unpack_instruction(program_bin[i]))
+        self.assertEqual(jump_mask(program).tolist(), [True, False, False, False, False])
+        self.assertEqual(store_mask(program).tolist(), [False, True, False, False, False])
+        self.assertEqual(branch_mask(program).tolist(), [True, False, False, True, True])
+
+    def test_disassemble(self):
+        self.assertEqual(disassemble(0x633ac0ff00000000), "*(u32 *)(r10 - 64) = r3")
+        self.assertEqual(disassemble(0x1503e70001000000), "if r3 == 1 goto +231")
+        self.assertEqual(disassemble(0xa7030000ffffffff), "r3 ^= -1")
+        self.assertEqual(disassemble(0xdc09000010000000), "r9 = be16 r9")
+
+    def test_assemble_round_trip(self):
+        for instr in [0x633ac0ff00000000, 0x1503e70001000000, 0xa7030000ffffffff, 0xdc09000010000000,
+                      0x8500000001000000, 0x9500000000000000]:
+            self.assertEqual(assemble(disassemble(instr)), instr)
+        self.assertEqual(pack_instruction(0x07, dst=3, immediate=14), 0x0703000000000000 | little_to_big(14, 4))
+        self.assertEqual(modify_register(0xbf21000000000000, 5, DST_SHIFT_MOD), 0xbf25000000000000)
+        self.assertRaises(ValueError, assemble, "r1 = foo")
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from ebpf_parser import unpack_instruction, LOAD48, STORE48, NOP
+from programs import optimize
+
+# 6 bytes copied in pairs of u16 load and store, reusing the same register, to the next 6 bytes
+LOAD_STORE = ["r1 = *(u16 *)(r6 + 0)", "*(u16 *)(r6 + 6) = r1", "r1 = *(u16 *)(r6 + 2)", "*(u16 *)(r6 + 8) = r1",
+              "r1 = *(u16 *)(r6 + 4)", "*(u16 *)(r6 + 10) = r1", "r0 = 2", "exit"]
+
+# 6 bytes loaded, then stored in reverse order after an instruction not accessing the loaded registers
+LOADS_STORES = ["r2 = *(u16 *)(r6 + 0)", "r3 = *(u16 *)(r6 + 2)", "r4 = *(u16 *)(r6 + 4)", "r5 = r6",
+                "*(u16 *)(r7 + 10) = r4", "*(u16 *)(r7 + 8) = r3", "*(u16 *)(r7 + 6) = r2", "r0 = r5", "exit"]
+
+# the destination overlaps the source: the copy is not a single load and store
+OVERLAP = ["r1 = *(u16 *)(r6 + 0)", "*(u16 *)(r6 + 2) = r1", "r1 = *(u16 *)(r6 + 2)", "*(u16 *)(r6 + 4) = r1",
+           "r1 = *(u16 *)(r6 + 4)", "*(u16 *)(r6 + 6) = r1", "r0 = 2", "exit"]
+
+# r7 + 2 is r6 + 14: the first store writes the bytes read by the last load through another base register
+ALIAS = ["r6 = r2", "r7 = r2", "r7 += 12", "r1 = *(u16 *)(r6 + 10)", "*(u16 *)(r7 + 2) = r1", "r1 = *(u16 *)(r6 + 12)",
+         "*(u16 *)(r7 + 4) = r1", "r1 = *(u16 *)(r6 + 14)", "*(u16 *)(r7 + 6) = r1", "r0 = 2", "exit"]
+
+# the source is on the stack, the destination out of it
+STACK_COPY = ["r1 = *(u16 *)(r10 - 8)", "*(u16 *)(r7 + 0) = r1", "r1 = *(u16 *)(r10 - 6)", "*(u16 *)(r7 + 2) = r1",
+              "r1 = *(u16 *)(r10 - 4)", "*(u16 *)(r7 + 4) = r1", "r0 = 2", "exit"]
+
+# the zeroed register is also the map argument of the lookup reading the zeroed key
+MAP_KEY = ["r1 = 0", "*(u32 *)(r10 - 4) = r1", "r2 = r10", "r2 += -4", "call 1", "r0 = 2", "exit"]
+
+# the stack has been written through another stack pointer before being zeroed
+WRITTEN = ["r2 = r10", "*(u32 *)(r2 - 4) = r6", "r0 = *(u32 *)(r10 - 4)", "r1 = 0", "*(u32 *)(r10 - 4) = r1",
+           "r2 = *(u32 *)(r10 - 4)", "r0 += r2", "exit"]
+
+
+class PeepholeTestCases(unittest.TestCase):
+    def test_load_store48(self):
+        optimizer = optimize(LOAD_STORE)
+        self.assertEqual(optimizer.peephole_matched["load-store48"], 1)
+        load, store = unpack_instruction(optimizer.program_bin[0]), unpack_instruction(optimizer.program_bin[1])
+        self.assertEqual((load.opcode, load.dst, load.src, load.offset), (LOAD48, 1, 6, 0))
+        self.assertEqual((store.opcode, store.dst, store.src, store.offset), (STORE48, 6, 1, 6))
+        self.assertEqual(optimizer.program_bin[2:6], [NOP] * 4)
+
+        optimizer = optimize(LOAD_STORE, advanced_optimizations=False)
+        self.assertEqual(optimizer.peephole_matched, {})
+        self.assertNotIn(NOP, optimizer.program_bin[:6])
+
+    def test_load48_store48(self):
+        optimizer = optimize(LOADS_STORES)
+        self.assertEqual(optimizer.peephole_matched["load48-store48"], 1)
+        load, store = unpack_instruction(optimizer.program_bin[0]), unpack_instruction(optimizer.program_bin[6])
+        self.assertEqual((load.opcode, load.dst, load.offset), (LOAD48, 2, 0))
+        self.assertEqual((store.opcode, store.src, store.offset), (STORE48, 2, 6))
+        self.assertEqual([optimizer.program_bin[i] for i in (1, 2, 4, 5)], [NOP] * 4)
+
+    def test_overlapping_copy(self):
+        optimizer = optimize(OVERLAP)
+        self.assertEqual(optimizer.peephole_matched["load-store48"], 0)
+        self.assertNotIn(NOP, optimizer.program_bin[:6])
+
+    def test_aliasing_copy(self):
+        optimizer = optimize(ALIAS)
+        self.assertEqual(optimizer.peephole_matched["load-store48"], 0)
+        self.assertNotIn(NOP, optimizer.program_bin[3:9])
+
+        optimizer = optimize(STACK_COPY)
+        self.assertEqual(optimizer.peephole_matched["load-store48"], 1)
+        self.assertEqual(unpack_instruction(optimizer.program_bin[0]).opcode, LOAD48)
+
+    def test_memset_zero(self):
+        optimizer = optimize(MAP_KEY)
+        self.assertEqual(optimizer.peephole_matched["memset-zero"], 1)
+        self.assertEqual(optimizer.program_bin[1], NOP)
+        self.assertNotEqual(optimizer.program_bin[0], NOP)
+
+        optimizer = optimize(WRITTEN)
+        self.assertEqual(optimizer.peephole_matched["memset-zero"], 0)
+        self.assertNotEqual(optimizer.program_bin[4], NOP)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,18 @@
+from ebpf_parser import assemble
+from optimizer_core import Optimizer
+
+# Programs of the optimizer tests are lists of eBPF asm instructions (see assemble)
+
+
+def assemble_program(program):
+    # This method returns the binary instructions of the asm program
+
+    return [assemble(instr) for instr in program]
+
+
+def optimize(program, **options):
+    # This method returns the Optimizer of the asm program, after optimize with the options
+
+    optimizer = Optimizer(assemble_program(program), **options)
+    optimizer.optimize()
+    return optimizer
@@ -0,0 +1,59 @@
+import unittest
+from register_allocator import Webs, RegisterAllocator
+
+
+class RegisterAllocatorTestCases(unittest.TestCase):
+    def test_webs(self):
+        webs = Webs()
+        for d in [(3, 1), (5, 1), (7, 2)]:
+            webs.add(d)
+        webs.union((5, 1), (3, 1))
+
+        self.assertEqual(webs.find((5, 1)), (3, 1))
+        self.assertEqual(webs.roots(), [(3, 1), (7, 2)])
+
+    def test_overlapping_values(self):
+        # rows: 0: a = ..., b = ... | 1: ... = a + b | 2: c = ... | 3: ... = c
+        allocator = RegisterAllocator(4, [1, 2])
+        for row in range(3):
+            allocator.add_flow(row, row + 1)
+        allocator.add_def(0, "a", 1)
+        allocator.add_def(0, "b", 1)
+        allocator.add_use(1, "a", 1)
+        allocator.add_use(1, "b", 1)
+        allocator.add_def(2, "c", 2)
+        allocator.add_use(3, "c", 2)
+
+        regs = allocator.allocate()
+        self.assertNotEqual(regs["a"], regs["b"])
+        self.assertEqual(regs["c"], 2)  # original register preferred
+
+        allocator.fix("c", 1)
+        allocator.add_def(2, "d", 1)
+        allocator.add_use(3, "d", 1)
+        self.assertEqual(allocator.allocate()["d"], 2)
+
+    def test_not_enough_registers(self):
+        allocator = RegisterAllocator(2, [1, 2])
+        allocator.add_flow(0, 1)
+        for value in "abc":
+            allocator.add_def(0, value, 1)
+            allocator.add_use(1, value, 1)
+
+        self.assertIsNone(allocator.allocate())
+
+    def test_latency(self):
+        # a (row 0) is written 2 rows later, after b (row 1) is written: b can not take its register
+        allocator = RegisterAllocator(4, [1, 2])
+        for row in range(3):
+            allocator.add_flow(row, row + 1)
+        allocator.add_def(0, "a", 1, latency=2)
+        allocator.add_use(3, "a", 1)
+        allocator.add_def(1, "b", 1)
+        allocator.add_use(2, "b", 1)
+
+        regs = allocator.allocate()
+        self.assertNotEqual(regs["a"], regs["b"])
+
+if __name__ == '__main__':
+    unittest.main()
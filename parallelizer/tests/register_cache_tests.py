@@ -0,0 +1,41 @@
+import unittest
+from register_cache import RegisterCache, ROW_LIVE, ORIG_DEF
+
+
+class RegisterCacheTestCases(unittest.TestCase):
+    def test_live_ranges(self):
+        cache = RegisterCache()
+        cache.put_reg_wr(2, 0, 3, 0, None)  # r2 defined by 0 in row 0, last use 3 not scheduled yet
+        cache.put_reg_wr(3, 1, 2, 0, 4)
+        cache.put_reg_wr(3, 5, 6, 5, 6)
+
+        self.assertEqual(cache.get_conflicting(2, 10)[ORIG_DEF], 0)
+        self.assertEqual(cache.get_conflicting(3, 5)[ORIG_DEF], 5)
+        self.assertIsNone(cache.get_conflicting(3, 6))
+        self.assertEqual(cache.get_reg_pending(3, 2)[ORIG_DEF], 1)
+        self.assertEqual(cache.get_unavailable(4), [2, 3])
+
+        cache.put_reg_rd([2], 7, 3)
+        self.assertEqual(cache.get_conflicting(2, 0)[ROW_LIVE], 7)
+        self.assertIsNone(cache.get_conflicting(2, 7))
+
+        cache.ch_reg_name(2, 4, 0, 0)
+        self.assertIsNone(cache.get_conflicting(2, 0))
+        self.assertEqual(cache.get_unavailable(5), [3, 4])
+
+    def test_change_block_and_snapshot(self):
+        cache = RegisterCache()
+        cache.put_reg_wr(1, 0, 2, 0, None)
+        cache.put_reg_wr(2, 1, 9, 0, None)
+        snapshot = cache.snapshot()
+
+        cache.change_block(4)  # the block of the last use of r1 is done
+        self.assertIsNone(cache.get_conflicting(1, 0))
+        self.assertIsNotNone(cache.get_conflicting(2, 0))
+
+        cache.restore(snapshot)
+        self.assertIsNotNone(cache.get_conflicting(1, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
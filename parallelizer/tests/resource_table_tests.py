@@ -0,0 +1,36 @@
+import unittest
+from resource_table import ResourceTable
+
+
+class ResourceTableTestCases(unittest.TestCase):
+    def test_free_row_and_lane(self):
+        table = ResourceTable(2, 2)
+        table.place(0, 0, "a")
+        table.place(0, 1, "b")
+        table.place(1, 1, "c")
+
+        self.assertEqual(table.first_free_row(0), 1)
+        self.assertEqual(table.free_lane(1), 0)
+        self.assertEqual(table.first_free_row_on_lane(0, 1), 2)  # row 2 is not allocated yet: free
+        self.assertEqual(table.n_free(0), 0)
+
+        table.remove(0, 1)
+        self.assertEqual(table.first_free_row(0), 0)
+        self.assertEqual(table.free_lane(0), 1)
+        self.assertEqual(table[0], ["a", None])
+
+    def test_grow_and_trim(self):
+        table = ResourceTable(4)
+        table.place(5, 3, "a")
+        self.assertGreaterEqual(len(table), 6)
+        self.assertEqual(table[5][3], "a")
+        self.assertEqual(table.first_free_row_on_lane(5, 3), 6)
+
+        table.trim(2)
+        self.assertEqual(len(table), 2)
+        self.assertTrue(table.is_free(5, 3))
+        self.assertEqual(table.first_free_row_on_lane(0, 3), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()